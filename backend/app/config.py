@@ -12,9 +12,111 @@ GRIMOIRE_IMAGES_DIR = BASE_DIR / "test_images"
 REF_IMAGES_DIR = BASE_DIR / "ref-images"
 DETECTED_TOKENS_DIR = BASE_DIR / "detected_tokens"
 GAMES_DIR = BASE_DIR / "games"
+ASSETS_DIR = BASE_DIR / "assets"
 
 MAX_UPLOAD_MB = 10
+
+# Uploads are read in chunks of this size; the size limit aborts the read mid-stream
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Multipart framing (boundaries, part headers) allowed on top of the files themselves
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Resumable uploads (/api/grimoire/uploads): sessions staged in memory at once, idle
+# seconds before a session is dropped, suggested and maximum bytes per PUT
+MAX_UPLOAD_SESSIONS = int(os.getenv("MAX_UPLOAD_SESSIONS", "8"))
+UPLOAD_SESSION_TTL_S = int(os.getenv("UPLOAD_SESSION_TTL_S", "900"))
+UPLOAD_SESSION_CHUNK_BYTES = 512 * 1024
+UPLOAD_SESSION_MAX_CHUNK_BYTES = 4 * 1024 * 1024
+# Resumable uploads one caller (user, else client IP) may have in progress at once
+MAX_UPLOAD_SESSIONS_PER_CALLER = int(os.getenv("MAX_UPLOAD_SESSIONS_PER_CALLER", "2"))
+
+# Client-side captures (/api/grimoire/capture-profile, /api/grimoire/process-crops): JPEG
+# quality recommended to clients, seats per capture and size of each token / name crop
+CAPTURE_JPEG_QUALITY = 90
+MAX_CAPTURE_SEATS = 30
+MAX_CROP_UPLOAD_MB = 1
+
+# Overlapping photos accepted by /api/grimoire/process-multi
+MAX_MERGE_IMAGES = 4
+
+# Burst input for /api/grimoire/process-burst: frames per upload, and a short clip's size
+MAX_BURST_IMAGES = 12
+MAX_VIDEO_UPLOAD_MB = 30
+
+# Scan memory budget (MB). Instances run with 512MB and the app itself takes ~100MB:
+# scans are admitted while their estimated peaks fit SCAN_MEMORY_BUDGET_MB, and each
+# scan picks a detection resolution that keeps it under SCAN_MEMORY_PER_SCAN_MB.
+SCAN_MEMORY_BUDGET_MB = int(os.getenv("SCAN_MEMORY_BUDGET_MB", "256"))
+SCAN_MEMORY_PER_SCAN_MB = int(os.getenv("SCAN_MEMORY_PER_SCAN_MB", "128"))
+# Seconds a scan may wait for budget before the request is turned away with 503
+SCAN_ADMISSION_TIMEOUT_S = float(os.getenv("SCAN_ADMISSION_TIMEOUT_S", "30"))
+# Seconds a single-image scan may take in total (admission wait included) before it is
+# abandoned with 504; scans are also abandoned as soon as the client disconnects
+SCAN_DEADLINE_S = float(os.getenv("SCAN_DEADLINE_S", "60"))
+# How often a running scan checks for a client disconnect
+SCAN_DISCONNECT_POLL_S = float(os.getenv("SCAN_DISCONNECT_POLL_S", "0.25"))
+# Seconds a scan made without a game is kept for the game it is imported into to claim
+# it (saving the game with its scanId); claimed scans are kept with the game
+SCAN_UNATTACHED_TTL_S = int(os.getenv("SCAN_UNATTACHED_TTL_S", "604800"))
+
+# Scan jobs (/api/grimoire/jobs), run by `python -m app.worker` processes: seconds a
+# worker's claim lasts without a heartbeat, runs per job before it fails, base delay
+# before a retry (doubled per attempt), seconds finished jobs are kept, a job's run
+# deadline, jobs per worker process, the worker's idle poll and the longest long-poll
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_S = float(os.getenv("JOB_RETRY_BACKOFF_S", "5"))
+JOB_TTL_S = int(os.getenv("JOB_TTL_S", "86400"))
+JOB_DEADLINE_S = float(os.getenv("JOB_DEADLINE_S", "300"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "1"))
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "1"))
+JOB_WAIT_MAX_S = float(os.getenv("JOB_WAIT_MAX_S", "30"))
+
+# Request lanes (see app.request_lanes): requests running at once and requests allowed to
+# queue per lane. Interactive (CRUD) slots are reserved for it; scans and the
+# unauthenticated debug pipeline get small, separate caps. Upload transfers (job photos,
+# resumable upload chunks) mostly wait on the network, so their lane is wider.
+LANE_INTERACTIVE_CONCURRENCY = int(os.getenv("LANE_INTERACTIVE_CONCURRENCY", "32"))
+LANE_INTERACTIVE_QUEUE = int(os.getenv("LANE_INTERACTIVE_QUEUE", "256"))
+LANE_SCAN_CONCURRENCY = int(os.getenv("LANE_SCAN_CONCURRENCY", "2"))
+LANE_SCAN_QUEUE = int(os.getenv("LANE_SCAN_QUEUE", "16"))
+LANE_UPLOAD_CONCURRENCY = int(os.getenv("LANE_UPLOAD_CONCURRENCY", "8"))
+LANE_UPLOAD_QUEUE = int(os.getenv("LANE_UPLOAD_QUEUE", "32"))
+LANE_DEBUG_CONCURRENCY = int(os.getenv("LANE_DEBUG_CONCURRENCY", "1"))
+LANE_DEBUG_QUEUE = int(os.getenv("LANE_DEBUG_QUEUE", "1"))
+
+# Rate limits per caller (user id, else client IP) as "N/SECONDS": N requests per SECONDS,
+# also the burst size. Scan covers the upload/pipeline routes, debug /api/debug/pipeline.
+RATE_LIMIT_SCAN = os.getenv("RATE_LIMIT_SCAN", "20/60")
+RATE_LIMIT_DEBUG = os.getenv("RATE_LIMIT_DEBUG", "5/300")
+# "memory" (per worker process) or "mongo" (shared by all workers)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+# Take the client IP from X-Forwarded-For (only behind a proxy that sets it, e.g. Render).
+# Each proxy appends the address it saw, so the client's is RATE_LIMIT_PROXY_HOPS entries
+# from the right; entries further left are whatever the client sent.
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+
+# Threads waiting on Tesseract subprocesses; name OCR overlaps with ORB matching
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "4"))
+
+# Pipeline engine: threads running independent stages (e.g. cropping + matching alongside
+# OCR) and memoized stage outputs kept across requests (small: circles, names, matches)
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "4"))
+PIPELINE_CACHE_ENTRIES = int(os.getenv("PIPELINE_CACHE_ENTRIES", "512"))
+# Run a synthetic scan through every pipeline engine at startup; /api/ready reports 503
+# until it has finished (set false for quicker restarts in local dev)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# Named pipeline profiles (detector / matcher / OCR parameters), written by app.tools.sweep
+PIPELINE_PROFILES_FILE = Path(os.getenv("PIPELINE_PROFILES_FILE", str(BASE_DIR / "pipeline_profiles.json")))
+
 ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png", "image/jpg")
+ALLOWED_VIDEO_TYPES = ("video/mp4", "video/quicktime", "video/webm")
+
+# /api/debug/pipeline artifacts kept in memory for the zip download: runs and seconds
+DEBUG_ARTIFACT_RUNS = int(os.getenv("DEBUG_ARTIFACT_RUNS", "8"))
+DEBUG_ARTIFACT_TTL_S = int(os.getenv("DEBUG_ARTIFACT_TTL_S", "1800"))
 
 INCLUDE_TRACEBACK_IN_ERROR = os.getenv("DEBUG", "false").lower() == "true"
 
@@ -30,6 +132,9 @@ USERS_COLLECTION = "users"
 SERVERS_COLLECTION = "servers"
 MEMBERSHIPS_COLLECTION = "memberships"
 FEEDBACK_COLLECTION = "feedback"
+SCANS_COLLECTION = "scans"
+JOBS_COLLECTION = "scan_jobs"
+RATE_LIMITS_COLLECTION = "rate_limits"
 
 # ----- Auth / JWT -----
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me-in-production-use-a-strong-random-secret")
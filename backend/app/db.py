@@ -8,9 +8,12 @@ import pymongo
 from app.config import (
     FEEDBACK_COLLECTION,
     GAMES_COLLECTION,
+    JOBS_COLLECTION,
     MEMBERSHIPS_COLLECTION,
     MONGODB_DB_NAME,
     MONGODB_URI,
+    RATE_LIMITS_COLLECTION,
+    SCANS_COLLECTION,
     SERVERS_COLLECTION,
     USERS_COLLECTION,
 )
@@ -57,6 +60,30 @@ async def connect_db() -> None:
     await db[FEEDBACK_COLLECTION].create_index("feedbackId", unique=True)
     await db[FEEDBACK_COLLECTION].create_index("created_at")
 
+    # --- Scans ---
+    await db[SCANS_COLLECTION].create_index("scanId", unique=True)
+    await db[SCANS_COLLECTION].create_index(
+        [("gameId", pymongo.ASCENDING), ("createdAt", pymongo.DESCENDING)]
+    )
+    # Scans never claimed by a game are dropped (claimed ones have no expiresAt)
+    await db[SCANS_COLLECTION].create_index("expiresAt", expireAfterSeconds=0)
+
+    # --- Scan jobs ---
+    await db[JOBS_COLLECTION].create_index("jobId", unique=True)
+    # Claims look for queued jobs that are due and running jobs whose lease ran out
+    await db[JOBS_COLLECTION].create_index(
+        [("status", pymongo.ASCENDING), ("runAfter", pymongo.ASCENDING)]
+    )
+    await db[JOBS_COLLECTION].create_index(
+        [("status", pymongo.ASCENDING), ("leaseUntil", pymongo.ASCENDING)]
+    )
+    # Mongo deletes jobs once expiresAt has passed
+    await db[JOBS_COLLECTION].create_index("expiresAt", expireAfterSeconds=0)
+
+    # --- Rate limit buckets (RATE_LIMIT_BACKEND=mongo); idle buckets expire once full ---
+    await db[RATE_LIMITS_COLLECTION].create_index("rule")
+    await db[RATE_LIMITS_COLLECTION].create_index("expiresAt", expireAfterSeconds=0)
+
 
 async def disconnect_db() -> None:
     """Close MongoDB connection. Call once at app shutdown."""
@@ -91,3 +118,15 @@ def get_memberships_collection() -> AsyncIOMotorCollection:
 
 def get_feedback_collection() -> AsyncIOMotorCollection:
     return get_db()[FEEDBACK_COLLECTION]
+
+
+def get_scans_collection() -> AsyncIOMotorCollection:
+    return get_db()[SCANS_COLLECTION]
+
+
+def get_jobs_collection() -> AsyncIOMotorCollection:
+    return get_db()[JOBS_COLLECTION]
+
+
+def get_rate_limits_collection() -> AsyncIOMotorCollection:
+    return get_db()[RATE_LIMITS_COLLECTION]
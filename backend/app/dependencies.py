@@ -1,18 +1,159 @@
 """
 Shared service instances for routers. Initialized once at import.
 """
-from app.config import DETECTED_TOKENS_DIR, REF_IMAGES_DIR
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple, Union
+
+from app.config import (
+    DEBUG_ARTIFACT_RUNS,
+    DEBUG_ARTIFACT_TTL_S,
+    DETECTED_TOKENS_DIR,
+    JOB_LEASE_S,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF_S,
+    JOB_TTL_S,
+    LANE_DEBUG_CONCURRENCY,
+    LANE_DEBUG_QUEUE,
+    LANE_INTERACTIVE_CONCURRENCY,
+    LANE_INTERACTIVE_QUEUE,
+    LANE_SCAN_CONCURRENCY,
+    LANE_SCAN_QUEUE,
+    LANE_UPLOAD_CONCURRENCY,
+    LANE_UPLOAD_QUEUE,
+    MAX_UPLOAD_SESSIONS,
+    MAX_UPLOAD_SESSIONS_PER_CALLER,
+    OCR_WORKERS,
+    PIPELINE_CACHE_ENTRIES,
+    PIPELINE_PROFILES_FILE,
+    PIPELINE_STAGE_WORKERS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_DEBUG,
+    RATE_LIMIT_PROXY_HOPS,
+    RATE_LIMIT_SCAN,
+    RATE_LIMIT_TRUST_FORWARDED,
+    REF_IMAGES_DIR,
+    SCAN_MEMORY_BUDGET_MB,
+    UPLOAD_SESSION_TTL_S,
+)
+from app.db import get_jobs_collection, get_rate_limits_collection
+from app.rate_limits import DEBUG_RULE, SCAN_RULE, MemoryBuckets, MongoBuckets, RateLimit, RateLimiter
+from app.request_lanes import DEBUG, INTERACTIVE, SCAN, UPLOAD, Lane, LaneScheduler
 from app.services.circle_detector import CircleDetector
+from app.services.debug_artifacts import DebugArtifactStore
+from app.services.embedding_matcher import EmbeddingMatcher
+from app.services.grimoire_stages import build_grimoire_engine
 from app.services.image_processor import ImageProcessor
+from app.services.memory_budget import MemoryBudget
+from app.services.metrics import Metrics
 from app.services.orb_matcher import ORBMatcher
+from app.services.pipeline_engine import PipelineEngine, StageCache
+from app.services.pipeline_profiles import DEFAULT_PROFILE, ProfileServices, resolve_profiles
 from app.services.player_name_extractor import PlayerNameExtractor
+from app.services.rematch import ref_pack_version
+from app.services.scan_jobs import ScanJobQueue
 from app.services.token_detector import TokenDetector
 from app.services.token_processor import TokenProcessor
+from app.services.upload_sessions import UploadSessionStore
+from app.services.warmup import WarmupState
+
+# Named pipeline profiles (?profile=): detector, ORB matcher and name extractor built once
+# per profile. The built-ins can be overridden or extended in PIPELINE_PROFILES_FILE.
+profiles: Dict[str, ProfileServices] = {
+    name: ProfileServices.build(name, params, REF_IMAGES_DIR)
+    for name, params in resolve_profiles(PIPELINE_PROFILES_FILE).items()
+}
 
-# Processing pipeline (grimoire extract + match)
+# Processing pipeline (grimoire extract + match); the default profile's services
 image_processor = ImageProcessor()
 token_detector = TokenDetector(min_radius_cm=1, max_radius_cm=3.5)
-orb_matcher = ORBMatcher(REF_IMAGES_DIR)
-circle_detector = CircleDetector(min_radius=50, blur_sigma=4.5)
-player_name_extractor = PlayerNameExtractor()
+orb_matcher: ORBMatcher = profiles[DEFAULT_PROFILE].orb_matcher
+embedding_matcher = EmbeddingMatcher(REF_IMAGES_DIR)
+# Version of the reference library the matchers were built from; stored with each scan
+REF_PACK_VERSION = ref_pack_version(REF_IMAGES_DIR)
+circle_detector: CircleDetector = profiles[DEFAULT_PROFILE].circle_detector
+player_name_extractor: PlayerNameExtractor = profiles[DEFAULT_PROFILE].player_name_extractor
 token_processor = TokenProcessor(token_detector, DETECTED_TOKENS_DIR)
+
+# Background name OCR, overlapped with token cropping and ORB matching
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+
+# Admission control for scans by estimated peak memory (see memory_budget)
+scan_memory_budget = MemoryBudget(SCAN_MEMORY_BUDGET_MB * 1024 * 1024)
+
+# Debug pipeline images, encoded and saved in the background, downloadable as a zip
+debug_artifacts = DebugArtifactStore(DEBUG_ARTIFACT_RUNS, DEBUG_ARTIFACT_TTL_S)
+
+# Resumable uploads in progress (staged in memory until finalized)
+upload_sessions = UploadSessionStore(UPLOAD_SESSION_TTL_S, MAX_UPLOAD_SESSIONS, MAX_UPLOAD_SESSIONS_PER_CALLER)
+
+# Asynchronous scans: queued by the API, run by `python -m app.worker` processes
+scan_jobs = ScanJobQueue(get_jobs_collection, JOB_LEASE_S, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_S, JOB_TTL_S)
+
+# Character matcher backends, selectable per request (?matcher=, MatcherName)
+matchers: Dict[str, Union[ORBMatcher, EmbeddingMatcher]] = {
+    "orb": orb_matcher,
+    "embedding": embedding_matcher,
+}
+
+# Single-image pipeline as a stage graph, one engine per (profile, matcher) sharing one
+# stage cache. The embedding matcher has no profile knobs and is shared by all profiles.
+stage_executor = ThreadPoolExecutor(max_workers=PIPELINE_STAGE_WORKERS, thread_name_prefix="stage")
+stage_cache = StageCache(PIPELINE_CACHE_ENTRIES)
+
+
+def profile_matcher(profile: ProfileServices, matcher_name: str) -> Union[ORBMatcher, EmbeddingMatcher]:
+    """The matcher to use under a profile (ORB is built per profile, embedding is shared)."""
+    return profile.orb_matcher if matcher_name == "orb" else matchers[matcher_name]
+
+
+def _build_engine(profile: ProfileServices, matcher_name: str) -> PipelineEngine:
+    if matcher_name == "orb":
+        version = f"orb:{profile.params.matcher_version()}"
+    else:
+        version = matcher_name
+    return build_grimoire_engine(
+        profile.circle_detector,
+        token_processor,
+        profile.player_name_extractor,
+        profile_matcher(profile, matcher_name),
+        matcher_version=f"{version}:{REF_PACK_VERSION}",
+        ocr_executor=ocr_executor,
+        cache=stage_cache,
+        executor=stage_executor,
+    )
+
+
+grimoire_engines: Dict[Tuple[str, str], PipelineEngine] = {
+    (profile_name, matcher_name): _build_engine(profile, matcher_name)
+    for profile_name, profile in profiles.items()
+    for matcher_name in matchers
+}
+
+# Startup warm-up progress, reported by /api/ready
+warmup_state = WarmupState()
+
+# Process counters (cancelled scans, killed OCR processes, ...), served by /api/metrics
+metrics = Metrics()
+
+# Per-lane concurrency and queues for incoming requests (see request_lanes)
+request_lanes = LaneScheduler(
+    [
+        Lane(INTERACTIVE, LANE_INTERACTIVE_CONCURRENCY, LANE_INTERACTIVE_QUEUE),
+        Lane(SCAN, LANE_SCAN_CONCURRENCY, LANE_SCAN_QUEUE),
+        Lane(UPLOAD, LANE_UPLOAD_CONCURRENCY, LANE_UPLOAD_QUEUE),
+        Lane(DEBUG, LANE_DEBUG_CONCURRENCY, LANE_DEBUG_QUEUE),
+    ],
+    metrics,
+)
+
+# Token-bucket rate limits per caller on the scan and debug routes (see rate_limits)
+rate_limiter = RateLimiter(
+    {
+        SCAN_RULE: RateLimit.parse(RATE_LIMIT_SCAN),
+        DEBUG_RULE: RateLimit.parse(RATE_LIMIT_DEBUG),
+    },
+    MongoBuckets(get_rate_limits_collection) if RATE_LIMIT_BACKEND == "mongo" else MemoryBuckets(),
+    metrics,
+    trust_forwarded=RATE_LIMIT_TRUST_FORWARDED,
+    proxy_hops=RATE_LIMIT_PROXY_HOPS,
+)
@@ -2,18 +2,45 @@
 BotC Codex Parser API – FastAPI app.
 Routes are split into: root, grimoire (processing), auth, servers, games, users.
 """
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from time import perf_counter
 
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.auth import _resolve_token, decode_token
-from app.config import CORS_ORIGINS
+from app.config import (
+    CORS_ORIGINS,
+    MAX_BURST_IMAGES,
+    MAX_CAPTURE_SEATS,
+    MAX_CROP_UPLOAD_MB,
+    MAX_MERGE_IMAGES,
+    MAX_UPLOAD_MB,
+    MAX_VIDEO_UPLOAD_MB,
+    MULTIPART_OVERHEAD_BYTES,
+    REF_IMAGES_DIR,
+    WARMUP_ON_STARTUP,
+)
 from app.db import connect_db, disconnect_db
+from app.dependencies import (
+    grimoire_engines,
+    player_name_extractor,
+    profiles,
+    rate_limiter,
+    request_lanes,
+    warmup_state,
+)
+from app.rate_limits import RateLimitMiddleware
+from app.request_lanes import RequestLaneMiddleware
 from app.routers import games, grimoire, root
 from app.routers import auth, debug, feedback, servers, users
+from app.services.scan_flows import ScanError
+from app.services.warmup import warm_up
+from app.upload_limits import UploadSizeLimitMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +52,17 @@ request_logger = logging.getLogger("app.request")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    if WARMUP_ON_STARTUP:
+        # In the background, so /api/health answers while /api/ready still reports warming
+        radius = max(p.circle_detector.min_radius for p in profiles.values()) + 10
+        app.state.warmup_task = asyncio.create_task(
+            run_in_threadpool(
+                warm_up, warmup_state, grimoire_engines, REF_IMAGES_DIR, radius, player_name_extractor
+            )
+        )
+    else:
+        warmup_state.start()
+        warmup_state.finish()
     yield
     await disconnect_db()
 
@@ -35,15 +73,44 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan,
 )
+# Innermost: oversized uploads are refused before they queue, and 503s carry CORS headers
+app.add_middleware(RequestLaneMiddleware, scheduler=request_lanes)
+# Callers over their rate limit are turned away before they take a place in a lane's queue
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+_MB = 1024 * 1024
+# Added before CORS so that CORS wraps it and 413 responses still carry CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/api/grimoire/process": MAX_UPLOAD_MB * _MB + MULTIPART_OVERHEAD_BYTES,
+        "/api/grimoire/jobs": MAX_UPLOAD_MB * _MB + MULTIPART_OVERHEAD_BYTES,
+        "/api/grimoire/process-multi": MAX_MERGE_IMAGES * (MAX_UPLOAD_MB * _MB + MULTIPART_OVERHEAD_BYTES),
+        "/api/grimoire/process-burst": MAX_BURST_IMAGES * MAX_UPLOAD_MB * _MB
+        + MAX_VIDEO_UPLOAD_MB * _MB
+        + MULTIPART_OVERHEAD_BYTES,
+        "/api/grimoire/detect": MAX_UPLOAD_MB * _MB + MULTIPART_OVERHEAD_BYTES,
+        "/api/grimoire/process-crops": MAX_UPLOAD_MB * _MB
+        + 2 * MAX_CAPTURE_SEATS * MAX_CROP_UPLOAD_MB * _MB
+        + MULTIPART_OVERHEAD_BYTES,
+        "/api/debug/pipeline": MAX_UPLOAD_MB * _MB + MULTIPART_OVERHEAD_BYTES,
+    },
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Queue-Wait-Ms", "Retry-After"],
 )
 
 
+@app.exception_handler(ScanError)
+async def scan_error(request: Request, exc: ScanError):
+    """Scan flows (app.services.scan_flows) raise ScanError; answer it like an HTTPException."""
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start = perf_counter()
@@ -19,6 +19,28 @@ from app.models.schemas.grimoire import (
     TownSquarePlayer,
 )
 
+# Scans (incremental rescan)
+from app.models.schemas.scan import (
+    RoleChange,
+    ScanDiff,
+    MatcherName,
+    ScanDocument,
+    ScanParams,
+    ScanSeat,
+)
+
+# Scan jobs
+from app.models.schemas.job import (
+    JobError,
+    ScanJobDocument,
+)
+
+# Resumable uploads
+from app.models.schemas.upload import UploadCreateBody
+
+# Client-side captures
+from app.models.schemas.capture import CaptureSeat
+
 # Events + phases
 from app.models.schemas.events import (
     AbilityEvent,
@@ -89,6 +111,16 @@ __all__ = [
     "TokenMatch",
     "TownSquareGameState",
     "TownSquarePlayer",
+    "RoleChange",
+    "ScanDiff",
+    "MatcherName",
+    "ScanDocument",
+    "ScanParams",
+    "ScanSeat",
+    "JobError",
+    "ScanJobDocument",
+    "UploadCreateBody",
+    "CaptureSeat",
     "AbilityEvent",
     "DeathEvent",
     "ExecutionEvent",
@@ -0,0 +1,9 @@
+"""Client-side captures: seats cropped on the device (see /api/grimoire/capture-profile)."""
+from pydantic import BaseModel, Field
+
+
+class CaptureSeat(BaseModel):
+    """A token circle in the pixels of the frame the client cropped it from."""
+    x: int = Field(..., ge=0)
+    y: int = Field(..., ge=0)
+    r: int = Field(..., gt=0)
@@ -19,6 +19,8 @@ class GameCreateBody(BaseModel):
     subtitle: Optional[str] = None
     winner: Optional[str] = None
     visibility: Optional[Literal["private", "public"]] = None
+    # Scan the townSquare was imported from (the scan.scanId of /api/grimoire/process)
+    scanId: Optional[str] = None
 
 
 class GameUpdateBody(BaseModel):
@@ -30,6 +32,7 @@ class GameUpdateBody(BaseModel):
     subtitle: Optional[str] = None
     winner: Optional[str] = None
     visibility: Optional[Literal["private", "public"]] = None
+    scanId: Optional[str] = None
 
 
 class GameDocument(BaseModel):
@@ -0,0 +1,39 @@
+"""Scan jobs (asynchronous /api/grimoire/jobs)."""
+from datetime import datetime
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel
+
+from app.models.schemas.scan import ScanParams
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class JobError(BaseModel):
+    """Why a job failed: the status code /grimoire/process would have answered, and its detail."""
+    status: int
+    detail: str
+
+
+class ScanJobDocument(BaseModel):
+    """
+    Stored scan job. The uploaded photo is kept alongside (field content, not part of
+    this model) until the job finishes. leaseUntil / workerId belong to the worker
+    running it; expiresAt is when Mongo's TTL index deletes the job.
+    """
+    jobId: str
+    status: JobStatus = "queued"
+    createdAt: str
+    updatedAt: str
+    createdBy: Optional[str] = None
+    filename: Optional[str] = None
+    params: ScanParams = ScanParams()
+    attempts: int = 0
+    runAfter: datetime
+    leaseUntil: Optional[datetime] = None
+    workerId: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[JobError] = None
+    expiresAt: datetime
+
+    model_config = {"extra": "ignore"}
@@ -0,0 +1,78 @@
+"""
+Stored grimoire scans (per-seat results tied to a game) and the diff between two scans.
+Used by incremental rescans: unchanged seats reuse the previous scan's results.
+"""
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+from app.models.schemas.grimoire import ParsedToken, TownSquareGameState
+
+# Character matcher backends (?matcher=)
+MatcherName = Literal["orb", "embedding"]
+
+
+class ScanParams(BaseModel):
+    """
+    Query parameters shared by the scan routes (/grimoire/process, upload finalize, jobs,
+    process-multi, process-burst, process-crops); stored with a scan job for the worker.
+    """
+    serverId: Optional[str] = None
+    gameId: Optional[str] = None
+    matcher: MatcherName = "orb"
+    profile: Optional[str] = None
+
+
+class ScanSeat(BaseModel):
+    """
+    One detected seat: circle in image coordinates, appearance hashes (hex), its parsed
+    result and the token crop (greyscale JPEG, base64) so it can be rematched later.
+    """
+    token: int
+    x: int
+    y: int
+    r: int
+    tokenHash: str
+    nameHash: str
+    parsed: ParsedToken
+    crop: Optional[str] = None
+
+
+class ScanDocument(BaseModel):
+    """
+    Stored scan of a grimoire photo. The latest one of a game is the baseline for the
+    next rescan. A scan made without a game has no gameId until the game it was imported
+    into is saved with its scanId; until then it expires at expiresAt.
+    """
+    scanId: str
+    gameId: Optional[str] = None
+    serverId: Optional[str] = None
+    createdAt: str
+    createdBy: Optional[str] = None
+    baseScanId: Optional[str] = None
+    seats: List[ScanSeat] = []
+    townSquare: TownSquareGameState
+    # Reference library and matcher the seats were matched with (see app.services.rematch)
+    refPackVersion: Optional[str] = None
+    matcher: str = "orb"
+    # Pipeline profile the scan ran with (see app.services.pipeline_profiles)
+    profile: Optional[str] = None
+    expiresAt: Optional[datetime] = None
+
+    model_config = {"extra": "ignore"}
+
+
+class RoleChange(BaseModel):
+    player: str
+    before: str
+    after: str
+
+
+class ScanDiff(BaseModel):
+    """Changes between the previous scan's Town Square state and the new one, keyed by player name."""
+    newDeaths: List[str] = []
+    revived: List[str] = []
+    roleChanges: List[RoleChange] = []
+    addedPlayers: List[str] = []
+    removedPlayers: List[str] = []
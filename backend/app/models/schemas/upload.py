@@ -0,0 +1,10 @@
+"""Resumable upload request bodies."""
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class UploadCreateBody(BaseModel):
+    """Body for starting a resumable upload: the file's name and exact size in bytes."""
+    filename: Optional[str] = None
+    size: int = Field(..., gt=0)
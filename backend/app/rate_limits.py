@@ -0,0 +1,253 @@
+"""
+Rate limits for the expensive routes. The grimoire and debug routes need no login and
+each costs seconds of CPU, so one client (or a runaway retry loop) could keep every
+worker busy. Each limited route belongs to a rule with a token bucket per caller: the
+user id when the request carries a valid access token (as get_optional_user reads it),
+else the client IP. A request takes one token; an empty bucket answers 429 with
+Retry-After, before the request queues for its lane or its body is read.
+
+Buckets live in memory (per worker process) or, with RATE_LIMIT_BACKEND=mongo, in a
+Mongo collection shared by all workers. Rejections are counted in metrics
+(rate_limited by rule) and bucket state per rule is reported by /api/metrics.
+"""
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth import get_optional_user
+from app.services.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+SCAN_RULE = "scan"
+DEBUG_RULE = "debug"
+
+# (rule, methods, path pattern), first match wins; other routes are not limited
+RATE_LIMIT_ROUTES: List[Tuple[str, Tuple[str, ...], str]] = [
+    (DEBUG_RULE, ("POST",), r"/api/debug/pipeline"),
+    (SCAN_RULE, ("POST",), r"/api/grimoire/(process|process-multi|process-burst|process-crops|detect|jobs)"),
+    (SCAN_RULE, ("POST",), r"/api/grimoire/uploads(/[^/]+/finalize)?"),
+    # Full pipeline runs over the server's grimoire images directory
+    (SCAN_RULE, ("GET",), r"/api/(match-tokens|grimoire/parse|grimoire/townsquare|grimoire/extract-tokens)"),
+]
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """capacity requests in a burst, refilled at capacity per period_s seconds."""
+    capacity: int
+    period_s: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period_s
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """From "N/S": N requests per S seconds (also the burst size)."""
+        count, _, seconds = spec.partition("/")
+        limit = cls(int(count), float(seconds or 60))
+        if limit.capacity < 1 or limit.period_s <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}; expected N/SECONDS")
+        return limit
+
+
+class MemoryBuckets:
+    """Token buckets in this process, least recently used dropped beyond max_keys."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # (rule, key) -> (tokens, monotonic time of last update)
+        self._buckets: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+
+    def _refilled(self, entry: Optional[Tuple[float, float]], limit: RateLimit, now: float) -> float:
+        if entry is None:
+            return float(limit.capacity)
+        tokens, updated = entry
+        return min(float(limit.capacity), tokens + (now - updated) * limit.rate)
+
+    async def take(self, rule: str, key: str, limit: RateLimit) -> float:
+        """Take a token if there is one; returns the tokens left before taking (< 1: refused)."""
+        now = time.monotonic()
+        tokens = self._refilled(self._buckets.get((rule, key)), limit, now)
+        self._buckets[(rule, key)] = (tokens - 1 if tokens >= 1 else tokens, now)
+        self._buckets.move_to_end((rule, key))
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return tokens
+
+    async def snapshot(self, rule: str, limit: RateLimit) -> Dict[str, int]:
+        now = time.monotonic()
+        levels = [self._refilled(entry, limit, now) for (r, _), entry in list(self._buckets.items()) if r == rule]
+        return {
+            "buckets": sum(level < limit.capacity for level in levels),
+            "exhausted": sum(level < 1 for level in levels),
+        }
+
+
+class MongoBuckets:
+    """
+    Token buckets in a Mongo collection shared by all workers. Each take is one atomic
+    update (refill, then take if a token is left); idle buckets expire via a TTL index.
+    """
+
+    def __init__(self, collection: Callable[[], AsyncIOMotorCollection]):
+        self._collection = collection
+
+    async def take(self, rule: str, key: str, limit: RateLimit) -> float:
+        now = time.time()
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updatedAt", now]}]}]}
+        tokens = {
+            "$min": [
+                limit.capacity,
+                {"$add": [{"$ifNull": ["$tokens", limit.capacity]}, {"$multiply": [elapsed, limit.rate]}]},
+            ]
+        }
+        raw = await self._collection().find_one_and_update(
+            {"_id": f"{rule}:{key}"},
+            [
+                {"$set": {"rule": rule, "before": tokens, "updatedAt": now}},
+                {
+                    "$set": {
+                        "tokens": {"$cond": [{"$gte": ["$before", 1]}, {"$subtract": ["$before", 1]}, "$before"]},
+                        # Full again by then; the bucket can go
+                        "expiresAt": datetime.now(timezone.utc) + timedelta(seconds=limit.period_s),
+                    }
+                },
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return raw["before"]
+
+    async def snapshot(self, rule: str, limit: RateLimit) -> Dict[str, int]:
+        now = time.time()
+        level = {"$add": ["$tokens", {"$multiply": [{"$subtract": [now, "$updatedAt"]}, limit.rate]}]}
+        collection = self._collection()
+        return {
+            "buckets": await collection.count_documents({"rule": rule, "$expr": {"$lt": [level, limit.capacity]}}),
+            "exhausted": await collection.count_documents({"rule": rule, "$expr": {"$lt": [level, 1]}}),
+        }
+
+
+class RateLimiter:
+    """Rules by name, the routes they apply to, and the bucket backend."""
+
+    def __init__(
+        self,
+        limits: Dict[str, RateLimit],
+        backend,
+        metrics: Metrics,
+        routes: List[Tuple[str, Tuple[str, ...], str]] = RATE_LIMIT_ROUTES,
+        trust_forwarded: bool = False,
+        proxy_hops: int = 1,
+    ):
+        self.limits = limits
+        self.backend = backend
+        self.metrics = metrics
+        self.trust_forwarded = trust_forwarded
+        self.proxy_hops = max(1, proxy_hops)
+        self._routes: List[Tuple[str, Tuple[str, ...], Pattern[str]]] = [
+            (rule, methods, re.compile(pattern)) for rule, methods, pattern in routes if rule in limits
+        ]
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        """The rule limiting this route, or None."""
+        for rule, methods, pattern in self._routes:
+            if method in methods and pattern.fullmatch(path):
+                return rule
+        return None
+
+    async def caller_key(self, request: Request) -> str:
+        """
+        user:<id> for a valid access token, else ip:<client address>. Behind trusted
+        proxies the address is the X-Forwarded-For entry added by the outermost one
+        (proxy_hops from the right): the entries left of it are set by the client.
+        """
+        user = await get_optional_user(request.cookies.get("access_token"), request.headers.get("authorization"))
+        if user:
+            return f"user:{user['userId']}"
+        if self.trust_forwarded:
+            forwarded = [
+                entry.strip()
+                for header in request.headers.getlist("x-forwarded-for")
+                for entry in header.split(",")
+                if entry.strip()
+            ]
+            if len(forwarded) >= self.proxy_hops:
+                return f"ip:{forwarded[-self.proxy_hops]}"
+        return f"ip:{request.client.host if request.client else '-'}"
+
+    async def check(self, rule: str, key: str) -> Optional[float]:
+        """None when allowed, else the seconds until a token is available."""
+        limit = self.limits[rule]
+        try:
+            tokens = await self.backend.take(rule, key, limit)
+        except Exception as e:
+            # A shared backend that is down must not take the API with it
+            logger.warning("rate limit check failed, allowing request: %s", e)
+            return None
+        if tokens >= 1:
+            return None
+        self.metrics.inc("rate_limited", rule=rule, caller=key.split(":", 1)[0])
+        return (1 - tokens) / limit.rate
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Per rule: its limit, buckets not full and buckets empty right now."""
+        snapshot: Dict[str, Any] = {}
+        for rule, limit in self.limits.items():
+            entry: Dict[str, Any] = {"capacity": limit.capacity, "periodS": limit.period_s}
+            try:
+                entry.update(await self.backend.snapshot(rule, limit))
+            except Exception as e:
+                entry["error"] = str(e)
+            snapshot[rule] = entry
+        return snapshot
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 once the caller's bucket for the route is empty."""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def _reject(self, send: Send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Too many requests; slow down and try again shortly."}).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = (
+            self.limiter.classify(scope["method"], scope.get("path", ""))
+            if scope["type"] == "http"
+            else None
+        )
+        if rule is not None:
+            key = await self.limiter.caller_key(Request(scope))
+            retry_after = await self.limiter.check(rule, key)
+            if retry_after is not None:
+                await self._reject(send, retry_after)
+                return
+        await self.app(scope, receive, send)
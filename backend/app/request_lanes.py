@@ -0,0 +1,170 @@
+"""
+Request lanes: every request is classified by method and path into a lane (interactive
+CRUD, scan, upload, debug), and each lane has its own concurrency limit and queue. A
+burst of grimoire scans therefore waits in the scan lane instead of taking the event
+loop and threadpool from cheap routes like /api/auth/me: the interactive lane's slots
+are its own and cannot be used up by scans. Routes that only receive a body (queued
+job photos, resumable upload chunks) hold their slot while a slow client sends it, so
+they have their own upload lane rather than taking pipeline slots.
+A lane whose queue is full answers 503 with Retry-After. Lane waits are counted in
+metrics (lane_requests, lane_queue_wait_ms, lane_rejected) and returned in the
+X-Queue-Wait-Ms header.
+"""
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import Metrics
+
+INTERACTIVE = "interactive"
+SCAN = "scan"
+UPLOAD = "upload"
+DEBUG = "debug"
+
+# (lane, methods, path pattern), first match wins; lane None bypasses the lanes
+# (health checks, and job polling, which only sleeps between Mongo reads)
+LANE_RULES: List[Tuple[Optional[str], Tuple[str, ...], str]] = [
+    (None, ("GET",), r"/api/(health|ready|metrics)"),
+    (None, ("GET",), r"/api/grimoire/jobs/[^/]+(/events)?"),
+    (DEBUG, ("POST",), r"/api/debug/pipeline"),
+    (SCAN, ("POST",), r"/api/grimoire/(process|process-multi|process-burst|process-crops|detect)"),
+    (SCAN, ("POST",), r"/api/grimoire/uploads/[^/]+/finalize"),
+    # Request bodies only, no pipeline run: job photos and resumable upload chunks
+    (UPLOAD, ("POST",), r"/api/grimoire/(jobs|uploads)"),
+    (UPLOAD, ("PUT",), r"/api/grimoire/uploads/[^/]+"),
+    (SCAN, ("GET",), r"/api/(match-tokens|grimoire/parse|grimoire/townsquare|grimoire/extract-tokens)"),
+]
+
+
+class LaneFull(Exception):
+    """The lane's queue is full."""
+
+
+@dataclass
+class Lane:
+    """Up to concurrency requests at once, and up to queue_depth more waiting in order."""
+    name: str
+    concurrency: int
+    queue_depth: int
+    running: int = 0
+    waiting: int = 0
+    _semaphore: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+
+    async def acquire(self) -> float:
+        """Take a slot, waiting if needed; returns seconds waited. Raises LaneFull."""
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self._semaphore.locked() and self.waiting >= self.queue_depth:
+            raise LaneFull(f"{self.running} running and {self.waiting} queued in the {self.name} lane")
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return time.perf_counter() - start
+
+    def release(self) -> None:
+        self.running -= 1
+        self._semaphore.release()
+
+
+class LaneScheduler:
+    """Lanes by name plus the rules that classify requests into them."""
+
+    def __init__(
+        self,
+        lanes: Iterable[Lane],
+        metrics: Metrics,
+        rules: List[Tuple[Optional[str], Tuple[str, ...], str]] = LANE_RULES,
+        default: str = INTERACTIVE,
+    ):
+        self.lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self.metrics = metrics
+        self.default = default
+        self._rules: List[Tuple[Optional[str], Tuple[str, ...], Pattern[str]]] = [
+            (lane, methods, re.compile(pattern)) for lane, methods, pattern in rules
+        ]
+
+    def classify(self, method: str, path: str) -> Optional[Lane]:
+        """The request's lane, or None when it bypasses the lanes."""
+        for lane, methods, pattern in self._rules:
+            if method in methods and pattern.fullmatch(path):
+                return self.lanes[lane] if lane is not None else None
+        return self.lanes[self.default]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current occupancy per lane (waits and rejections are in the metrics counters)."""
+        return {
+            name: {
+                "concurrency": lane.concurrency,
+                "queueDepth": lane.queue_depth,
+                "running": lane.running,
+                "waiting": lane.waiting,
+            }
+            for name, lane in self.lanes.items()
+        }
+
+
+class RequestLaneMiddleware:
+    """ASGI middleware running each HTTP request in its lane's slot."""
+
+    def __init__(self, app: ASGIApp, scheduler: LaneScheduler):
+        self.app = app
+        self.scheduler = scheduler
+
+    async def _reject(self, send: Send, lane: Lane) -> None:
+        body = json.dumps({"detail": "Server busy; try again in a moment."}).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                    (b"retry-after", b"5" if lane.name == INTERACTIVE else b"15"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        lane = (
+            self.scheduler.classify(scope["method"], scope.get("path", ""))
+            if scope["type"] == "http"
+            else None
+        )
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.scheduler.metrics
+        try:
+            waited = await lane.acquire()
+        except LaneFull:
+            metrics.inc("lane_rejected", lane=lane.name)
+            await self._reject(send, lane)
+            return
+        wait_ms = round(waited * 1000, 1)
+        metrics.inc("lane_requests", lane=lane.name)
+        metrics.inc("lane_queue_wait_ms", wait_ms, lane=lane.name)
+
+        async def send_with_wait(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"x-queue-wait-ms", str(wait_ms).encode("ascii"))],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_wait)
+        finally:
+            lane.release()
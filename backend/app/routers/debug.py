@@ -2,34 +2,38 @@
 Debug pipeline endpoint - no auth required.
 
 POST /api/debug/pipeline
-  Accepts a multipart image upload (field "file"), runs every pipeline stage,
-  and returns a detailed JSON trace of each step.
-
-  When the filesystem is writable (local dev), debug images are also saved to
-  detected_tokens/debug_<timestamp>/ so you can inspect what the pipeline sees.
-  On Render (read-only FS) the image-saving steps are skipped gracefully.
+  Accepts a multipart image upload (field "file") and the query parameters of
+  /api/grimoire/process (server_id, matcher, profile), runs every pipeline stage on the
+  same stage engine with the same inputs (traced, so each stage record carries its
+  detail), and returns a detailed JSON trace of each step.
+
+  Debug images (detection overlay, token crops, name regions) are only collected during
+  the request; a background writer encodes them and, when the filesystem is writable
+  (local dev), saves them to detected_tokens/debug_<run id>/. On Render (read-only FS)
+  saving is skipped; the images are still downloadable.
+
+GET /api/debug/artifacts/{run_id}.zip
+  The debug images of a recent /pipeline run as one zip, streamed once they are encoded.
 """
 import logging
 import time
 import traceback
-from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-import cv2
-import numpy as np
-from fastapi import APIRouter, File, UploadFile
-from fastapi.responses import JSONResponse
-
-from app.config import DETECTED_TOKENS_DIR
-from app.dependencies import (
-    circle_detector,
-    orb_matcher,
-    player_name_extractor,
-    token_processor,
-)
-from app.services.match_tokens import match_tokens as run_match_tokens
-from app.services.token_processor import TokenProcessor
-from app.utils.circle_order import sort_circles_reading_order
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.auth import get_optional_user
+from app.config import ALLOWED_IMAGE_TYPES, DETECTED_TOKENS_DIR, MAX_UPLOAD_MB
+from app.dependencies import debug_artifacts, grimoire_engines, token_processor
+from app.models.schemas import ScanParams
+from app.routers.grimoire import _scan_cancellation, scan_params
+from app.services.grimoire_stages import IMAGE, MATCHES, NAMES, SEATS, TOKEN_IMAGES, TOWN_SQUARE
+from app.services.memory_budget import image_sizes
+from app.services.pipeline_engine import StageError
+from app.services.scan_flows import engine_inputs, get_profile, load_server_roster, plan_images, scan_memory
+from app.upload_limits import read_upload
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +45,7 @@ def _ms(t0: float) -> float:
 
 
 def _step(steps: List[Dict], name: str, ok: bool, detail: Any = None, error: str = None):
-    entry: Dict[str, Any] = {"step": name, "ok": ok}
+    entry: Dict[str, Any] = {"stage": name, "ok": ok}
     if detail is not None:
         entry["detail"] = detail
     if error:
@@ -49,30 +53,19 @@ def _step(steps: List[Dict], name: str, ok: bool, detail: Any = None, error: str
     steps.append(entry)
 
 
-def _try_mkdir(path: Path) -> bool:
-    """Create directory; return False (and stay silent) if filesystem is read-only."""
-    try:
-        path.mkdir(parents=True, exist_ok=True)
-        return True
-    except OSError:
-        return False
-
-
-def _try_imwrite(path: Path, img: np.ndarray) -> bool:
-    """Write image; return False silently if filesystem is read-only."""
-    try:
-        cv2.imwrite(str(path), img)
-        return True
-    except OSError:
-        return False
-
-
 @router.post("/pipeline")
-async def debug_pipeline(file: UploadFile = File(...)):
+async def debug_pipeline(
+    request: Request,
+    file: UploadFile = File(...),
+    params: ScanParams = Depends(scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
     """
-    Run the full grimoire pipeline step-by-step and return a verbose JSON trace.
-    No authentication required.
-    Debug images are saved locally when the filesystem allows it.
+    Run the full grimoire pipeline step-by-step and return a verbose JSON trace, with the
+    profile, matcher, roster, script roles and detection scale /grimoire/process would use.
+    No authentication required. Like /grimoire/process, the run is abandoned when the
+    client disconnects and answered with 504 after SCAN_DEADLINE_S.
+    Debug images are encoded in the background; download them from artifacts_url.
     """
     steps: List[Dict] = []
     t0 = time.time()
@@ -81,187 +74,138 @@ async def debug_pipeline(file: UploadFile = File(...)):
     # 1. Read upload
     # ------------------------------------------------------------------
     try:
-        content = await file.read()
-        _step(steps, "1_read_upload", True, {
+        content, media_type = await read_upload(file, ALLOWED_IMAGE_TYPES, MAX_UPLOAD_MB)
+        _step(steps, "read_upload", True, {
             "filename": file.filename,
-            "content_type": file.content_type,
+            "content_type": media_type,
             "size_bytes": len(content),
         })
+    except HTTPException as e:
+        _step(steps, "read_upload", False, error=e.detail)
+        return JSONResponse(status_code=e.status_code, content={"steps": steps, "elapsed_ms": _ms(t0)})
     except Exception as e:
-        _step(steps, "1_read_upload", False, error=str(e))
+        _step(steps, "read_upload", False, error=str(e))
         return JSONResponse(status_code=500, content={"steps": steps, "elapsed_ms": _ms(t0)})
 
     # ------------------------------------------------------------------
-    # 2. Decode image
-    # ------------------------------------------------------------------
-    try:
-        arr = np.frombuffer(content, dtype=np.uint8)
-        image = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        if image is None:
-            raise ValueError("cv2.imdecode returned None – not a valid image file")
-        h, w = image.shape[:2]
-        _step(steps, "2_decode_image", True, {"width": w, "height": h, "channels": image.shape[2]})
-    except Exception as e:
-        _step(steps, "2_decode_image", False, error=str(e))
-        return JSONResponse(status_code=422, content={"steps": steps, "elapsed_ms": _ms(t0)})
-
-    # ------------------------------------------------------------------
-    # 3. Debug output directory (optional – skipped on read-only FS)
-    # ------------------------------------------------------------------
-    debug_tag = f"debug_{int(t0)}"
-    debug_dir: Optional[Path] = None
-    dir_available = _try_mkdir(DETECTED_TOKENS_DIR / debug_tag)
-    if dir_available:
-        debug_dir = DETECTED_TOKENS_DIR / debug_tag
-        _step(steps, "3_debug_dir", True, {"path": str(debug_dir)})
-    else:
-        _step(steps, "3_debug_dir", False, error="Filesystem is read-only – debug images will not be saved")
-
-    # ------------------------------------------------------------------
-    # 4. Circle detection
+    # 2. Pipeline stages (same engine as /api/grimoire/process, traced)
     # ------------------------------------------------------------------
-    detected_circles: List = []
-    try:
-        detected_circles = circle_detector.detect_circles(image)
-        _step(steps, "4_circle_detector", True, {
-            "circles_found": len(detected_circles),
-            "params": circle_detector.get_detection_params(),
-            "circles": [{"x": int(x), "y": int(y), "r": int(r)} for x, y, r in detected_circles],
-        })
-    except Exception:
-        _step(steps, "4_circle_detector", False, error=traceback.format_exc())
-        return JSONResponse(status_code=500, content={"steps": steps, "elapsed_ms": _ms(t0)})
-
-    if not detected_circles:
-        _step(steps, "4_circle_detector_check", False,
+    profile = get_profile(params.profile)
+    plan = plan_images(image_sizes([content]), content_bytes=len(content))
+    roster = await load_server_roster(params.serverId, current_user) if params.serverId else None
+    inputs = engine_inputs(content, roster, plan, profile)
+    _step(steps, "inputs", True, {
+        "profile": profile.name,
+        "matcher": params.matcher,
+        "server_id": params.serverId,
+        "roster_names": len(roster) if roster is not None else None,
+        "detection_scale": inputs["detection_scale"],
+    })
+    async with _scan_cancellation(request) as cancel:
+        try:
+            async with scan_memory(plan, cancel):
+                run = await run_in_threadpool(
+                    grimoire_engines[(profile.name, params.matcher)].run,
+                    inputs,
+                    [IMAGE, TOKEN_IMAGES, TOWN_SQUARE],
+                    True,
+                    lambda record: steps.append(record.to_dict()),
+                    cancel,
+                )
+        except StageError as e:
+            if e.stage == "decode":
+                return JSONResponse(status_code=422, content={"steps": steps, "elapsed_ms": _ms(t0)})
+            failed = next(step for step in reversed(steps) if step["stage"] == e.stage)
+            failed["error"] = "".join(traceback.format_exception(e.cause))
+            return JSONResponse(status_code=500, content={"steps": steps, "elapsed_ms": _ms(t0)})
+    image = run.values[IMAGE]
+    seats = run.values[SEATS]
+    if not seats:
+        _step(steps, "circle_detector_check", False,
               error="No circles detected – pipeline cannot continue. Try a clearer photo.")
         return JSONResponse(status_code=200, content={"steps": steps, "elapsed_ms": _ms(t0)})
 
     # ------------------------------------------------------------------
-    # 5. Sort circles in reading order
+    # 3. Debug images (collected here; encoded and saved in the background)
     # ------------------------------------------------------------------
-    sorted_circles = detected_circles
+    artifacts = debug_artifacts.new_run()
     try:
-        sorted_circles = sort_circles_reading_order(detected_circles)
-        _step(steps, "5_sort_circles", True, {
-            "order": [{"x": int(x), "y": int(y), "r": int(r)} for x, y, r in sorted_circles],
-        })
-    except Exception as e:
-        _step(steps, "5_sort_circles", False, error=str(e))
-
-    # ------------------------------------------------------------------
-    # 6. Detection visualisation (saved locally when FS is writable)
-    # ------------------------------------------------------------------
-    try:
-        name_regions = token_processor.get_player_name_regions(sorted_circles, (h, w))
-        vis = token_processor.create_visualization(image, sorted_circles, name_regions)
-        if debug_dir:
-            _try_imwrite(debug_dir / "detection.png", vis)
-            _try_imwrite(DETECTED_TOKENS_DIR / "detection.png", vis)
-        _step(steps, "6_detection_vis", True, {
-            "saved": bool(debug_dir),
-            "path": str(debug_dir / "detection.png") if debug_dir else None,
+        h, w = image.shape[:2]
+        name_regions = token_processor.get_player_name_regions(seats, (h, w))
+        artifacts.add("detection.png", token_processor.create_visualization(image, seats, name_regions))
+        for idx, token in enumerate(run.values[TOKEN_IMAGES]):
+            artifacts.add(f"{idx + 1}.png", token)
+        for idx, (x, y, r) in enumerate(seats):
+            region = profile.player_name_extractor.extract_player_name_region(image, (int(x), int(y)))
+            artifacts.add(f"name_region_{idx + 1}.png", region)
+            try:
+                artifacts.add(
+                    f"name_region_{idx + 1}_preprocessed.png",
+                    profile.player_name_extractor.preprocess_for_ocr(region),
+                )
+            except Exception:
+                pass
+        # Also saved locally when the filesystem is writable, as before
+        artifacts.save_dirs = [DETECTED_TOKENS_DIR / f"debug_{artifacts.run_id}"]
+        artifacts.canonical = {
+            name: DETECTED_TOKENS_DIR / name
+            for name in ["detection.png"] + [f"{idx + 1}.png" for idx in range(len(seats))]
+        }
+        image_count = len(artifacts.images)
+        debug_artifacts.submit(artifacts)
+        artifacts_url = f"/api/debug/artifacts/{artifacts.run_id}.zip"
+        _step(steps, "debug_images", True, {
+            "run_id": artifacts.run_id,
+            "images": image_count,
+            "artifacts_url": artifacts_url,
         })
     except Exception as e:
-        _step(steps, "6_detection_vis", False, error=str(e))
+        artifacts_url = None
+        _step(steps, "debug_images", False, error=str(e))
 
     # ------------------------------------------------------------------
-    # 7. Extract + save token images
-    # ------------------------------------------------------------------
-    extracted_tokens = []
-    try:
-        if debug_dir:
-            debug_tp = TokenProcessor(token_processor.token_detector, debug_dir)
-            extracted_tokens = debug_tp.extract_tokens(image, sorted_circles)
-            debug_tp.save_tokens(extracted_tokens, "debug")
-
-            canonical_tp = TokenProcessor(token_processor.token_detector, DETECTED_TOKENS_DIR)
-            canonical_tp.save_tokens(extracted_tokens, "grimoire")
-        else:
-            extracted_tokens = token_processor.extract_tokens(image, sorted_circles)
-
-        _step(steps, "7_extract_tokens", True, {
-            "tokens_extracted": len(extracted_tokens),
-            "saved": bool(debug_dir),
-        })
-    except Exception:
-        _step(steps, "7_extract_tokens", False, error=traceback.format_exc())
-
-    # ------------------------------------------------------------------
-    # 8. Player name OCR (per circle)
-    # ------------------------------------------------------------------
-    player_names: Dict[int, str] = {}
-    for idx, (x, y, r) in enumerate(sorted_circles):
-        try:
-            region = player_name_extractor.extract_player_name_region(image, (int(x), int(y)))
-
-            if debug_dir:
-                _try_imwrite(debug_dir / f"name_region_{idx + 1}.png", region)
-                try:
-                    processed = player_name_extractor._preprocess_for_ocr(region)
-                    _try_imwrite(debug_dir / f"name_region_{idx + 1}_preprocessed.png", processed)
-                except Exception:
-                    pass
-
-            name = player_name_extractor.extract_name_from_region(region)
-            player_names[idx] = name or ""
-            _step(steps, f"8_ocr_token_{idx + 1}", True, {
-                "circle": {"x": int(x), "y": int(y), "r": int(r)},
-                "extracted_name": name,
-            })
-        except Exception as e:
-            player_names[idx] = ""
-            _step(steps, f"8_ocr_token_{idx + 1}", False, error=str(e))
-
-    # ------------------------------------------------------------------
-    # 9. ORB character matching
-    # ------------------------------------------------------------------
-    matches = []
-    try:
-        matches = run_match_tokens(DETECTED_TOKENS_DIR, orb_matcher)
-        _step(steps, "9_orb_matching", True, {
-            "matches_found": len(matches),
-            "matches": [
-                {
-                    "token": m.token,
-                    "character": m.character,
-                    "character_type": m.character_type,
-                    "confidence": round(m.confidence, 4),
-                    "is_dead": m.is_dead,
-                }
-                for m in matches
-            ],
-        })
-    except Exception:
-        _step(steps, "9_orb_matching", False, error=traceback.format_exc())
-
-    # ------------------------------------------------------------------
-    # 10. Summary
+    # 4. Summary
     # ------------------------------------------------------------------
+    player_names: Dict[int, str] = run.values[NAMES]
+    matches = run.values[MATCHES]
+    match_by_token = {m.token: m for m in matches}
     summary = {
-        "total_circles": len(sorted_circles),
+        "total_circles": len(seats),
         "names_extracted": sum(1 for n in player_names.values() if n),
         "characters_matched": len(matches),
-        "debug_images_saved": bool(debug_dir),
-        "debug_images_dir": str(debug_dir) if debug_dir else None,
+        "debug_run_id": artifacts.run_id if artifacts_url else None,
+        "artifacts_url": artifacts_url,
         "players": [
             {
                 "position": idx + 1,
                 "circle": {"x": int(x), "y": int(y), "r": int(r)},
                 "player_name": player_names.get(idx, "") or "",
-                "character": next((m.character for m in matches if m.token == idx + 1), None),
-                "confidence": next(
-                    (round(m.confidence, 4) for m in matches if m.token == idx + 1), None
+                "character": match_by_token[idx + 1].character if idx + 1 in match_by_token else None,
+                "confidence": (
+                    round(match_by_token[idx + 1].confidence, 4) if idx + 1 in match_by_token else None
                 ),
-                "is_dead": next((m.is_dead for m in matches if m.token == idx + 1), None),
+                "is_dead": match_by_token[idx + 1].is_dead if idx + 1 in match_by_token else None,
             }
-            for idx, (x, y, r) in enumerate(sorted_circles)
+            for idx, (x, y, r) in enumerate(seats)
         ],
     }
-    _step(steps, "10_summary", True, summary)
+    _step(steps, "summary", True, summary)
 
     return JSONResponse(content={
         "steps": steps,
         "summary": summary,
         "elapsed_ms": _ms(t0),
     })
+
+
+@router.get("/artifacts/{run_id}.zip")
+def debug_artifacts_zip(run_id: str):
+    """Debug images of a /pipeline run as a zip (waits for the background writer)."""
+    artifacts = debug_artifacts.get(run_id)
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail="Debug run not found or expired")
+    return StreamingResponse(
+        debug_artifacts.zip_stream(artifacts),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="debug_{run_id}.zip"'},
+    )
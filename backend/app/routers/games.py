@@ -21,7 +21,13 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.auth import get_current_user, get_optional_user
-from app.db import get_games_collection, get_memberships_collection, get_servers_collection, get_users_collection
+from app.db import (
+    get_games_collection,
+    get_memberships_collection,
+    get_scans_collection,
+    get_servers_collection,
+    get_users_collection,
+)
 from app.models.schemas import (
     CopyGameBody,
     GameCreateBody,
@@ -93,6 +99,21 @@ async def _get_game_by_server_and_slug_or_404(
     return GameDocument(**raw)
 
 
+async def _attach_scan(scan_id: str, game: GameDocument, user_id: str) -> None:
+    """
+    Tie a scan made without a game (see /api/grimoire/process) to the game it was imported
+    into: it becomes the game's rescan baseline and no longer expires. Scans already in a
+    game or made by another user are left alone; an expired scan is simply gone.
+    """
+    await get_scans_collection().update_one(
+        {"scanId": scan_id, "gameId": None, "createdBy": {"$in": [None, user_id]}},
+        {
+            "$set": {"gameId": game.gameId, "serverId": game.serverId, "createdBy": user_id},
+            "$unset": {"expiresAt": ""},
+        },
+    )
+
+
 def _enforce_visibility(game: GameDocument, current_user: Optional[dict]) -> None:
     """
     Raise 403 if the caller is not allowed to view this game.
@@ -148,6 +169,8 @@ async def create_game(
         winner=body.winner,
     )
     await collection.insert_one(doc.model_dump(mode="json"))
+    if body.scanId:
+        await _attach_scan(body.scanId, doc, current_user["userId"])
     return doc.model_dump(mode="json")
 
 
@@ -299,6 +322,7 @@ async def update_game(
         raise HTTPException(status_code=403, detail="Only the game owner can edit it.")
 
     updates = body.model_dump(exclude_unset=True)
+    scan_id = updates.pop("scanId", None)
     for key, value in updates.items():
         setattr(game, key, value)
     game.updatedAt = datetime.now(timezone.utc).isoformat()
@@ -308,6 +332,8 @@ async def update_game(
         {"serverId": server_id, "gameId": game_id},
         game.model_dump(mode="json"),
     )
+    if scan_id:
+        await _attach_scan(scan_id, game, current_user["userId"])
     return game.model_dump(mode="json")
 
 
@@ -1,46 +1,101 @@
 """Grimoire processing routes: extract, match, parse, Town Square, upload."""
+import asyncio
+import json
 import logging
+import math
 import shutil
 import tempfile
 import time
 import traceback
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from starlette.requests import ClientDisconnect
+
+from app.auth import get_optional_user
 
 from app.config import (
     ALLOWED_IMAGE_TYPES,
+    ALLOWED_VIDEO_TYPES,
+    CAPTURE_JPEG_QUALITY,
     DETECTED_TOKENS_DIR,
     GRIMOIRE_IMAGES_DIR,
     INCLUDE_TRACEBACK_IN_ERROR,
+    JOB_POLL_S,
+    JOB_WAIT_MAX_S,
+    MAX_BURST_IMAGES,
+    MAX_CAPTURE_SEATS,
+    MAX_CROP_UPLOAD_MB,
+    MAX_MERGE_IMAGES,
     MAX_UPLOAD_MB,
+    MAX_VIDEO_UPLOAD_MB,
+    SCAN_DEADLINE_S,
+    SCAN_DISCONNECT_POLL_S,
+    SCAN_MEMORY_PER_SCAN_MB,
+    UPLOAD_SESSION_CHUNK_BYTES,
+    UPLOAD_SESSION_MAX_CHUNK_BYTES,
 )
 from app.dependencies import (
     circle_detector,
     image_processor,
+    metrics,
+    ocr_executor,
     orb_matcher,
     player_name_extractor,
+    profiles,
+    rate_limiter,
+    scan_jobs,
     token_processor,
+    upload_sessions,
 )
 from app.models.schemas import (
+    CaptureSeat,
     DebugInfo,
     ExtractedData,
     GrimoireResponse,
     ImageInfo,
+    MatcherName,
     MatchTokensResponse,
     ParseGrimoireResponse,
     PlayerData,
+    ScanJobDocument,
+    ScanParams,
     TownSquareGameState,
+    UploadCreateBody,
 )
 from app.adapters.json_formats import normalize_from_json
-from app.services.grimoire_pipeline import (
-    extract_and_match,
-    parsed_tokens_to_town_square,
-)
+from app.services.burst import MAX_BURST_FRAMES, probe_video
+from app.services.cancellation import DEADLINE, DISCONNECTED, CancelToken, ScanCancelled
+from app.services.grimoire_pipeline import extract_and_match, parsed_tokens_to_town_square
 from app.services.match_tokens import match_tokens as run_match_tokens
-from app.services.token_processor import TokenProcessor
+from app.services.memory_budget import image_sizes, max_frame_pixels, read_image_size
+from app.services.pipeline_profiles import DEFAULT_PROFILE
+from app.services.player_name_extractor import (
+    NAME_REGION_HEIGHT,
+    NAME_REGION_OFFSET_Y,
+    NAME_REGION_WIDTH,
+)
+from app.services.scan_flows import (
+    ScanError,
+    detect_seats,
+    get_owned_game,
+    get_profile,
+    plan_images,
+    scan_burst,
+    scan_crops,
+    scan_merged,
+    scan_photo,
+)
+from app.services.scan_jobs import FINISHED, job_status
+from app.services.token_detector import TOKEN_CROP_PADDING
+from app.services.upload_sessions import CallerUploadsFull, UploadSession, UploadSessionsFull
+from app.upload_limits import read_image_upload, read_upload
+from app.utils.character_matcher import get_script_roles
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +132,8 @@ async def parse_grimoire():
         token_processor,
         player_name_extractor,
         orb_matcher,
+        script_roles=get_script_roles("bmr"),
+        ocr_executor=ocr_executor,
     )
     if result.extract_result.total_tokens == 0:
         return ParseGrimoireResponse(tokens=[])
@@ -97,6 +154,8 @@ async def parse_townsquare():
         token_processor,
         player_name_extractor,
         orb_matcher,
+        script_roles=get_script_roles("bmr"),
+        ocr_executor=ocr_executor,
     )
     if result.extract_result.total_tokens == 0:
         state = TownSquareGameState(edition={"id": "bmr"}, roles="", fabled=[])
@@ -109,70 +168,553 @@ async def parse_townsquare():
     )
 
 
-async def _validate_upload(file: UploadFile) -> bytes:
-    """Validate file type and size; return content."""
-    if file.content_type and file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}",
-        )
-    content = await file.read()
-    size_mb = len(content) / (1024 * 1024)
-    if size_mb > MAX_UPLOAD_MB:
-        raise HTTPException(
-            status_code=422,
-            detail=f"File too large (max {MAX_UPLOAD_MB} MB).",
-        )
-    return content
+@asynccontextmanager
+async def _scan_cancellation(request: Request) -> AsyncIterator[CancelToken]:
+    """
+    CancelToken for a scan request: cancelled SCAN_DEADLINE_S after the request started
+    or as soon as the client disconnects (polled every SCAN_DISCONNECT_POLL_S). A scan
+    abandoned in the block is counted in metrics and answered with 504 on the deadline,
+    or 499 (nginx's "client closed request", which nobody will read) on disconnect.
+    """
+    cancel = CancelToken(SCAN_DEADLINE_S)
+
+    async def watch_disconnect() -> None:
+        while not cancel.cancelled:
+            if await request.is_disconnected():
+                cancel.cancel(DISCONNECTED)
+                return
+            await asyncio.sleep(SCAN_DISCONNECT_POLL_S)
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        yield cancel
+    except ScanCancelled as e:
+        stage = e.stage or "unknown"
+        metrics.inc("scans_cancelled", reason=e.reason, stage=stage)
+        if cancel.killed_processes:
+            metrics.inc("ocr_processes_killed", cancel.killed_processes)
+        logger.info("scan cancelled (%s) in %s", e.reason, stage)
+        if e.reason == DEADLINE:
+            raise HTTPException(
+                status_code=504,
+                detail="Reading the grimoire took too long; try again or send a smaller photo.",
+            )
+        raise HTTPException(status_code=499, detail="Client closed the request.")
+    finally:
+        watcher.cancel()
+
+
+def scan_params(
+    server_id: Optional[str] = Query(
+        None, description="Server whose known player names are used to correct OCR'd names."
+    ),
+    matcher: MatcherName = Query(
+        "orb", description="Character matcher: orb (feature matching) or embedding (HOG embeddings)."
+    ),
+    profile: str = Query(
+        DEFAULT_PROFILE,
+        description="Pipeline profile: fast (quick previews), balanced or accurate (final imports). "
+        "See /grimoire/profiles.",
+    ),
+) -> ScanParams:
+    """Query parameters of every scan route; an unknown profile is refused (422) up front."""
+    get_profile(profile)
+    return ScanParams(serverId=server_id, matcher=matcher, profile=profile)
+
+
+def game_scan_params(
+    params: ScanParams = Depends(scan_params),
+    game_id: Optional[str] = Query(
+        None,
+        description="Game to scan into. Seats unchanged since the game's last scan are reused "
+        "and the response includes a diff (new deaths, role changes).",
+    ),
+) -> ScanParams:
+    """scan_params plus the game of the single-photo routes."""
+    return params.model_copy(update={"gameId": game_id})
 
 
 @router.post("/grimoire/process")
-async def process_grimoire_image(file: UploadFile = File(..., alias="file")):
+async def process_grimoire_image(
+    request: Request,
+    file: UploadFile = File(..., alias="file"),
+    params: ScanParams = Depends(game_scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
     """
     Upload a grimoire image; run extract + match pipeline and return Town Square JSON.
     Accepts multipart/form-data with a single image file (e.g. key "file").
+    The scan is stored with its token crops and returned as scan.scanId: save the game
+    with that scanId to attach it. With game_id the scan is stored on the game at once
+    and only changed seats are reprocessed. The response's memory object reports the
+    scan's estimated and observed peak memory, and profile names the pipeline profile
+    used. The scan is abandoned when the client disconnects, and answered with 504
+    after SCAN_DEADLINE_S.
+    """
+    uploads = [(await read_image_upload(file), file.filename)]
+    async with _scan_cancellation(request) as cancel:
+        return await scan_photo(uploads, params, current_user, cancel)
+
+
+# ---------------------------------------------------------------------------
+# Resumable uploads
+# ---------------------------------------------------------------------------
+
+def _upload_status(session: UploadSession) -> Dict[str, Any]:
+    return {
+        "uploadId": session.upload_id,
+        "offset": session.received,
+        "size": session.size,
+        "complete": session.complete,
+        "chunkSize": UPLOAD_SESSION_CHUNK_BYTES,
+        "expiresAt": datetime.fromtimestamp(
+            upload_sessions.expires_at(session), tz=timezone.utc
+        ).isoformat(),
+    }
+
+
+def _get_upload_session(upload_id: str, current_user: Optional[dict]) -> UploadSession:
+    """Session by id (404 when unknown or expired); a logged-in creator's session is theirs only."""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found or expired; start a new upload.")
+    if session.owner_id and (not current_user or current_user["userId"] != session.owner_id):
+        raise HTTPException(status_code=403, detail="This upload belongs to another user.")
+    return session
+
+
+def _check_upload_head(session: UploadSession) -> None:
+    """
+    Refuse an upload as soon as its first bytes show a wrong type, or its header shows
+    an image too large for this server, instead of after the whole file was sent.
     """
-    content = await _validate_upload(file)
-    suffix = Path(file.filename or "image").suffix or ".png"
-    if suffix.lower() not in (".jpg", ".jpeg", ".png"):
-        suffix = ".png"
-    temp_source = tempfile.mkdtemp(prefix="grimoire_")
-    temp_detected = tempfile.mkdtemp(prefix="detected_")
     try:
-        source_path = Path(temp_source) / f"grimoire{suffix}"
-        source_path.write_bytes(content)
+        if session.media_type is not None and session.media_type not in ALLOWED_IMAGE_TYPES:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}",
+            )
+        if session.image_size is not None:
+            plan_images([session.image_size], content_bytes=session.size)
+    except (HTTPException, ScanError):
+        upload_sessions.remove(session.upload_id)
+        raise
+
 
-        process_token_processor = TokenProcessor(
-            token_processor.token_detector,
-            Path(temp_detected),
+@router.post("/grimoire/uploads", status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    body: UploadCreateBody,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Start a resumable upload of one grimoire photo. Send the bytes with PUT
+    /grimoire/uploads/{uploadId}?offset=N (raw body, any chunk size up to 4 MB), check
+    progress with GET after a dropped connection, then POST .../finalize to scan it.
+    A caller (user, else client IP) may have MAX_UPLOAD_SESSIONS_PER_CALLER uploads
+    in progress (429 beyond that).
+    """
+    if body.size > MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_MB} MB).")
+    try:
+        session = upload_sessions.create(
+            current_user["userId"] if current_user else None,
+            await rate_limiter.caller_key(request),
+            body.filename,
+            body.size,
         )
-        result = extract_and_match(
-            Path(temp_source),
-            Path(temp_detected),
-            image_processor,
-            circle_detector,
-            process_token_processor,
-            player_name_extractor,
-            orb_matcher,
+    except CallerUploadsFull as e:
+        logger.info("upload not started: %s", e)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many of your uploads are in progress; finish or delete one first.",
+            headers={"Retry-After": "30"},
+        )
+    except UploadSessionsFull as e:
+        logger.warning("upload not started: %s", e)
+        raise HTTPException(
+            status_code=503,
+            detail="Too many uploads in progress; try again in a moment.",
+            headers={"Retry-After": "10"},
         )
-        if result.extract_result.total_tokens == 0:
+    return _upload_status(session)
+
+
+@router.get("/grimoire/uploads/{upload_id}")
+async def get_upload(upload_id: str, current_user: Optional[dict] = Depends(get_optional_user)):
+    """Progress of a resumable upload: offset is where the next chunk must start."""
+    return _upload_status(_get_upload_session(upload_id, current_user))
+
+
+@router.put("/grimoire/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk in the file."),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Append a chunk (raw request body) at offset. Bytes are stored as they stream in, so
+    after a dropped connection the upload resumes from whatever arrived (GET for the
+    offset). A chunk may start before the offset (re-sent data) but not after it (409).
+    """
+    session = _get_upload_session(upload_id, current_user)
+    if session.lock.locked():
+        raise HTTPException(
+            status_code=409,
+            detail="Another chunk of this upload is still being received.",
+            headers={"Upload-Offset": str(session.received)},
+        )
+    async with session.lock:
+        if offset > session.received:
             raise HTTPException(
-                status_code=422,
-                detail="Couldn't read grimoire; no tokens detected. Try another photo or paste Town Square JSON.",
+                status_code=409,
+                detail=f"Chunk starts at {offset} but only {session.received} bytes have arrived.",
+                headers={"Upload-Offset": str(session.received)},
             )
-        state = parsed_tokens_to_town_square(result.parsed_tokens)
-        return {"townSquare": state.model_dump(mode="json")}
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.exception("process_grimoire_image failed: %s", e)
+        position = offset
+        try:
+            async for piece in request.stream():
+                if not piece:
+                    continue
+                if position + len(piece) - offset > UPLOAD_SESSION_MAX_CHUNK_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Chunk too large (max {UPLOAD_SESSION_MAX_CHUNK_BYTES // (1024 * 1024)} MB).",
+                        headers={"Upload-Offset": str(session.received)},
+                    )
+                try:
+                    session.write(position, piece)
+                except ValueError as e:
+                    raise HTTPException(status_code=422, detail=str(e))
+                position += len(piece)
+        except ClientDisconnect:
+            # Nobody is left to answer; what arrived is kept and the client resumes from it
+            logger.info("upload %s interrupted at %d/%d bytes", upload_id, session.received, session.size)
+        _check_upload_head(session)
+    return _upload_status(session)
+
+
+@router.delete("/grimoire/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(upload_id: str, current_user: Optional[dict] = Depends(get_optional_user)):
+    """Abandon a resumable upload and free its buffer."""
+    upload_sessions.remove(_get_upload_session(upload_id, current_user).upload_id)
+
+
+@router.post("/grimoire/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    request: Request,
+    upload_id: str,
+    params: ScanParams = Depends(game_scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Scan a completely uploaded photo; same processing and response as /grimoire/process.
+    The upload is removed afterwards, except when the server was too busy (503) or the
+    scan was cancelled (504, disconnect), so finalize can simply be retried.
+    """
+    session = _get_upload_session(upload_id, current_user)
+    if not session.complete:
         raise HTTPException(
-            status_code=500,
-            detail="Couldn't read grimoire; try another photo or paste Town Square JSON.",
+            status_code=409,
+            detail=f"Upload incomplete ({session.received} of {session.size} bytes).",
+            headers={"Upload-Offset": str(session.received)},
+        )
+    async with session.lock:
+        _check_upload_head(session)
+        try:
+            async with _scan_cancellation(request) as cancel:
+                response = await scan_photo(
+                    [(session.content(), session.filename)], params, current_user, cancel
+                )
+        except (HTTPException, ScanError) as e:
+            if e.status_code not in (499, 503, 504):
+                upload_sessions.remove(upload_id)
+            raise
+    upload_sessions.remove(upload_id)
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Scan jobs
+# ---------------------------------------------------------------------------
+
+@router.post("/grimoire/jobs", status_code=202)
+async def create_scan_job(
+    file: UploadFile = File(..., alias="file"),
+    params: ScanParams = Depends(game_scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Queue a grimoire photo for scanning and return its job id at once; a worker process
+    (python -m app.worker) runs it like /grimoire/process. Poll GET /grimoire/jobs/{id}
+    (with ?wait= to long-poll) or follow /grimoire/jobs/{id}/events for the result.
+    The photo, profile and game are checked before the job is queued.
+    """
+    content = await read_image_upload(file)
+    plan_images(image_sizes([content]), content_bytes=len(content))
+    if params.gameId:
+        await get_owned_game(params.gameId, current_user)
+    job = await scan_jobs.enqueue(
+        content, file.filename, params, current_user["userId"] if current_user else None
+    )
+    return {
+        **job_status(job),
+        "statusUrl": f"/api/grimoire/jobs/{job.jobId}",
+        "eventsUrl": f"/api/grimoire/jobs/{job.jobId}/events",
+    }
+
+
+async def _get_scan_job(job_id: str, current_user: Optional[dict]) -> ScanJobDocument:
+    """Job by id (404 when unknown or expired); a logged-in creator's job is theirs only."""
+    job = await scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found or expired.")
+    if job.createdBy and (not current_user or current_user["userId"] != job.createdBy):
+        raise HTTPException(status_code=403, detail="This scan job belongs to another user.")
+    return job
+
+
+@router.get("/grimoire/jobs/{job_id}")
+async def get_scan_job(
+    job_id: str,
+    wait: float = Query(
+        0, ge=0, description="Seconds to wait for the job to finish before answering (long-poll)."
+    ),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    A scan job's status: queued, running, succeeded (result holds the /grimoire/process
+    response) or failed (error holds its status code and detail). With wait, answers as
+    soon as the job finishes or after at most JOB_WAIT_MAX_S seconds.
+    """
+    job = await _get_scan_job(job_id, current_user)
+    deadline = time.monotonic() + min(wait, JOB_WAIT_MAX_S)
+    while job.status not in FINISHED and time.monotonic() < deadline:
+        await asyncio.sleep(min(JOB_POLL_S, max(0.0, deadline - time.monotonic())))
+        job = await _get_scan_job(job_id, current_user)
+    return job_status(job)
+
+
+@router.get("/grimoire/jobs/{job_id}/events")
+async def scan_job_events(
+    job_id: str,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Server-sent events for a scan job: a "status" event (the GET /grimoire/jobs/{id} body)
+    whenever the status or attempt changes, ending after the job has finished.
+    """
+    job = await _get_scan_job(job_id, current_user)
+
+    async def events() -> AsyncIterator[str]:
+        current: Optional[ScanJobDocument] = job
+        last = None
+        while current is not None:
+            state = (current.status, current.attempts)
+            if state != last:
+                last = state
+                yield f"event: status\ndata: {json.dumps(job_status(current))}\n\n"
+            if current.status in FINISHED or await request.is_disconnected():
+                return
+            await asyncio.sleep(JOB_POLL_S)
+            current = await scan_jobs.get(job_id)
+        yield "event: expired\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/grimoire/process-multi")
+async def process_grimoire_images(
+    request: Request,
+    files: List[UploadFile] = File(..., alias="files"),
+    params: ScanParams = Depends(scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Upload several overlapping photos of one grimoire (e.g. two halves of a 15+ player
+    circle); they are aligned to the first photo, shared tokens are processed once, and
+    a single Town Square JSON is returned. Accepts multipart/form-data with repeated "files".
+    Abandoned on disconnect or after SCAN_DEADLINE_S, as /grimoire/process.
+    """
+    if not files:
+        raise HTTPException(status_code=422, detail="Upload at least one image.")
+    if len(files) > MAX_MERGE_IMAGES:
+        raise HTTPException(
+            status_code=422, detail=f"Too many images (max {MAX_MERGE_IMAGES})."
+        )
+    uploads = [(await read_image_upload(f), f.filename) for f in files]
+    async with _scan_cancellation(request) as cancel:
+        return await scan_merged(uploads, params, current_user, cancel)
+
+
+async def _read_burst_uploads(
+    files: List[UploadFile], clip_dir: Path
+) -> Tuple[List[Union[bytes, Path]], List[Tuple[int, int]]]:
+    """
+    Read burst uploads without decoding them, telling stills from clips by their magic
+    bytes: still frames are kept as bytes, clips are written to clip_dir (VideoCapture
+    needs a path). Returns the sources and the (width, height) of every frame they will
+    yield, for the memory plan.
+    """
+    sources: List[Union[bytes, Path]] = []
+    sizes: List[Tuple[int, int]] = []
+    for f in files:
+        content, media_type = await read_upload(
+            f, ALLOWED_IMAGE_TYPES + ALLOWED_VIDEO_TYPES, max(MAX_UPLOAD_MB, MAX_VIDEO_UPLOAD_MB)
         )
+        if media_type in ALLOWED_VIDEO_TYPES:
+            suffix = {"video/quicktime": ".mov", "video/webm": ".webm"}.get(media_type, ".mp4")
+            clip_path = clip_dir / f"clip_{len(sources):03d}{suffix}"
+            clip_path.write_bytes(content)
+            del content
+            frame_size = probe_video(clip_path)
+            if frame_size is None:
+                raise HTTPException(status_code=422, detail="Couldn't read video.")
+            # read_video_frames holds at most MAX_BURST_FRAMES decoded frames per clip
+            sizes.extend([frame_size] * MAX_BURST_FRAMES)
+            sources.append(clip_path)
+            continue
+        if len(content) > MAX_UPLOAD_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_MB} MB).")
+        size = read_image_size(content)
+        if size is None:
+            detail = f"Couldn't decode image {f.filename}." if f.filename else "Couldn't decode image."
+            raise HTTPException(status_code=422, detail=detail)
+        sizes.append(size)
+        sources.append(content)
+    return sources, sizes
+
+
+@router.post("/grimoire/process-burst")
+async def process_grimoire_burst(
+    request: Request,
+    files: List[UploadFile] = File(..., alias="files"),
+    params: ScanParams = Depends(scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Upload a burst of photos or a short video of one grimoire. The sharpest frames are
+    processed until every seat agrees across frames, then a single Town Square JSON is
+    returned. Accepts multipart/form-data with repeated "files" (images and/or a clip).
+    Abandoned on disconnect or after SCAN_DEADLINE_S, as /grimoire/process.
+    """
+    if not files:
+        raise HTTPException(status_code=422, detail="Upload at least one image or video.")
+    if len(files) > MAX_BURST_IMAGES:
+        raise HTTPException(status_code=422, detail=f"Too many files (max {MAX_BURST_IMAGES}).")
+    clip_dir = tempfile.mkdtemp(prefix="burst_")
+    try:
+        sources, sizes = await _read_burst_uploads(files, Path(clip_dir))
+        async with _scan_cancellation(request) as cancel:
+            return await scan_burst(sources, sizes, params, current_user, cancel)
     finally:
-        shutil.rmtree(temp_source, ignore_errors=True)
-        shutil.rmtree(temp_detected, ignore_errors=True)
+        shutil.rmtree(clip_dir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Client-side captures
+# ---------------------------------------------------------------------------
+
+@router.get("/grimoire/capture-profile")
+async def capture_profile():
+    """
+    How a client should capture a grimoire for this server. Frames up to maxPixels
+    (maxLongEdge for a 4:3 photo) scan with full-resolution detection; tokens must keep a
+    radius of at least minTokenRadius px. A client can also crop seats itself (circles
+    from /grimoire/detect): token crops with tokenCropPadding px around the circle and the
+    nameRegion box below its centre, all in the capture frame's pixels, sent to
+    /grimoire/process-crops.
+    """
+    max_pixels = max_frame_pixels(SCAN_MEMORY_PER_SCAN_MB * 1024 * 1024)
+    return {
+        "maxPixels": max_pixels,
+        "maxLongEdge": int(math.sqrt(max_pixels * 4 / 3)),
+        "jpegQuality": CAPTURE_JPEG_QUALITY,
+        "minTokenRadius": circle_detector.min_radius,
+        "tokenCropPadding": TOKEN_CROP_PADDING,
+        "nameRegion": {
+            "offsetY": NAME_REGION_OFFSET_Y,
+            "width": NAME_REGION_WIDTH,
+            "height": NAME_REGION_HEIGHT,
+        },
+        "maxSeats": MAX_CAPTURE_SEATS,
+        "maxCropMb": MAX_CROP_UPLOAD_MB,
+    }
+
+
+@router.get("/grimoire/profiles")
+async def pipeline_profiles():
+    """Pipeline profiles selectable with ?profile= on /grimoire/process, with their parameters."""
+    return {
+        "default": DEFAULT_PROFILE,
+        "profiles": {name: profile.params.to_dict() for name, profile in profiles.items()},
+    }
+
+
+@router.post("/grimoire/detect")
+async def detect_grimoire_seats(request: Request, file: UploadFile = File(...)):
+    """
+    Detect token circles only (no OCR, no matching): seats in reading order as
+    {x, y, r, nameRegion: [x1, y1, x2, y2]} in the uploaded frame's pixels. A client can
+    crop these from its own copy of the frame and send them to /grimoire/process-crops.
+    """
+    content = await read_image_upload(file)
+    async with _scan_cancellation(request) as cancel:
+        return await detect_seats(content, cancel)
+
+
+@router.post("/grimoire/process-crops")
+async def process_grimoire_crops(
+    request: Request,
+    seats: str = Form(
+        ...,
+        description="JSON list of {x, y, r}, the circle of each seat in capture frame pixels, "
+        "in the same order as tokens (and names).",
+    ),
+    tokens: List[UploadFile] = File(..., description="Token crop per seat (see capture-profile)."),
+    names: Optional[List[UploadFile]] = File(
+        None, description="Name-region crop per seat; omit to have them cut from frame."
+    ),
+    frame: Optional[UploadFile] = File(
+        None, description="Downscaled capture frame; required when names are omitted."
+    ),
+    params: ScanParams = Depends(scan_params),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Scan a grimoire the client already cropped (see /grimoire/capture-profile): skips
+    decoding the full photo and circle detection and goes straight to OCR and matching.
+    Same Town Square response as /grimoire/process, abandoned on disconnect or deadline
+    the same way.
+    """
+    try:
+        capture_seats = TypeAdapter(List[CaptureSeat]).validate_json(seats)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid seats: {e.errors()[0]['msg']}")
+    if not capture_seats:
+        raise HTTPException(status_code=422, detail="Send at least one seat.")
+    if len(capture_seats) > MAX_CAPTURE_SEATS:
+        raise HTTPException(status_code=422, detail=f"Too many seats (max {MAX_CAPTURE_SEATS}).")
+    if len(tokens) != len(capture_seats) or (names and len(names) != len(capture_seats)):
+        raise HTTPException(status_code=422, detail="Send one token crop (and name crop) per seat.")
+    if not names and frame is None:
+        raise HTTPException(status_code=422, detail="Send name crops or the frame to cut them from.")
+
+    token_uploads = [
+        (await read_upload(f, ALLOWED_IMAGE_TYPES, MAX_CROP_UPLOAD_MB))[0] for f in tokens
+    ]
+    name_uploads = (
+        [(await read_upload(f, ALLOWED_IMAGE_TYPES, MAX_CROP_UPLOAD_MB))[0] for f in names]
+        if names
+        else None
+    )
+    frame_upload = await read_image_upload(frame) if frame is not None and not names else None
+    async with _scan_cancellation(request) as cancel:
+        return await scan_crops(
+            capture_seats, token_uploads, name_uploads, frame_upload, params, current_user, cancel
+        )
 
 
 @router.post("/grimoire/from-json")
@@ -222,6 +764,8 @@ async def extract_tokens_and_names():
             token_processor,
             player_name_extractor,
             orb_matcher,
+            script_roles=get_script_roles("bmr"),
+            ocr_executor=ocr_executor,
         )
         if result.extract_result.image_count == 0:
             raise HTTPException(
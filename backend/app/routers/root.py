@@ -1,5 +1,8 @@
-"""Root and health routes."""
+"""Root, health, readiness and metrics routes."""
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.dependencies import metrics, rate_limiter, request_lanes, warmup_state
 
 router = APIRouter(tags=["root"])
 
@@ -18,3 +21,27 @@ async def root():
 async def health_check():
     """Health check for load balancers and monitoring."""
     return {"status": "healthy", "service": "botc-grimoire-parser"}
+
+
+@router.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness for load balancers: 503 until the startup warm-up has run a scan through
+    every pipeline engine, so no user scan lands on a cold worker. /api/health stays 200.
+    """
+    state = warmup_state.to_dict()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+
+@router.get("/api/metrics")
+async def metrics_snapshot():
+    """
+    Counters of this worker process (e.g. scans_cancelled by reason and stage,
+    lane_queue_wait_ms by lane, rate_limited by rule) as JSON, with each request lane's
+    current occupancy and each rate limit's buckets (not full / empty right now).
+    """
+    return {
+        **metrics.snapshot(),
+        "lanes": request_lanes.snapshot(),
+        "rateLimits": await rate_limiter.snapshot(),
+    }
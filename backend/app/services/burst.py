@@ -0,0 +1,281 @@
+"""
+Burst / short video input: several frames of the same grimoire instead of one photo.
+Frames are ranked by a cheap sharpness metric and processed sharpest first; per-seat
+results are fused by confidence voting, and processing stops as soon as every seat has
+a stable answer, so a good burst costs little more than a single photo.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.models.schemas import ParsedToken
+from app.services.cancellation import CancelToken
+from app.services.grimoire_stages import IMAGE, PARSED_TOKENS, SEATS
+from app.services.pipeline_engine import PipelineEngine
+from app.services.rescan import align_seats
+from app.utils.circle_order import sort_circles_reading_order
+from app.utils.image_utils import ensure_grayscale
+
+# Sharpness is measured on a copy scaled to this max side length
+SHARPNESS_MAX_SIDE = 640
+
+# Frames less sharp than this fraction of the sharpest frame are dropped
+MIN_RELATIVE_SHARPNESS = 0.35
+
+# At most this many frames are run through the pipeline
+MAX_BURST_FRAMES = 8
+
+# Candidate frames sampled (evenly) from a video before sharpness ranking
+MAX_VIDEO_SAMPLES = 24
+
+# Never stop before this many frames have been processed
+MIN_CONSENSUS_FRAMES = 2
+
+# A seat is stable when its leading answer has at least this many votes...
+STABLE_MIN_VOTES = 2
+
+# ...and at least this share of the seat's votes
+STABLE_AGREEMENT = 0.67
+
+
+def sharpness(image: np.ndarray) -> float:
+    """Variance of the Laplacian on a downscaled grey copy; higher is sharper."""
+    gray = ensure_grayscale(image)
+    scale = min(1.0, SHARPNESS_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def select_sharpest(frames: Sequence[np.ndarray], limit: int = MAX_BURST_FRAMES) -> List[int]:
+    """Indices of the sharpest frames, sharpest first; clearly blurred frames are dropped."""
+    if not frames:
+        return []
+    scores = [sharpness(f) for f in frames]
+    best = max(scores)
+    order = sorted(range(len(frames)), key=lambda i: scores[i], reverse=True)
+    return [i for i in order if scores[i] >= MIN_RELATIVE_SHARPNESS * best][:limit]
+
+
+def probe_video(path: Path) -> Optional[Tuple[int, int]]:
+    """(width, height) of a video's frames from its container metadata, without decoding."""
+    capture = cv2.VideoCapture(str(path))
+    try:
+        if not capture.isOpened():
+            return None
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (width, height) if width > 0 and height > 0 else None
+    finally:
+        capture.release()
+
+
+def read_video_frames(
+    path: Path, max_samples: int = MAX_VIDEO_SAMPLES, keep: int = MAX_BURST_FRAMES
+) -> List[np.ndarray]:
+    """
+    Decode up to max_samples frames spread evenly over a video; skipped frames are only
+    grabbed. Only the keep sharpest samples are held (in video order), since no more than
+    MAX_BURST_FRAMES are ever processed; the rest are dropped as soon as they are scored.
+    """
+    capture = cv2.VideoCapture(str(path))
+    try:
+        if not capture.isOpened():
+            return []
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, total // max_samples) if total > 0 else 1
+        # (sharpness, sample index, frame)
+        kept: List[Tuple[float, int, np.ndarray]] = []
+        samples = 0
+        index = 0
+        while samples < max_samples and capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok and frame is not None:
+                    kept.append((sharpness(frame), samples, frame))
+                    samples += 1
+                    if len(kept) > keep:
+                        kept.remove(min(kept, key=lambda k: k[0]))
+            index += 1
+        return [frame for _, _, frame in sorted(kept, key=lambda k: k[1])]
+    finally:
+        capture.release()
+
+
+def _leader(votes: Counter) -> Tuple[object, float, float]:
+    """(leading value, its votes, total votes) of a weighted vote counter."""
+    if not votes:
+        return None, 0.0, 0.0
+    value, count = votes.most_common(1)[0]
+    return value, count, float(sum(votes.values()))
+
+
+@dataclass
+class SeatVotes:
+    """Votes collected for one seat across frames."""
+    # (character, character_type, is_dead) -> summed confidence
+    characters: Counter = field(default_factory=Counter)
+    # (character, character_type, is_dead) -> number of frames
+    character_frames: Counter = field(default_factory=Counter)
+    # player name (None = no name read) -> number of frames
+    names: Counter = field(default_factory=Counter)
+    confidences: Dict[tuple, List[float]] = field(default_factory=lambda: defaultdict(list))
+
+    def add(self, parsed: ParsedToken) -> None:
+        key = (parsed.character, parsed.character_type, parsed.is_dead)
+        self.characters[key] += parsed.confidence
+        self.character_frames[key] += 1
+        self.confidences[key].append(parsed.confidence)
+        self.names[parsed.player_name] += 1
+
+    def is_stable(self) -> bool:
+        """Leading character (by frames) and leading name agree across enough frames."""
+        for votes in (self.character_frames, self.names):
+            _, count, total = _leader(votes)
+            if count < STABLE_MIN_VOTES or count < STABLE_AGREEMENT * total:
+                return False
+        return True
+
+    def result(self, position: int) -> ParsedToken:
+        """Fused answer: character by summed confidence, name by frame count (a read name beats None on ties)."""
+        (character, character_type, is_dead), _, _ = _leader(self.characters)
+        confidence = float(np.mean(self.confidences[(character, character_type, is_dead)]))
+        read = Counter({n: c for n, c in self.names.items() if n})
+        name = None
+        if read:
+            best_name, best_count = read.most_common(1)[0]
+            if best_count >= self.names.get(None, 0):
+                name = best_name
+        return ParsedToken(
+            token=position,
+            player_name=name,
+            character=character,
+            character_type=character_type,
+            confidence=round(confidence, 4),
+            is_dead=is_dead,
+        )
+
+
+def _place_new_seats(
+    layout: Sequence[Tuple[int, int, int]],
+    circles: Sequence[Tuple[int, int, int]],
+    alignment: Dict[int, int],
+) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Circles of a frame that align_seats left unmatched, by index, moved into the layout's
+    coordinates with the shift and scale between the frame's aligned seats and their
+    layout seats. Nothing when no seat aligned (the frame can't be placed).
+    """
+    unmatched = [idx for idx in range(len(circles)) if idx not in alignment]
+    if not unmatched or not alignment:
+        return {}
+    cur = np.array([circles[idx][:2] for idx in alignment], dtype=np.float64)
+    ref = np.array([layout[seat][:2] for seat in alignment.values()], dtype=np.float64)
+    cur_centre, ref_centre = cur.mean(axis=0), ref.mean(axis=0)
+    cur_spread = np.linalg.norm(cur - cur_centre, axis=1).mean()
+    ref_spread = np.linalg.norm(ref - ref_centre, axis=1).mean()
+    scale = ref_spread / cur_spread if len(alignment) > 1 and cur_spread > 0 else 1.0
+    placed: Dict[int, Tuple[int, int, int]] = {}
+    for idx in unmatched:
+        x, y, r = circles[idx]
+        px, py = (np.array([x, y], dtype=np.float64) - cur_centre) * scale + ref_centre
+        placed[idx] = (int(round(px)), int(round(py)), int(round(r * scale)))
+    return placed
+
+
+@dataclass
+class BurstResult:
+    """Fused seats plus how many frames were needed."""
+    parsed_tokens: List[ParsedToken]
+    frames_received: int
+    frames_used: int
+    stable: bool
+    unstable_seats: List[int]
+    processing_steps: List[str]
+
+
+def process_burst(
+    frames: Sequence[np.ndarray],
+    engine: PipelineEngine,
+    script_roles: Optional[AbstractSet[str]] = None,
+    roster: Optional[Sequence[str]] = None,
+    detection_scale: float = 1.0,
+    cancel: Optional[CancelToken] = None,
+) -> BurstResult:
+    """
+    Process frames sharpest first and fuse per-seat answers by voting.
+
+    Each frame runs through the grimoire stage engine (see grimoire_stages) from its
+    decoded image. The first frame with detections starts the seat layout; later frames
+    are aligned to it (align_seats) and vote on the seats they see, and their circles
+    that match no seat are added as new seats, so a seat missed in the sharpest frame is
+    still recovered. Stops once every seat is stable (after at least
+    MIN_CONSENSUS_FRAMES frames) or the frames run out; seats are numbered in reading
+    order of the final layout.
+    detection_scale is the circle detection working resolution (see memory_budget).
+    cancel is checked before each frame and passed to the engine, which checks it per stage.
+    """
+    steps: List[str] = []
+    order = select_sharpest(frames)
+    steps.append(f"Received {len(frames)} frame(s); {len(order)} sharp enough to process")
+
+    layout: List[Tuple[int, int, int]] = []
+    votes: List[SeatVotes] = []
+    frames_used = 0
+    for rank, frame_idx in enumerate(order, 1):
+        if cancel is not None:
+            cancel.check("burst")
+        run = engine.run(
+            {
+                IMAGE: frames[frame_idx],
+                "detection_scale": detection_scale,
+                "roster": roster,
+                "script_roles": script_roles,
+            },
+            targets=[PARSED_TOKENS],
+            cancel=cancel,
+        )
+        circles = run.values[SEATS]
+        parsed = run.values[PARSED_TOKENS]
+        frames_used += 1
+        if not circles:
+            steps.append(f"Frame {frame_idx + 1}: no tokens detected")
+            continue
+        if not layout:
+            alignment: Dict[int, int] = {}
+            added = {idx: circle for idx, circle in enumerate(circles)}
+        else:
+            alignment = align_seats(layout, circles)
+            added = _place_new_seats(layout, circles, alignment)
+        steps.append(
+            f"Frame {frame_idx + 1}: {len(circles)} tokens, {len(alignment)} aligned to {len(layout)} seats, "
+            f"{len(added)} new"
+        )
+        for idx, circle in added.items():
+            alignment[idx] = len(layout)
+            layout.append(circle)
+            votes.append(SeatVotes())
+        for idx, seat in alignment.items():
+            votes[seat].add(parsed[idx])
+        if frames_used >= MIN_CONSENSUS_FRAMES and all(v.is_stable() for v in votes):
+            steps.append(f"All seats stable after {frames_used} frame(s); stopping early")
+            break
+
+    # Seats added by later frames go to their place in the ring
+    by_circle: Dict[Tuple[int, int, int], List[SeatVotes]] = defaultdict(list)
+    for circle, seat_votes in zip(layout, votes):
+        by_circle[circle].append(seat_votes)
+    votes = [by_circle[circle].pop(0) for circle in sort_circles_reading_order(layout)]
+    unstable = [idx + 1 for idx, v in enumerate(votes) if not v.is_stable()]
+    return BurstResult(
+        parsed_tokens=[v.result(idx + 1) for idx, v in enumerate(votes)],
+        frames_received=len(frames),
+        frames_used=frames_used,
+        stable=bool(votes) and not unstable,
+        unstable_seats=unstable,
+        processing_steps=steps,
+    )
@@ -0,0 +1,86 @@
+"""
+Cancellation for scans. A CancelToken is created per request with a deadline and is
+cancelled when the client disconnects (or the deadline passes). The pipeline checks it
+between stages and between tokens; OCR subprocesses register with it and are killed as
+soon as it is cancelled, so abandoned scans stop using CPU and free their worker.
+"""
+import subprocess
+import threading
+import time
+from typing import Optional, Set
+
+# Cancellation reasons
+DISCONNECTED = "disconnected"
+DEADLINE = "deadline"
+# A scan job's lease was lost (another worker took the job over)
+LEASE_LOST = "lease_lost"
+
+
+class ScanCancelled(Exception):
+    """A scan was abandoned: reason is DISCONNECTED, DEADLINE or LEASE_LOST, stage where it stopped."""
+
+    def __init__(self, reason: str, stage: Optional[str] = None):
+        super().__init__(f"Scan cancelled ({reason})" + (f" in {stage}" if stage else ""))
+        self.reason = reason
+        self.stage = stage
+
+
+class CancelToken:
+    """Thread-safe cancellation flag with an optional deadline (seconds from creation)."""
+
+    def __init__(self, deadline_s: Optional[float] = None):
+        self.deadline = time.monotonic() + deadline_s if deadline_s is not None else None
+        self.reason: Optional[str] = None
+        self.killed_processes = 0
+        self._processes: Set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.expired:
+            self.cancel(DEADLINE)
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None without one)."""
+        return max(0.0, self.deadline - time.monotonic()) if self.deadline is not None else None
+
+    def cancel(self, reason: str) -> None:
+        """Cancel (the first reason sticks) and kill registered subprocesses."""
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            processes = list(self._processes)
+            self._processes.clear()
+        for proc in processes:
+            self._kill(proc)
+
+    def check(self, stage: Optional[str] = None) -> None:
+        """Raise ScanCancelled when cancelled or past the deadline."""
+        if self.cancelled:
+            raise ScanCancelled(self.reason, stage)
+
+    def register_process(self, proc: subprocess.Popen) -> None:
+        """Kill proc on cancellation (immediately when already cancelled)."""
+        with self._lock:
+            if self.reason is None:
+                self._processes.add(proc)
+                return
+        self._kill(proc)
+
+    def unregister_process(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(proc)
+
+    def _kill(self, proc: subprocess.Popen) -> None:
+        if proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                return
+            with self._lock:
+                self.killed_processes += 1
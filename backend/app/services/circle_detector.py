@@ -7,53 +7,72 @@ from app.utils.image_utils import ensure_grayscale
 class CircleDetector:
     """Service for detecting circular tokens using Hough Circle Transform"""
     
-    def __init__(self, min_radius: int = 50, blur_sigma: float = 4.5):
+    def __init__(self, min_radius: int = 50, blur_sigma: float = 4.5, param1: float = 50, param2: float = 30):
         """
         Initialize circle detector
         Args:
             min_radius: Minimum circle radius in pixels
             blur_sigma: Gaussian blur sigma value
+            param1: Hough upper threshold for edge detection
+            param2: Hough accumulator threshold for center detection (lower finds more circles)
         """
         self.min_radius = min_radius
         self.blur_sigma = blur_sigma
+        self.param1 = param1
+        self.param2 = param2
     
-    def detect_circles(self, image: np.ndarray) -> List[Tuple[int, int, int]]:
+    def detect_circles(self, image: np.ndarray, scale: float = 1.0) -> List[Tuple[int, int, int]]:
         """
         Detect circular tokens in the image
         Args:
             image: Input image (BGR or grayscale)
+            scale: Working resolution for detection (< 1 detects on a downscaled copy,
+                with radius and blur scaled to match; results are in full-image pixels).
+                The Hough stage needs ~15 bytes per working pixel, see memory_budget.
         Returns:
             List of (x, y, radius) tuples for detected circles
         """
         h, w = image.shape[:2]
+        min_radius = self.min_radius
+        blur_sigma = self.blur_sigma
+        if scale < 1.0:
+            # Resize before the grayscale conversion so no full-size copy is made
+            image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+            min_radius = max(1, int(round(min_radius * scale)))
+            blur_sigma = blur_sigma * scale
+        sh, sw = image.shape[:2]
         
         # Convert to grayscale if needed
         gray = ensure_grayscale(image)
         
         # Apply Gaussian blur for better circle detection
-        kernel_size = int(6 * self.blur_sigma) + 1
+        kernel_size = int(6 * blur_sigma) + 1
         if kernel_size % 2 == 0:
             kernel_size += 1
-        blurred = cv2.GaussianBlur(gray, (kernel_size, kernel_size), self.blur_sigma)
+        blurred = cv2.GaussianBlur(gray, (kernel_size, kernel_size), blur_sigma)
+        del gray
         
         # Calculate max radius (20% of image dimension)
-        max_radius = int(min(w, h) * 0.2)
+        max_radius = int(min(sw, sh) * 0.2)
         
         # Detect circles using HoughCircles
         circles = cv2.HoughCircles(
             blurred,
             cv2.HOUGH_GRADIENT,
             dp=1,
-            minDist=self.min_radius * 2,
-            param1=50,  # Upper threshold for edge detection
-            param2=30,  # Accumulator threshold for center detection
-            minRadius=self.min_radius,
+            minDist=min_radius * 2,
+            param1=self.param1,  # Upper threshold for edge detection
+            param2=self.param2,  # Accumulator threshold for center detection
+            minRadius=min_radius,
             maxRadius=max_radius
         )
         
         detected_circles = []
         if circles is not None:
-            circles = np.round(circles[0, :]).astype("int")
+            circles = circles[0, :]
+            if scale < 1.0:
+                circles = circles / scale
+            circles = np.round(circles).astype("int")
             for x, y, r in circles:
                 # Ensure circle is within image bounds
                 if x - r >= 0 and x + r < w and y - r >= 0 and y + r < h:
@@ -65,5 +84,7 @@ class CircleDetector:
         """Get detection parameters used"""
         return {
             "min_radius": self.min_radius,
-            "blur_sigma": self.blur_sigma
+            "blur_sigma": self.blur_sigma,
+            "param1": self.param1,
+            "param2": self.param2,
         }
@@ -0,0 +1,217 @@
+"""
+Token-to-character matching with fixed-length embeddings instead of pairwise descriptor
+matching. Each token is normalised to its circle, masked, and described by a HOG-style
+grid of gradient-orientation histograms. References (plus rotated copies, since physical
+tokens lie at any angle) form one L2-normalised matrix, so matching a token is a single
+matrix-vector product. Same interface as ORBMatcher; selectable per request.
+"""
+from pathlib import Path
+from typing import AbstractSet, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.utils.character_matcher import get_character_type, role_id
+from app.utils.image_utils import ensure_grayscale
+
+# Side (px) tokens are resized to before computing the embedding
+EMBED_SIZE = 64
+
+# Gradient histogram cell size (px) and orientation bins (unsigned, 0-180 degrees)
+HOG_CELL = 8
+HOG_BINS = 9
+
+# Only the inner part of the token circle is described; the rim is frame / background
+INNER_FRACTION = 0.85
+
+# Ref pixels brighter than this belong to the token (refs are screenshots on a dark background)
+REF_FOREGROUND_LEVEL = 40
+
+# Rotated copies of every reference, every ROTATION_STEP degrees over the full circle
+ROTATION_STEP = 15
+
+# The confidence here is a cosine similarity, not ORB's scaled match count, so the role
+# thresholds are this matcher's own: a token claims its role for the grimoire at
+# UNIQUE_ROLE_MIN_CONFIDENCE, and keeps its previous role on a rescan at REVERIFY_MIN_CONFIDENCE.
+# Re-tune both with app.tools.benchmark when the embedding changes.
+UNIQUE_ROLE_MIN_CONFIDENCE = 0.55
+REVERIFY_MIN_CONFIDENCE = 0.5
+
+
+def _hog(gray: np.ndarray) -> np.ndarray:
+    """
+    Gradient-orientation histograms per HOG_CELL cell, L2-normalised over 2x2 cell blocks
+    (the HOG layout, computed with NumPy; not every OpenCV build ships HOGDescriptor).
+    """
+    g = gray.astype(np.float32)
+    gx = cv2.Sobel(g, cv2.CV_32F, 1, 0, ksize=1)
+    gy = cv2.Sobel(g, cv2.CV_32F, 0, 1, ksize=1)
+    magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+    bins = np.minimum((np.mod(angle, 180.0) * HOG_BINS / 180.0).astype(np.int32), HOG_BINS - 1)
+    n = g.shape[0] // HOG_CELL
+    rows, cols = np.indices(g.shape) // HOG_CELL
+    inside = (rows < n) & (cols < n)
+    cells = np.zeros((n, n, HOG_BINS), dtype=np.float32)
+    np.add.at(cells, (rows[inside], cols[inside], bins[inside]), magnitude[inside])
+    blocks = np.concatenate(
+        [cells[:-1, :-1], cells[1:, :-1], cells[:-1, 1:], cells[1:, 1:]], axis=2
+    )
+    blocks /= np.linalg.norm(blocks, axis=2, keepdims=True) + 1e-6
+    return blocks.ravel()
+
+
+def _crop_ref_token(image: np.ndarray) -> np.ndarray:
+    """Square crop around a reference token: bounding box of its bright (non-background) pixels."""
+    gray = ensure_grayscale(image)
+    ys, xs = np.nonzero(gray > REF_FOREGROUND_LEVEL)
+    if xs.size == 0:
+        return image
+    side = max(xs.max() - xs.min(), ys.max() - ys.min()) + 1
+    cx = (xs.min() + xs.max()) // 2
+    cy = (ys.min() + ys.max()) // 2
+    x0 = max(0, cx - side // 2)
+    y0 = max(0, cy - side // 2)
+    return image[y0 : y0 + side, x0 : x0 + side]
+
+
+class EmbeddingMatcher:
+    """
+    Match token images to reference character images by HOG embeddings.
+
+    Token crops (from TokenDetector) are already squares around the circle; references
+    are cropped to their token first. The reference matrix holds 360 / ROTATION_STEP
+    rotated copies per reference and is built once at construction. Per token the cost
+    is one embedding plus O(rows x dim) floating-point work.
+    """
+
+    # Confidence thresholds on this matcher's score scale (see match_tokens / rescan)
+    unique_role_min_confidence = UNIQUE_ROLE_MIN_CONFIDENCE
+    reverify_min_confidence = REVERIFY_MIN_CONFIDENCE
+
+    def __init__(self, ref_images_dir: Path, rotation_step: int = ROTATION_STEP):
+        self.ref_images_dir = Path(ref_images_dir)
+        self.rotation_step = rotation_step
+        inner = int(EMBED_SIZE * INNER_FRACTION) // HOG_CELL * HOG_CELL
+        self._inner = inner
+        yy, xx = np.mgrid[:inner, :inner] - (inner - 1) / 2.0
+        self._mask = (xx * xx + yy * yy <= (inner / 2.0) ** 2).astype(np.float32)
+        # One row per (reference, rotation); _names[row] is the reference of that row
+        self._names: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._load_references()
+
+    def _load_references(self) -> None:
+        """Embed every reference (and its rotations) into the L2-normalised reference matrix."""
+        if not self.ref_images_dir.exists():
+            return
+        rows: List[np.ndarray] = []
+        names: List[str] = []
+        for path in sorted(self.ref_images_dir.glob("*.png")):
+            img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            square = cv2.resize(_crop_ref_token(img), (EMBED_SIZE, EMBED_SIZE), interpolation=cv2.INTER_AREA)
+            centre = ((EMBED_SIZE - 1) / 2.0, (EMBED_SIZE - 1) / 2.0)
+            for angle in range(0, 360, self.rotation_step):
+                rotation = cv2.getRotationMatrix2D(centre, angle, 1.0)
+                rotated = cv2.warpAffine(square, rotation, (EMBED_SIZE, EMBED_SIZE), flags=cv2.INTER_LINEAR)
+                rows.append(self._embed_square(rotated))
+                names.append(path.stem)
+        if rows:
+            self._names = names
+            self._matrix = np.stack(rows)
+
+    def _embed_square(self, square: np.ndarray) -> np.ndarray:
+        """Embedding of an EMBED_SIZE grey square: masked inner circle -> HOG, zero-mean, unit length."""
+        margin = (EMBED_SIZE - self._inner) // 2
+        inner = square[margin : margin + self._inner, margin : margin + self._inner].astype(np.float32)
+        # Pixels outside the circle are set to the circle's mean so the mask edge adds no gradient
+        inside = self._mask > 0
+        inner = np.where(inside, inner, inner[inside].mean())
+        vector = _hog(inner)
+        vector -= vector.mean()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def embed(self, token_image: np.ndarray) -> Optional[np.ndarray]:
+        """L2-normalised embedding of a token crop, or None for an empty image."""
+        if token_image is None or token_image.size == 0:
+            return None
+        gray = ensure_grayscale(token_image)
+        square = cv2.resize(gray, (EMBED_SIZE, EMBED_SIZE), interpolation=cv2.INTER_AREA)
+        return self._embed_square(square)
+
+    def _similarities(self, token_image: np.ndarray) -> Optional[np.ndarray]:
+        """Cosine similarity of the token to every reference: best over each reference's rotations."""
+        if self._matrix is None:
+            return None
+        query = self.embed(token_image)
+        if query is None:
+            return None
+        per_row = self._matrix @ query
+        return per_row.reshape(-1, 360 // self.rotation_step).max(axis=1)
+
+    @property
+    def reference_names(self) -> List[str]:
+        """Reference stems, aligned with the entries of _similarities."""
+        return self._names[:: 360 // self.rotation_step]
+
+    def _best(
+        self, similarities: np.ndarray, allowed: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[str, str, float]]:
+        if allowed is not None:
+            similarities = np.where(allowed, similarities, -np.inf)
+        best = int(np.argmax(similarities))
+        score = float(similarities[best])
+        if not np.isfinite(score) or score <= 0.0:
+            return None
+        name = self.reference_names[best]
+        return (name, get_character_type(name), min(1.0, score))
+
+    def match_character(
+        self,
+        token_image: np.ndarray,
+        script_roles: Optional[AbstractSet[str]] = None,
+        exclude_roles: Optional[AbstractSet[str]] = None,
+    ) -> Optional[Tuple[str, str, float]]:
+        """
+        Find the best-matching character for a single token image.
+
+        Args:
+            script_roles: Accepted for interface compatibility; every reference is scored
+                in one product, so there is no visiting order to bias.
+            exclude_roles: Role ids already assigned elsewhere in the grimoire; never returned.
+
+        Returns:
+            (character_name, character_type, confidence) or None if no refs.
+            Confidence is the cosine similarity of the embeddings.
+        """
+        similarities = self._similarities(token_image)
+        if similarities is None:
+            return None
+        allowed = None
+        if exclude_roles:
+            allowed = np.array([role_id(n) not in exclude_roles for n in self.reference_names])
+        return self._best(similarities, allowed)
+
+    def match_roles(
+        self, token_image: np.ndarray, roles: AbstractSet[str]
+    ) -> Optional[Tuple[str, str, float]]:
+        """Best match among refs whose role id is in roles (alive and dead variants)."""
+        similarities = self._similarities(token_image)
+        if similarities is None:
+            return None
+        return self._best(similarities, np.array([role_id(n) in roles for n in self.reference_names]))
+
+    def match_all_characters(
+        self, token_image: np.ndarray, top_n: int = 1
+    ) -> List[Tuple[str, str, float]]:
+        """Return top N (character_name, character_type, confidence) for inspection or diagnostics."""
+        similarities = self._similarities(token_image)
+        if similarities is None:
+            return []
+        names = self.reference_names
+        return [
+            (names[i], get_character_type(names[i]), min(1.0, float(similarities[i])))
+            for i in np.argsort(-similarities)[:top_n]
+        ]
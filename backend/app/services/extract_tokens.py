@@ -1,15 +1,21 @@
 """
 Extract tokens from grimoire images: detect circles, save token images (1.png, 2.png, ...),
 save detection.png, and extract player names per position. Used by /api/grimoire/extract-tokens
-and by the combined /api/grimoire/parse pipeline.
+and by the combined /api/grimoire/parse pipeline. Uploads go through extract_tokens_from_images,
+which works on decoded images in memory; captures the client already cropped go through
+extract_tokens_from_crops, which skips detection.
 """
-from dataclasses import dataclass
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import cv2
+import numpy as np
 
+from app.services.cancellation import CancelToken
 from app.services.circle_detector import CircleDetector
+from app.services.grimoire_merge import merge_circles
 from app.services.image_processor import ImageProcessor
 from app.services.player_name_extractor import PlayerNameExtractor
 from app.services.token_processor import TokenProcessor
@@ -24,6 +30,36 @@ class ExtractResult:
     processing_steps: List[str]
     total_tokens: int
     image_count: int
+    # OCR still running in the background, by 1-based position (see resolve_names)
+    pending_names: Dict[int, "Future[Optional[str]]"] = field(default_factory=dict)
+    # Token crops in position order (token_images[0] is position 1)
+    token_images: List[np.ndarray] = field(default_factory=list)
+
+    def resolve_names(self) -> None:
+        """Wait for background OCR and fill in positions_with_names. No-op when OCR ran inline."""
+        if not self.pending_names:
+            return
+        resolved: List[Tuple[int, Optional[str]]] = []
+        for position, name in self.positions_with_names:
+            future = self.pending_names.get(position)
+            if future is not None:
+                name = future.result()
+                if name:
+                    self.processing_steps.append(f"Token {position}: Extracted player name '{name}'")
+            resolved.append((position, name))
+        self.positions_with_names = resolved
+        self.pending_names = {}
+
+
+@dataclass
+class SeatCrop:
+    """
+    One seat cropped on the client: its circle (x, y, r) in the capture frame's pixels,
+    the token crop around it and the name label region below it.
+    """
+    circle: Tuple[int, int, int]
+    token: np.ndarray
+    name_region: np.ndarray
 
 
 def extract_tokens(
@@ -33,21 +69,21 @@ def extract_tokens(
     circle_detector: CircleDetector,
     token_processor: TokenProcessor,
     player_name_extractor: PlayerNameExtractor,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    merge_overlapping: bool = False,
+    detection_scale: float = 1.0,
 ) -> ExtractResult:
     """
     Run the extract-tokens pipeline: load grimoire images from source_images_dir,
     detect circles, save token images (1.png, 2.png, …, detection.png), extract player names.
-    Does not perform character matching.
+    Does not perform character matching. Images are loaded one at a time as they are
+    reached; see extract_tokens_from_images for the options.
     """
-    processing_steps: List[str] = []
-    positions_with_names: List[Tuple[int, Optional[str]]] = []
-    total_tokens = 0
-
     if not source_images_dir.exists():
-        processing_steps.append("Source image directory not found")
         return ExtractResult(
             positions_with_names=[],
-            processing_steps=processing_steps,
+            processing_steps=["Source image directory not found"],
             total_tokens=0,
             image_count=0,
         )
@@ -63,26 +99,87 @@ def extract_tokens(
     image_files = sorted(set(image_files))
 
     if not image_files:
-        processing_steps.append("No image files found in source directory")
         return ExtractResult(
             positions_with_names=[],
-            processing_steps=processing_steps,
+            processing_steps=["No image files found in source directory"],
             total_tokens=0,
             image_count=0,
         )
 
-    processing_steps.append(f"Found {len(image_files)} image(s) to process")
     detected_tokens_dir.mkdir(parents=True, exist_ok=True)
-    position = 0
+    return extract_tokens_from_images(
+        ((path.name, image_processor.load_image(str(path))) for path in image_files),
+        len(image_files),
+        circle_detector,
+        token_processor,
+        player_name_extractor,
+        detected_tokens_dir=detected_tokens_dir,
+        ocr_executor=ocr_executor,
+        roster=roster,
+        merge_overlapping=merge_overlapping,
+        detection_scale=detection_scale,
+    )
 
-    for img_idx, image_path in enumerate(image_files):
-        filename = image_path.name
-        processing_steps.append(f"--- Processing image {img_idx + 1}/{len(image_files)}: {filename} ---")
 
-        image = image_processor.load_image(str(image_path))
+def extract_tokens_from_images(
+    images: Iterable[Tuple[str, np.ndarray]],
+    image_count: int,
+    circle_detector: CircleDetector,
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    detected_tokens_dir: Optional[Path] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    merge_overlapping: bool = False,
+    detection_scale: float = 1.0,
+    cancel: Optional[CancelToken] = None,
+) -> ExtractResult:
+    """
+    Extract tokens and player names from decoded grimoire images, given as (name, image).
+    images may be a generator: each image is only decoded when reached and released
+    before the next one. Token crops are returned in ExtractResult.token_images; with
+    detected_tokens_dir, detection.png and the crops (1.png, 2.png, …) are also written,
+    without it nothing touches the disk.
+
+    With ocr_executor, name OCR is submitted per circle as soon as circles are sorted and
+    the function returns without waiting for it; call ExtractResult.resolve_names() to join.
+    roster (known player names of the server) is used to snap OCR output.
+
+    With merge_overlapping, the images are treated as overlapping photos of one grimoire:
+    they are registered to the first image, shared tokens are kept once, and positions
+    follow the reading order of the combined ring (see _extract_merged).
+
+    detection_scale is the working resolution for circle detection (see memory_budget);
+    crops and name regions are always taken from the full-resolution image.
+    cancel is checked before each image and handed to name OCR.
+    """
+    processing_steps: List[str] = [f"Found {image_count} image(s) to process"]
+    if merge_overlapping and image_count > 1:
+        return _extract_merged(
+            list(images),
+            circle_detector,
+            token_processor,
+            player_name_extractor,
+            processing_steps,
+            detected_tokens_dir=detected_tokens_dir,
+            ocr_executor=ocr_executor,
+            roster=roster,
+            detection_scale=detection_scale,
+            cancel=cancel,
+        )
+    positions_with_names: List[Tuple[int, Optional[str]]] = []
+    token_images: List[np.ndarray] = []
+    total_tokens = 0
+    position = 0
+    pending_names: Dict[int, "Future[Optional[str]]"] = {}
+
+    for img_idx, (filename, image) in enumerate(images):
+        if cancel is not None:
+            cancel.check("detect")
+        processing_steps.append(f"--- Processing image {img_idx + 1}/{image_count}: {filename} ---")
         h, w = image.shape[:2]
 
-        detected_circles = circle_detector.detect_circles(image)
+        detected_circles = circle_detector.detect_circles(image, detection_scale)
         detected_circles = sort_circles_reading_order(detected_circles)
         processing_steps.append(f"Image {img_idx + 1}: Detected {len(detected_circles)} circular tokens (ordered: top-most first, then clockwise)")
         total_tokens += len(detected_circles)
@@ -91,30 +188,191 @@ def extract_tokens(
             processing_steps.append(f"Image {img_idx + 1}: No circles detected, skipping")
             continue
 
-        player_names = player_name_extractor.extract_names_for_circles(image, detected_circles)
-        for idx, name in player_names.items():
-            processing_steps.append(f"Image {img_idx + 1}, Token {idx + 1}: Extracted player name '{name}'")
+        if ocr_executor is not None:
+            name_futures = player_name_extractor.submit_names_for_circles(
+                ocr_executor, image, detected_circles, roster, cancel
+            )
+            player_names: Dict[int, str] = {}
+        else:
+            name_futures = {}
+            player_names = player_name_extractor.extract_names_for_circles(
+                image, detected_circles, roster, cancel
+            )
+            for idx, name in player_names.items():
+                processing_steps.append(f"Image {img_idx + 1}, Token {idx + 1}: Extracted player name '{name}'")
 
-        name_regions = token_processor.get_player_name_regions(detected_circles, (h, w))
-        vis_image = token_processor.create_visualization(image, detected_circles, name_regions)
-        vis_path = detected_tokens_dir / "detection.png"
-        cv2.imwrite(str(vis_path), vis_image)
-        processing_steps.append(f"Image {img_idx + 1}: Saved visualization to {vis_path}")
+        if detected_tokens_dir is not None:
+            name_regions = token_processor.get_player_name_regions(detected_circles, (h, w))
+            vis_image = token_processor.create_visualization(image, detected_circles, name_regions)
+            vis_path = detected_tokens_dir / "detection.png"
+            cv2.imwrite(str(vis_path), vis_image)
+            # Full-size copy of the frame; release it before cropping
+            del vis_image
+            processing_steps.append(f"Image {img_idx + 1}: Saved visualization to {vis_path}")
 
         extracted_tokens = token_processor.extract_tokens(image, detected_circles)
         processing_steps.append(f"Image {img_idx + 1}: Extracted {len(extracted_tokens)} tokens")
 
-        token_processor.save_tokens(extracted_tokens, image_path.stem)
-        processing_steps.append(f"Image {img_idx + 1}: Saved {len(extracted_tokens)} tokens to disk")
+        if detected_tokens_dir is not None:
+            token_processor.save_tokens(extracted_tokens, Path(filename).stem)
+            processing_steps.append(f"Image {img_idx + 1}: Saved {len(extracted_tokens)} tokens to disk")
 
-        for idx in range(len(extracted_tokens)):
+        for idx, (token, _, _, _) in enumerate(extracted_tokens):
             position += 1
             player_name = player_names.get(idx)
             positions_with_names.append((position, player_name))
+            token_images.append(token)
+            if idx in name_futures:
+                pending_names[position] = name_futures[idx]
+        # Release this frame before the next one is decoded (background OCR holds only regions)
+        del image, extracted_tokens
 
     return ExtractResult(
         positions_with_names=positions_with_names,
         processing_steps=processing_steps,
         total_tokens=total_tokens,
-        image_count=len(image_files),
+        image_count=image_count,
+        pending_names=pending_names,
+        token_images=token_images,
+    )
+
+
+def _extract_merged(
+    named_images: List[Tuple[str, np.ndarray]],
+    circle_detector: CircleDetector,
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    processing_steps: List[str],
+    detected_tokens_dir: Optional[Path] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    detection_scale: float = 1.0,
+    cancel: Optional[CancelToken] = None,
+) -> ExtractResult:
+    """
+    Extract tokens from overlapping photos of one grimoire as a single ring. Circles are
+    detected per photo, mapped into the first photo's coordinates and de-duplicated, so
+    each seat is cropped, OCR'd and later matched once. detection.png shows the first photo.
+    """
+    names = [name for name, _ in named_images]
+    images = [image for _, image in named_images]
+    circles_per_image: List[List[Tuple[int, int, int]]] = []
+    for image in images:
+        if cancel is not None:
+            cancel.check("detect")
+        circles = circle_detector.detect_circles(image, detection_scale)
+        circles_per_image.append(sort_circles_reading_order(circles))
+    for img_idx, circles in enumerate(circles_per_image):
+        processing_steps.append(
+            f"Image {img_idx + 1} ({names[img_idx]}): Detected {len(circles)} circular tokens"
+        )
+
+    board, unregistered = merge_circles(images, circles_per_image)
+    for img_idx in unregistered:
+        processing_steps.append(
+            f"Image {img_idx + 1}: Could not be aligned with image 1, skipped (too little overlap)"
+        )
+    detected = sum(len(c) for i, c in enumerate(circles_per_image) if i not in unregistered)
+    processing_steps.append(
+        f"Merged {detected} detections into {len(board)} seats "
+        f"({detected - len(board)} duplicates across overlapping photos)"
+    )
+    if not board:
+        return ExtractResult(
+            positions_with_names=[],
+            processing_steps=processing_steps,
+            total_tokens=0,
+            image_count=len(images),
+        )
+
+    if detected_tokens_dir is not None:
+        first_circles = [bc.local for bc in board if bc.image_index == 0]
+        h, w = images[0].shape[:2]
+        name_regions = token_processor.get_player_name_regions(first_circles, (h, w))
+        vis_image = token_processor.create_visualization(images[0], first_circles, name_regions)
+        vis_path = detected_tokens_dir / "detection.png"
+        cv2.imwrite(str(vis_path), vis_image)
+        del vis_image
+        processing_steps.append(f"Image 1: Saved visualization to {vis_path}")
+
+    extracted_tokens = []
+    positions_with_names: List[Tuple[int, Optional[str]]] = []
+    pending_names: Dict[int, "Future[Optional[str]]"] = {}
+    for position, bc in enumerate(board, 1):
+        image = images[bc.image_index]
+        x, y, r = bc.local
+        extracted_tokens.append(token_processor.extract_tokens(image, [bc.local])[0])
+        region = player_name_extractor.extract_player_name_region(image, (x, y))
+        if ocr_executor is not None:
+            pending_names[position] = ocr_executor.submit(
+                player_name_extractor.extract_name_from_region, region, roster, cancel
+            )
+            positions_with_names.append((position, None))
+            continue
+        player_name = player_name_extractor.extract_name_from_region(region, roster, cancel)
+        if player_name:
+            processing_steps.append(f"Token {position}: Extracted player name '{player_name}'")
+        positions_with_names.append((position, player_name))
+
+    if detected_tokens_dir is not None:
+        token_processor.save_tokens(extracted_tokens, Path(names[0]).stem)
+        processing_steps.append(f"Saved {len(extracted_tokens)} merged tokens to disk")
+
+    return ExtractResult(
+        positions_with_names=positions_with_names,
+        processing_steps=processing_steps,
+        total_tokens=len(board),
+        image_count=len(images),
+        pending_names=pending_names,
+        token_images=[token for token, _, _, _ in extracted_tokens],
+    )
+
+
+def extract_tokens_from_crops(
+    seats: List[SeatCrop],
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    cancel: Optional[CancelToken] = None,
+) -> ExtractResult:
+    """
+    Extract tokens and player names from seats the client already cropped: no decode of
+    a full frame and no circle detection. Positions follow the reading order of the seats'
+    circles, as for detected circles. Each token crop is re-cut around its centre with the
+    server's padding and circular mask, so it matches like a server-side crop.
+    ocr_executor, roster and cancel work as in extract_tokens_from_images.
+    """
+    processing_steps: List[str] = [f"Received {len(seats)} pre-cropped seat(s)"]
+    by_circle: Dict[Tuple[int, int, int], List[SeatCrop]] = {}
+    for seat in seats:
+        by_circle.setdefault(tuple(seat.circle), []).append(seat)
+    ordered = [by_circle[c].pop(0) for c in sort_circles_reading_order([s.circle for s in seats])]
+
+    positions_with_names: List[Tuple[int, Optional[str]]] = []
+    token_images: List[np.ndarray] = []
+    pending_names: Dict[int, "Future[Optional[str]]"] = {}
+    for position, seat in enumerate(ordered, 1):
+        h, w = seat.token.shape[:2]
+        token_images.append(
+            token_processor.token_detector.extract_token(seat.token, w // 2, h // 2, seat.circle[2])
+        )
+        if ocr_executor is not None:
+            pending_names[position] = ocr_executor.submit(
+                player_name_extractor.extract_name_from_region, seat.name_region, roster, cancel
+            )
+            positions_with_names.append((position, None))
+            continue
+        player_name = player_name_extractor.extract_name_from_region(seat.name_region, roster, cancel)
+        if player_name:
+            processing_steps.append(f"Token {position}: Extracted player name '{player_name}'")
+        positions_with_names.append((position, player_name))
+
+    return ExtractResult(
+        positions_with_names=positions_with_names,
+        processing_steps=processing_steps,
+        total_tokens=len(ordered),
+        image_count=0,
+        pending_names=pending_names,
+        token_images=token_images,
     )
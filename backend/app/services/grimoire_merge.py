@@ -0,0 +1,137 @@
+"""
+Merge several overlapping photos of one grimoire into a single ring of seats.
+Each photo is registered to the first one (ORB features + RANSAC homography), detected
+circles are mapped into that board coordinate space, and circles seen in more than one
+photo are kept once (from the photo where the token sits furthest from the border).
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.utils.circle_order import sort_circles_reading_order
+from app.utils.image_utils import ensure_grayscale
+
+Circle = Tuple[int, int, int]
+
+# Photos are registered at this max side length; the homography is scaled back up
+REGISTER_MAX_SIDE = 1000
+
+# ORB features per photo for registration
+REGISTER_FEATURES = 4000
+
+# Lowe's ratio for registration matches
+REGISTER_RATIO = 0.75
+
+# RANSAC reprojection threshold in registration pixels
+REGISTER_REPROJ_THRESHOLD = 4.0
+
+# A homography needs this many inliers to be trusted
+MIN_REGISTER_INLIERS = 30
+
+# Two mapped circles are the same token when their centres are closer than this
+# fraction of the (larger) radius
+DUPLICATE_DISTANCE_RATIO = 0.6
+
+
+@dataclass
+class BoardCircle:
+    """A seat in board (first photo) coordinates, and where to crop it from."""
+    board: Circle
+    image_index: int
+    local: Circle
+
+
+def _registration_features(image: np.ndarray, orb) -> Tuple[list, Optional[np.ndarray], float]:
+    """ORB keypoints/descriptors on a downscaled grey copy, plus the downscale factor."""
+    gray = ensure_grayscale(image)
+    scale = min(1.0, REGISTER_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    kps, des = orb.detectAndCompute(gray, None)
+    return kps, des, scale
+
+
+def register_images(reference: np.ndarray, image: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Homography (3x3) mapping full-resolution image coordinates to reference coordinates,
+    or None when the photos do not overlap enough to register reliably.
+    """
+    orb = cv2.ORB_create(nfeatures=REGISTER_FEATURES)
+    kps_ref, des_ref, s_ref = _registration_features(reference, orb)
+    kps_img, des_img, s_img = _registration_features(image, orb)
+    if des_ref is None or des_img is None or len(des_ref) < 2 or len(des_img) < 2:
+        return None
+    pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(des_img, des_ref, k=2)
+    good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < REGISTER_RATIO * p[1].distance]
+    if len(good) < MIN_REGISTER_INLIERS:
+        return None
+    src = np.float32([kps_img[m.queryIdx].pt for m in good])
+    dst = np.float32([kps_ref[m.trainIdx].pt for m in good])
+    homography, mask = cv2.findHomography(src, dst, cv2.RANSAC, REGISTER_REPROJ_THRESHOLD)
+    if homography is None or mask is None or int(mask.sum()) < MIN_REGISTER_INLIERS:
+        return None
+    # Full-res image -> registration scale -> reference registration scale -> full-res reference
+    to_small = np.diag([s_img, s_img, 1.0])
+    from_small = np.diag([1.0 / s_ref, 1.0 / s_ref, 1.0])
+    return from_small @ homography @ to_small
+
+
+def _map_circle(circle: Circle, homography: np.ndarray) -> Circle:
+    """Map a circle through a homography; the radius scales with the local area change."""
+    x, y, r = circle
+    centre = cv2.perspectiveTransform(np.float32([[[x, y]]]), homography)[0, 0]
+    offsets = cv2.perspectiveTransform(np.float32([[[x + r, y], [x, y + r]]]), homography)[0]
+    radius = float(np.mean(np.linalg.norm(offsets - centre, axis=1)))
+    return (int(round(centre[0])), int(round(centre[1])), int(round(radius)))
+
+
+def _border_margin(circle: Circle, shape: Tuple[int, ...]) -> float:
+    """Distance from the circle's edge to the nearest image border, in radii."""
+    x, y, r = circle
+    h, w = shape[:2]
+    return min(x, y, w - x, h - y) / max(r, 1) - 1.0
+
+
+def merge_circles(
+    images: Sequence[np.ndarray], circles_per_image: Sequence[Sequence[Circle]]
+) -> Tuple[List[BoardCircle], List[int]]:
+    """
+    Merge per-photo circles into one ring in the first photo's coordinates, sorted in
+    reading order. Returns (board circles, indices of photos that could not be registered);
+    unregistered photos are left out rather than risking duplicate seats.
+    """
+    board: List[BoardCircle] = []
+    unregistered: List[int] = []
+    for image_index, (image, circles) in enumerate(zip(images, circles_per_image)):
+        if image_index == 0:
+            homography = np.eye(3)
+        else:
+            homography = register_images(images[0], image)
+            if homography is None:
+                unregistered.append(image_index)
+                continue
+        for local in circles:
+            mapped = _map_circle(local, homography)
+            candidate = BoardCircle(board=mapped, image_index=image_index, local=tuple(local))
+            duplicate = next(
+                (
+                    i
+                    for i, seen in enumerate(board)
+                    if np.hypot(seen.board[0] - mapped[0], seen.board[1] - mapped[1])
+                    < DUPLICATE_DISTANCE_RATIO * max(seen.board[2], mapped[2])
+                ),
+                None,
+            )
+            if duplicate is None:
+                board.append(candidate)
+                continue
+            # Keep the view where the token is least likely to be cut off by the frame
+            seen = board[duplicate]
+            if _border_margin(local, image.shape) > _border_margin(seen.local, images[seen.image_index].shape):
+                board[duplicate] = candidate
+
+    order = sort_circles_reading_order([bc.board for bc in board])
+    by_board = {bc.board: bc for bc in board}
+    return [by_board[c] for c in order], unregistered
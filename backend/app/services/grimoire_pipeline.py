@@ -2,9 +2,12 @@
 Single pipeline: extract tokens from grimoire images + match to ref characters.
 Returns parsed tokens (position, player name, character, is_dead) and can convert to Town Square state.
 """
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import AbstractSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from app.models.schemas import (
     ParsedToken,
@@ -12,11 +15,17 @@ from app.models.schemas import (
     TownSquarePlayer,
     TokenMatch,
 )
+from app.services.cancellation import CancelToken
 from app.services.circle_detector import CircleDetector
-from app.services.extract_tokens import ExtractResult, extract_tokens as run_extract_tokens
+from app.services.extract_tokens import (
+    ExtractResult,
+    SeatCrop,
+    extract_tokens as run_extract_tokens,
+    extract_tokens_from_crops,
+    extract_tokens_from_images,
+)
 from app.services.image_processor import ImageProcessor
-from app.services.match_tokens import match_tokens as run_match_tokens
-from app.services.orb_matcher import ORBMatcher
+from app.services.match_tokens import TokenMatcher, match_token_images
 from app.services.player_name_extractor import PlayerNameExtractor
 from app.services.token_processor import TokenProcessor
 
@@ -36,11 +45,23 @@ def extract_and_match(
     circle_detector: CircleDetector,
     token_processor: TokenProcessor,
     player_name_extractor: PlayerNameExtractor,
-    orb_matcher: ORBMatcher,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    merge_overlapping: bool = False,
+    detection_scale: float = 1.0,
 ) -> ExtractAndMatchResult:
     """
-    Run extract-tokens then match-tokens; merge into a list of ParsedToken.
-    Reusable for parse, townsquare, process, and extract-tokens endpoints.
+    Run extract-tokens then match the crops; merge into a list of ParsedToken.
+    Reusable for parse, townsquare, and extract-tokens endpoints (uploads use
+    extract_and_match_images).
+    script_roles (role ids of the game's script) are tried first when matching.
+    With ocr_executor, name OCR runs in the pool while tokens are cropped and matched
+    on this thread; the two are joined by token position at the end.
+    roster (known player names of the server) is used to snap OCR'd names.
+    merge_overlapping treats the source images as overlapping photos of one grimoire.
+    detection_scale is the circle detection working resolution (see memory_budget).
     """
     extract_result = run_extract_tokens(
         source_images_dir,
@@ -49,11 +70,103 @@ def extract_and_match(
         circle_detector,
         token_processor,
         player_name_extractor,
+        ocr_executor=ocr_executor,
+        roster=roster,
+        merge_overlapping=merge_overlapping,
+        detection_scale=detection_scale,
+    )
+    return match_extracted(extract_result, matcher, script_roles)
+
+
+def extract_and_match_images(
+    images: Iterable[Tuple[str, np.ndarray]],
+    image_count: int,
+    circle_detector: CircleDetector,
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    merge_overlapping: bool = False,
+    detection_scale: float = 1.0,
+    cancel: Optional[CancelToken] = None,
+) -> ExtractAndMatchResult:
+    """
+    extract_and_match on decoded (name, image) pairs instead of a directory; nothing is
+    written to disk. images may be a generator that decodes each image when reached.
+    cancel is checked between images and tokens and passed to name OCR.
+    """
+    extract_result = extract_tokens_from_images(
+        images,
+        image_count,
+        circle_detector,
+        token_processor,
+        player_name_extractor,
+        ocr_executor=ocr_executor,
+        roster=roster,
+        merge_overlapping=merge_overlapping,
+        detection_scale=detection_scale,
+        cancel=cancel,
+    )
+    return match_extracted(extract_result, matcher, script_roles, cancel)
+
+
+def extract_and_match_crops(
+    seats: List[SeatCrop],
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    cancel: Optional[CancelToken] = None,
+) -> ExtractAndMatchResult:
+    """
+    extract_and_match on seats cropped by the client: straight to OCR and matching,
+    without decoding a full frame or detecting circles. cancel as in extract_and_match_images.
+    """
+    extract_result = extract_tokens_from_crops(
+        seats,
+        token_processor,
+        player_name_extractor,
+        ocr_executor=ocr_executor,
+        roster=roster,
+        cancel=cancel,
+    )
+    return match_extracted(extract_result, matcher, script_roles, cancel)
+
+
+def match_extracted(
+    extract_result: ExtractResult,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]],
+    cancel: Optional[CancelToken] = None,
+) -> ExtractAndMatchResult:
+    """Match the extracted crops in position order, join background OCR, merge into ParsedTokens."""
+    matches = match_token_images(
+        enumerate(extract_result.token_images, 1), matcher, script_roles=script_roles, cancel=cancel
+    )
+    extract_result.resolve_names()
+    return ExtractAndMatchResult(
+        extract_result=extract_result,
+        matches=matches,
+        parsed_tokens=merge_names_and_matches(extract_result.positions_with_names, matches),
     )
-    matches = run_match_tokens(detected_tokens_dir, orb_matcher)
+
+
+def merge_names_and_matches(
+    positions_with_names: Iterable[Tuple[int, Optional[str]]],
+    matches: Iterable[TokenMatch],
+) -> List[ParsedToken]:
+    """
+    ParsedTokens from (position, player name) pairs and token matches, joined by position
+    (1-based); a position without a match has no character. Every pipeline (directory,
+    uploads, crops, the stage engine, rescans) builds its result here.
+    """
     match_by_token = {m.token: m for m in matches}
     parsed_tokens: List[ParsedToken] = []
-    for position, player_name in extract_result.positions_with_names:
+    for position, player_name in positions_with_names:
         m = match_by_token.get(position)
         parsed_tokens.append(
             ParsedToken(
@@ -65,11 +178,7 @@ def extract_and_match(
                 is_dead=m.is_dead if m is not None else None,
             )
         )
-    return ExtractAndMatchResult(
-        extract_result=extract_result,
-        matches=matches,
-        parsed_tokens=parsed_tokens,
-    )
+    return parsed_tokens
 
 
 def parsed_tokens_to_town_square(tokens: List[ParsedToken]) -> TownSquareGameState:
@@ -0,0 +1,164 @@
+"""
+The single-image grimoire pipeline as engine stages (see pipeline_engine):
+
+    content -> decode -> image -> detect -> circles -> sort -> seats
+    image + seats -> crop -> token_images -> match -> matches
+    image + seats + roster -> names -> names                       (runs alongside crop/match)
+    seats + names + matches -> assemble -> parsed_tokens -> town_square -> town_square
+    image + seats + token_images + parsed_tokens -> store -> scan_seats    (only when targeted)
+
+Inputs: content (encoded image bytes), detection_scale, roster (known player names or
+None) and script_roles (role ids tried first, or None). Detection, OCR and matching are
+memoized, so rescanning an unchanged photo only hashes it. names and match take the
+run's CancelToken and stop between seats (killing in-flight OCR) once it is cancelled.
+scan_seats are the seats as stored with a scan (hashes and token crops, see rescan).
+"""
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.cancellation import CancelToken, ScanCancelled
+from app.services.circle_detector import CircleDetector
+from app.services.grimoire_pipeline import merge_names_and_matches, parsed_tokens_to_town_square
+from app.services.match_tokens import TokenMatcher, match_token_images
+from app.services.pipeline_engine import PipelineEngine, Stage, StageCache
+from app.services.player_name_extractor import PlayerNameExtractor
+from app.services.rescan import scan_seats, seat_hashes
+from app.services.token_processor import TokenProcessor
+from app.utils.circle_order import sort_circles_reading_order
+
+# Names of the values a grimoire run produces, for run(targets=...)
+IMAGE = "image"
+SEATS = "seats"
+TOKEN_IMAGES = "token_images"
+NAMES = "names"
+MATCHES = "matches"
+PARSED_TOKENS = "parsed_tokens"
+TOWN_SQUARE = "town_square"
+SCAN_SEATS = "scan_seats"
+
+
+def _circle_list(circles) -> List[Dict[str, int]]:
+    return [{"x": int(x), "y": int(y), "r": int(r)} for x, y, r in circles]
+
+
+def build_grimoire_engine(
+    circle_detector: CircleDetector,
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    matcher: TokenMatcher,
+    matcher_version: str,
+    ocr_executor: Optional[Executor] = None,
+    cache: Optional[StageCache] = None,
+    executor: Optional[Executor] = None,
+) -> PipelineEngine:
+    """
+    Engine for one image with the given services. matcher_version identifies the matcher
+    and its reference pack (part of the match stage's cache key). With ocr_executor, the
+    names stage OCRs seats in parallel; with executor, independent stages run concurrently.
+    """
+
+    def decode(content) -> Dict[str, Any]:
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Couldn't decode image")
+        return {IMAGE: image}
+
+    def detect(image: np.ndarray, detection_scale: float) -> Dict[str, Any]:
+        return {"circles": circle_detector.detect_circles(image, detection_scale)}
+
+    def sort(circles) -> Dict[str, Any]:
+        return {SEATS: sort_circles_reading_order(circles)}
+
+    def crop(image: np.ndarray, seats) -> Dict[str, Any]:
+        return {TOKEN_IMAGES: [token for token, _, _, _ in token_processor.extract_tokens(image, seats)]}
+
+    def names(image: np.ndarray, seats, roster, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        if ocr_executor is None:
+            return {NAMES: player_name_extractor.extract_names_for_circles(image, seats, roster, cancel=cancel)}
+        futures = player_name_extractor.submit_names_for_circles(ocr_executor, image, seats, roster, cancel=cancel)
+        try:
+            resolved = {idx: future.result() for idx, future in futures.items()}
+        except ScanCancelled:
+            # Drop seats still queued; running ones see the token and stop
+            for future in futures.values():
+                future.cancel()
+            raise
+        return {NAMES: {idx: name for idx, name in resolved.items() if name}}
+
+    def match(token_images, script_roles, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        return {
+            MATCHES: match_token_images(
+                enumerate(token_images, 1), matcher, script_roles=script_roles, cancel=cancel
+            )
+        }
+
+    def assemble(seats, names, matches) -> Dict[str, Any]:
+        positions_with_names = [(position, names.get(position - 1)) for position in range(1, len(seats) + 1)]
+        return {PARSED_TOKENS: merge_names_and_matches(positions_with_names, matches)}
+
+    def town_square(parsed_tokens) -> Dict[str, Any]:
+        return {TOWN_SQUARE: parsed_tokens_to_town_square(parsed_tokens)}
+
+    def store(image: np.ndarray, seats, token_images, parsed_tokens) -> Dict[str, Any]:
+        regions = [player_name_extractor.extract_player_name_region(image, (x, y)) for x, y, _ in seats]
+        token_hashes, name_hashes = seat_hashes(token_images, regions, player_name_extractor)
+        return {SCAN_SEATS: scan_seats(seats, token_images, token_hashes, name_hashes, parsed_tokens)}
+
+    stages = [
+        Stage(
+            "decode", decode, ("content",), (IMAGE,),
+            describe=lambda v: {"width": v[IMAGE].shape[1], "height": v[IMAGE].shape[0], "channels": v[IMAGE].shape[2]},
+        ),
+        Stage(
+            "detect", detect, (IMAGE, "detection_scale"), ("circles",),
+            version=":".join(str(v) for v in circle_detector.get_detection_params().values()),
+            memoize=True,
+            describe=lambda v: {
+                "circles_found": len(v["circles"]),
+                "params": circle_detector.get_detection_params(),
+                "circles": _circle_list(v["circles"]),
+            },
+        ),
+        Stage("sort", sort, ("circles",), (SEATS,), describe=lambda v: {"order": _circle_list(v[SEATS])}),
+        Stage(
+            "crop", crop, (IMAGE, SEATS), (TOKEN_IMAGES,),
+            describe=lambda v: {"tokens_extracted": len(v[TOKEN_IMAGES])},
+        ),
+        Stage(
+            "names", names, (IMAGE, SEATS, "roster"), (NAMES,),
+            version=f"{player_name_extractor.target_text_height}:{player_name_extractor.max_ocr_scale}",
+            memoize=True,
+            cancellable=True,
+            describe=lambda v: {
+                "names": [
+                    {"position": idx + 1, "extracted_name": name} for idx, name in sorted(v[NAMES].items())
+                ]
+            },
+        ),
+        Stage(
+            "match", match, (TOKEN_IMAGES, "script_roles"), (MATCHES,),
+            version=matcher_version,
+            memoize=True,
+            cancellable=True,
+            describe=lambda v: {
+                "matches_found": len(v[MATCHES]),
+                "matches": [
+                    {
+                        "token": m.token,
+                        "character": m.character,
+                        "character_type": m.character_type,
+                        "confidence": round(m.confidence, 4),
+                        "is_dead": m.is_dead,
+                    }
+                    for m in v[MATCHES]
+                ],
+            },
+        ),
+        Stage("assemble", assemble, (SEATS, NAMES, MATCHES), (PARSED_TOKENS,)),
+        Stage("town_square", town_square, (PARSED_TOKENS,), (TOWN_SQUARE,)),
+        Stage("store", store, (IMAGE, SEATS, TOKEN_IMAGES, PARSED_TOKENS), (SCAN_SEATS,)),
+    ]
+    return PipelineEngine(stages, cache=cache, executor=executor)
@@ -1,15 +1,38 @@
 """
 Match detected token images (1.png, 2.png, ... in detected_tokens) to ref-images using
 ORB feature matching. Used by /api/match-tokens and by the combined /api/grimoire/parse.
+Every pipeline matches through here, with any TokenMatcher (ORB or embedding).
 """
 from pathlib import Path
-from typing import List, Tuple
+from typing import AbstractSet, Iterable, List, Optional, Protocol, Set, Tuple
 
 import cv2
+import numpy as np
 
 from app.models.schemas import DEAD_SUFFIX, TokenMatch
-from app.services.orb_matcher import ORBMatcher
-from app.utils.character_matcher import get_character_type
+from app.services.cancellation import CancelToken
+from app.utils.character_matcher import get_character_type, role_id
+
+
+class TokenMatcher(Protocol):
+    """
+    What the pipelines need from a character matcher (ORBMatcher, EmbeddingMatcher):
+    matches as (ref name, character type, confidence) and the confidence thresholds on
+    its own score scale.
+    """
+    unique_role_min_confidence: float
+    reverify_min_confidence: float
+
+    def match_character(
+        self,
+        token_image: np.ndarray,
+        script_roles: Optional[AbstractSet[str]] = None,
+        exclude_roles: Optional[AbstractSet[str]] = None,
+    ) -> Optional[Tuple[str, str, float]]:
+        ...
+
+    def match_roles(self, token_image: np.ndarray, roles: AbstractSet[str]) -> Optional[Tuple[str, str, float]]:
+        ...
 
 
 def collect_token_files(detected_tokens_dir: Path) -> List[Tuple[int, Path]]:
@@ -30,41 +53,66 @@ def collect_token_files(detected_tokens_dir: Path) -> List[Tuple[int, Path]]:
 
 def match_tokens(
     detected_tokens_dir: Path,
-    orb_matcher: ORBMatcher,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
 ) -> List[TokenMatch]:
     """
     Load token images (1.png, 2.png, ...) from detected_tokens_dir and match each
-    to ref-images using ORB. Returns list of TokenMatch (token, character, character_type, confidence).
+    to ref-images with matcher. Returns list of TokenMatch (token, character, character_type, confidence).
+    script_roles (role ids of the game's script) are tried first; confidently matched roles
+    are removed from the candidate pool for later tokens.
+    """
+    token_images = (
+        (token_num, cv2.imread(str(path)))
+        for token_num, path in collect_token_files(detected_tokens_dir)
+    )
+    return match_token_images(token_images, matcher, script_roles=script_roles)
+
+
+def token_match_from_ref(token_num: int, ref_name: str, confidence: float) -> TokenMatch:
+    """TokenMatch for a matched ref-image stem; -dead refs mark the token dead."""
+    is_dead = ref_name.endswith(DEAD_SUFFIX)
+    character = ref_name[: -len(DEAD_SUFFIX)] if is_dead else ref_name
+    return TokenMatch(
+        token=token_num,
+        character=character,
+        character_type=get_character_type(character),
+        confidence=round(confidence, 4),
+        is_dead=is_dead,
+    )
+
+
+def match_token_images(
+    token_images: Iterable[Tuple[int, Optional[np.ndarray]]],
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
+    assigned_roles: Optional[Set[str]] = None,
+    cancel: Optional[CancelToken] = None,
+) -> List[TokenMatch]:
+    """
+    Match in-memory token images, given as (token number, image or None), in order.
+    assigned_roles (role ids already taken in this grimoire) is extended in place as
+    tokens are confidently matched. cancel is checked before each token.
     """
-    token_files = collect_token_files(detected_tokens_dir)
     matches: List[TokenMatch] = []
-    for token_num, path in token_files:
-        img = cv2.imread(str(path))
+    if assigned_roles is None:
+        assigned_roles = set()
+    for token_num, img in token_images:
+        if cancel is not None:
+            cancel.check("match")
         if img is None:
             matches.append(
                 TokenMatch(token=token_num, character=None, character_type=None, confidence=0.0, is_dead=None)
             )
             continue
-        result = orb_matcher.match_character(img)
+        result = matcher.match_character(
+            img, script_roles=script_roles, exclude_roles=assigned_roles
+        )
         if result:
             ref_name, _, confidence = result
-            if ref_name.endswith(DEAD_SUFFIX):
-                character = ref_name[: -len(DEAD_SUFFIX)]
-                character_type = get_character_type(character)
-                is_dead = True
-            else:
-                character = ref_name
-                character_type = get_character_type(character)
-                is_dead = False
-            matches.append(
-                TokenMatch(
-                    token=token_num,
-                    character=character,
-                    character_type=character_type,
-                    confidence=round(confidence, 4),
-                    is_dead=is_dead,
-                )
-            )
+            if confidence >= matcher.unique_role_min_confidence:
+                assigned_roles.add(role_id(ref_name))
+            matches.append(token_match_from_ref(token_num, ref_name, confidence))
         else:
             matches.append(
                 TokenMatch(token=token_num, character=None, character_type=None, confidence=0.0, is_dead=None)
@@ -0,0 +1,211 @@
+"""
+Memory budget for grimoire scans. The API runs on small instances (512MB), and a
+12MP photo costs far more than its upload size once decoded and run through circle
+detection. Each scan's peak footprint is estimated from the image header before
+decoding, circle detection runs at a working resolution that fits the per-scan
+budget, and scans are only admitted while the process-wide budget has room.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+# Decoded BGR frame, held for the whole scan
+FRAME_BYTES_PER_PIXEL = 3
+
+# Decoder working buffers on top of the frame while it decodes (JPEG peaks ~5.7 B/px in
+# total); freed heap is rarely returned to the OS, so this stays resident for the scan
+DECODE_BYTES_PER_PIXEL = 3
+
+# Circle detection working set per detection pixel: downscaled copy, grayscale, blur and
+# HoughCircles' gradient / edge / accumulator buffers (measured ~13-15 B/px)
+DETECTION_BYTES_PER_PIXEL = 15
+
+# Token crops, name regions, matcher buffers and response building; roughly size independent
+SCAN_OVERHEAD_BYTES = 16 * 1024 * 1024
+
+# Detection working resolutions tried in order; the first that fits the per-scan budget is used
+DETECTION_SCALES = (1.0, 0.5, 0.25)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def read_image_size(content: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from the image header without decoding pixels, or None if unreadable."""
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def image_sizes(contents: List[bytes]) -> Optional[List[Tuple[int, int]]]:
+    """Header sizes of several uploads; None if any header is unreadable."""
+    sizes = []
+    for content in contents:
+        size = read_image_size(content)
+        if size is None:
+            return None
+        sizes.append(size)
+    return sizes
+
+
+def estimate_scan_bytes(
+    sizes: Sequence[Tuple[int, int]], detection_scale: float = 1.0, content_bytes: int = 0
+) -> int:
+    """
+    Peak bytes for scanning images of the given (width, height): all decoded frames held
+    at once (merges and bursts keep every frame), plus one decoder and one detection
+    working set (images are decoded and detected one after another), plus the still-held
+    upload bytes and fixed overhead.
+    """
+    if not sizes:
+        return SCAN_OVERHEAD_BYTES + content_bytes
+    frames = sum(w * h for w, h in sizes) * FRAME_BYTES_PER_PIXEL
+    largest = max(w * h for w, h in sizes)
+    decode = largest * DECODE_BYTES_PER_PIXEL
+    detection = int(largest * detection_scale * detection_scale * DETECTION_BYTES_PER_PIXEL)
+    return frames + decode + detection + content_bytes + SCAN_OVERHEAD_BYTES
+
+
+@dataclass
+class ScanPlan:
+    """Working resolution and estimated peak memory for one scan."""
+    detection_scale: float
+    estimated_bytes: int
+    megapixels: float
+
+
+def plan_scan(
+    sizes: Sequence[Tuple[int, int]], per_scan_budget: int, content_bytes: int = 0
+) -> Optional[ScanPlan]:
+    """
+    Largest detection scale whose estimate fits per_scan_budget, or None when even the
+    smallest does not (the decoded frames alone are too big for this instance).
+    """
+    megapixels = round(sum(w * h for w, h in sizes) / 1e6, 2)
+    for scale in DETECTION_SCALES:
+        estimate = estimate_scan_bytes(sizes, scale, content_bytes)
+        if estimate <= per_scan_budget:
+            return ScanPlan(detection_scale=scale, estimated_bytes=estimate, megapixels=megapixels)
+    return None
+
+
+def plan_crops(
+    sizes: Sequence[Tuple[int, int]], per_scan_budget: int, content_bytes: int = 0
+) -> Optional[ScanPlan]:
+    """
+    Plan for a capture the client already cropped: every crop (and the frame, if sent) is
+    decoded and held, but nothing goes through circle detection (detection_scale 0).
+    None when it does not fit per_scan_budget.
+    """
+    estimate = estimate_scan_bytes(sizes, 0.0, content_bytes)
+    if estimate > per_scan_budget:
+        return None
+    megapixels = round(sum(w * h for w, h in sizes) / 1e6, 2)
+    return ScanPlan(detection_scale=0.0, estimated_bytes=estimate, megapixels=megapixels)
+
+
+def max_frame_pixels(per_scan_budget: int) -> int:
+    """Largest single frame (pixels) whose scan fits per_scan_budget with full-resolution detection."""
+    per_pixel = FRAME_BYTES_PER_PIXEL + DECODE_BYTES_PER_PIXEL + DETECTION_BYTES_PER_PIXEL
+    return max(0, (per_scan_budget - SCAN_OVERHEAD_BYTES) // per_pixel)
+
+
+class AdmissionTimeout(Exception):
+    """A scan could not be admitted under the memory budget in time."""
+
+
+class MemoryBudget:
+    """
+    Process-wide admission control for scans. A scan reserves its estimated bytes and
+    waits while the reservations of running scans leave too little room. A single scan
+    larger than the whole budget is still admitted once nothing else is running.
+    """
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.reserved_bytes = 0
+        self.running = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.running == 0 or self.reserved_bytes + nbytes <= self.total_bytes
+
+    @asynccontextmanager
+    async def admit(self, nbytes: int, timeout: float) -> AsyncIterator[float]:
+        """
+        Reserve nbytes for the duration of the block; yields the seconds spent waiting.
+        Raises AdmissionTimeout if the reservation could not be made within timeout.
+        """
+        if self._condition is None:
+            # Created lazily so it binds to the server's event loop
+            self._condition = asyncio.Condition()
+        start = time.perf_counter()
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self._fits(nbytes)), timeout)
+            except asyncio.TimeoutError:
+                raise AdmissionTimeout(
+                    f"{self.running} scan(s) hold {self.reserved_bytes / 2**20:.0f} MB of the budget"
+                )
+            self.reserved_bytes += nbytes
+            self.running += 1
+        try:
+            yield time.perf_counter() - start
+        finally:
+            async with self._condition:
+                self.reserved_bytes -= nbytes
+                self.running -= 1
+                self._condition.notify_all()
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRssSampler:
+    """
+    Track the process RSS peak while a block runs, sampling from a background thread
+    (the process high-water mark cannot be reset per scan). With concurrent scans the
+    peak is the whole process's, which is what matters for the instance limit.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start_bytes: Optional[int] = None
+        self.peak_bytes: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            rss = current_rss_bytes()
+            if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+                self.peak_bytes = rss
+
+    def __enter__(self) -> "PeakRssSampler":
+        self.start_bytes = self.peak_bytes = current_rss_bytes()
+        if self.start_bytes is not None:
+            self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
@@ -0,0 +1,44 @@
+"""
+In-process counters for operational metrics, served as JSON by GET /api/metrics.
+Counters are per worker process and reset on restart.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Tuple
+
+
+class Metrics:
+    """Thread-safe named counters, optionally split by labels (e.g. reason="deadline")."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def get(self, name: str, **labels: Any) -> float:
+        """Counter value for exactly these labels (0 when never incremented)."""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            return self._counters.get(name, {}).get(key, 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        {"uptimeS": ..., "counters": {name: {"total": n, "series": [{labels..., "value": n}]}}}
+        """
+        with self._lock:
+            counters = {
+                name: {
+                    "total": round(sum(series.values()), 3),
+                    "series": [{**dict(key), "value": round(value, 3)} for key, value in sorted(series.items())],
+                }
+                for name, series in sorted(self._counters.items())
+            }
+        return {"uptimeS": round(time.time() - self.started_at, 1), "counters": counters}
@@ -6,9 +6,9 @@ and comparing visual features. Used by the /api/match-tokens endpoint.
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import AbstractSet, Dict, List, Optional, Tuple
 
-from app.utils.character_matcher import get_character_type
+from app.utils.character_matcher import get_character_type, role_id
 from app.utils.image_utils import ensure_grayscale
 
 
@@ -21,24 +21,94 @@ RATIO_THRESHOLD = 0.75
 # Scale factor to map raw match count to [0, 1] confidence
 CONFIDENCE_SCALE = 5.0
 
+# Geometric verification: how many of the best ratio-test candidates get a RANSAC check
+VERIFY_TOP_K = 3
+
+# Max reprojection error (pixels, at match size) for a correspondence to count as an inlier
+RANSAC_REPROJ_THRESHOLD = 5.0
+
+# A verified candidate needs at least this many inliers, otherwise the ratio-test ranking stands
+MIN_INLIERS = 6
+
+# Refs are scanned with the early-exit cascade unless a caller turns it off (profiles, sweeps)
+EARLY_EXIT = True
+
+# Early exit: stop scanning refs once the best score reaches this value...
+EARLY_EXIT_SCORE = 0.65
+
+# ...and leads the runner-up by at least this much
+EARLY_EXIT_MARGIN = 0.25
+
+# Never stop before this many refs have been scored, so the margin means something
+EARLY_EXIT_MIN_REFS = 4
+
+# Refs are pre-ranked by ratio-test matches of only the query's strongest keypoints
+PRESCORE_FEATURES = 48
+
+# A match at least this confident claims its role for the grimoire: each role appears on
+# one token only, so later tokens are matched without it.
+UNIQUE_ROLE_MIN_CONFIDENCE = 0.65
+
+# On a rescan, a token whose hash changed keeps its previous role when it scores at least
+# this against that role's refs alone (other roles' refs score well below it on a moved camera)
+REVERIFY_MIN_CONFIDENCE = 0.65
+
 
 class ORBMatcher:
     """
     Match token images to reference character images using ORB features.
     Loads all PNGs from ref_images_dir, precomputes descriptors, and returns
     the best-matching character (by name and type) and confidence for a query token image.
+
+    With verify_geometry=True the top VERIFY_TOP_K ratio-test candidates are re-ranked by
+    the inlier count of a RANSAC similarity fit between query and reference keypoints.
+    Spatially consistent matches are a much stronger signal than raw match counts, so the
+    bulk pass can run with fewer features and a smaller match size.
+
+    With early_exit=True refs are visited most-likely first (script roles, then a cheap
+    pre-score from the query's PRESCORE_FEATURES strongest keypoints) and scanning stops
+    once a candidate is decisive (early_exit_score, default EARLY_EXIT_SCORE, ahead of the
+    runner-up by early_exit_margin, default EARLY_EXIT_MARGIN). The leading role's other
+    variant (alive / dead) is always scored before stopping, so is_dead does not depend on
+    which of the two was visited first.
     """
 
-    def __init__(self, ref_images_dir: Path, nfeatures: int = 500):
+    # Confidence thresholds on this matcher's score scale (see match_tokens / rescan)
+    unique_role_min_confidence = UNIQUE_ROLE_MIN_CONFIDENCE
+    reverify_min_confidence = REVERIFY_MIN_CONFIDENCE
+
+    def __init__(
+        self,
+        ref_images_dir: Path,
+        nfeatures: int = 500,
+        match_size: Tuple[int, int] = MATCH_SIZE,
+        verify_geometry: bool = False,
+        early_exit: bool = EARLY_EXIT,
+        ratio_threshold: float = RATIO_THRESHOLD,
+        confidence_scale: float = CONFIDENCE_SCALE,
+        early_exit_score: float = EARLY_EXIT_SCORE,
+        early_exit_margin: float = EARLY_EXIT_MARGIN,
+    ):
         self.ref_images_dir = Path(ref_images_dir)
+        self.nfeatures = nfeatures
+        self.match_size = tuple(match_size)
+        self.ratio_threshold = ratio_threshold
+        self.confidence_scale = confidence_scale
+        self.early_exit_score = early_exit_score
+        self.early_exit_margin = early_exit_margin
+        self.verify_geometry = verify_geometry
+        self.early_exit = early_exit
         self.orb = cv2.ORB_create(nfeatures=nfeatures)
         self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
         self._descriptors: Dict[str, np.ndarray] = {}
+        # Keypoint coordinates (N x 2, float32) aligned row-for-row with _descriptors
+        self._keypoints: Dict[str, np.ndarray] = {}
         self._load_references()
 
     def _load_references(self) -> None:
-        """Load reference images and compute ORB descriptors."""
+        """Load reference images and compute ORB keypoints and descriptors."""
         self._descriptors.clear()
+        self._keypoints.clear()
         if not self.ref_images_dir.exists():
             return
         for path in sorted(self.ref_images_dir.glob("*.png")):
@@ -46,62 +116,179 @@ class ORBMatcher:
             if img is None:
                 continue
             img = self._preprocess(img)
-            _, des = self.orb.detectAndCompute(img, None)
+            kps, des = self.orb.detectAndCompute(img, None)
             if des is not None and len(des) >= 2:
                 self._descriptors[path.stem] = des
+                self._keypoints[path.stem] = _keypoint_coords(kps)
 
     def _preprocess(self, image: np.ndarray) -> np.ndarray:
         """Convert to grayscale and resize to fixed size for consistent features."""
         gray = ensure_grayscale(image)
-        return cv2.resize(gray, MATCH_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.resize(gray, self.match_size, interpolation=cv2.INTER_AREA)
 
-    def _confidence(self, des_query: np.ndarray, des_ref: np.ndarray) -> float:
+    def _candidate_order(
+        self,
+        kps_query: List[cv2.KeyPoint],
+        des_query: np.ndarray,
+        script_roles: Optional[AbstractSet[str]],
+        exclude_roles: Optional[AbstractSet[str]],
+    ) -> List[str]:
         """
-        Compute match confidence in [0, 1] using ORB descriptor matching with ratio test.
+        Ref names to score, most likely first: refs whose role is in the game's script,
+        then by ratio-test matches of the query's strongest keypoints. Excluded roles are dropped.
         """
+        names = [n for n in self._descriptors if not exclude_roles or role_id(n) not in exclude_roles]
+        if not self.early_exit:
+            return names
+        strongest = sorted(range(len(kps_query)), key=lambda i: kps_query[i].response, reverse=True)
+        des_strong = des_query[strongest[:PRESCORE_FEATURES]]
+        prescore = {n: len(self._good_matches(des_strong, self._descriptors[n])) for n in names}
+        names.sort(key=lambda n: (bool(script_roles) and role_id(n) not in script_roles, -prescore[n]))
+        return names
+
+    def _good_matches(self, des_query: np.ndarray, des_ref: np.ndarray) -> List[cv2.DMatch]:
+        """Nearest-neighbour matches from query to ref that pass Lowe's ratio test."""
         if des_query is None or des_ref is None:
-            return 0.0
+            return []
         if des_query.shape[0] < 2 or des_ref.shape[0] < 2:
-            return 0.0
+            return []
         try:
             pairs = self.matcher.knnMatch(des_query, des_ref, k=2)
         except cv2.error:
+            return []
+        return [p[0] for p in pairs if len(p) == 2 and p[0].distance < self.ratio_threshold * p[1].distance]
+
+    def _confidence(self, des_query: np.ndarray, des_ref: np.ndarray) -> float:
+        """
+        Compute match confidence in [0, 1] using ORB descriptor matching with ratio test.
+        """
+        if des_query is None or des_ref is None:
             return 0.0
-        good = sum(1 for p in pairs if len(p) == 2 and p[0].distance < RATIO_THRESHOLD * p[1].distance)
+        good = len(self._good_matches(des_query, des_ref))
         denom = min(des_query.shape[0], des_ref.shape[0])
         if denom == 0:
             return 0.0
         raw = good / denom
-        return min(1.0, raw * CONFIDENCE_SCALE)
+        return min(1.0, raw * self.confidence_scale)
+
+    def _inliers(self, pts_query: np.ndarray, des_query: np.ndarray, name: str) -> int:
+        """
+        Count correspondences between the query and ref `name` that agree with a single
+        RANSAC-estimated similarity transform (rotation + uniform scale + translation).
+        """
+        good = self._good_matches(des_query, self._descriptors[name])
+        if len(good) < 3:
+            return 0
+        src = pts_query[[m.queryIdx for m in good]]
+        dst = self._keypoints[name][[m.trainIdx for m in good]]
+        try:
+            _, mask = cv2.estimateAffinePartial2D(
+                src, dst, method=cv2.RANSAC, ransacReprojThreshold=RANSAC_REPROJ_THRESHOLD
+            )
+        except cv2.error:
+            return 0
+        return int(mask.sum()) if mask is not None else 0
 
-    def match_character(self, token_image: np.ndarray) -> Optional[Tuple[str, str, float]]:
+    def _verify_top(
+        self, pts_query: np.ndarray, des_query: np.ndarray, scored: List[Tuple[str, float]]
+    ) -> Tuple[str, float]:
+        """
+        Re-rank the top VERIFY_TOP_K (name, score) candidates by RANSAC inlier count.
+        Falls back to the ratio-test winner when no candidate reaches MIN_INLIERS.
+        The returned confidence stays the ratio-test score of the chosen candidate.
+        """
+        top = sorted(scored, key=lambda x: x[1], reverse=True)[:VERIFY_TOP_K]
+        best = top[0]
+        best_inliers = MIN_INLIERS - 1
+        for name, score in top:
+            inliers = self._inliers(pts_query, des_query, name)
+            if inliers > best_inliers:
+                best, best_inliers = (name, score), inliers
+        return best
+
+    def match_character(
+        self,
+        token_image: np.ndarray,
+        script_roles: Optional[AbstractSet[str]] = None,
+        exclude_roles: Optional[AbstractSet[str]] = None,
+    ) -> Optional[Tuple[str, str, float]]:
         """
         Find the best-matching character for a single token image.
 
+        Args:
+            script_roles: Role ids of the game's script; those refs are scored first.
+            exclude_roles: Role ids already assigned elsewhere in the grimoire; never returned.
+
         Returns:
             (character_name, character_type, confidence) or None if no refs or no features.
         """
         gray = self._preprocess(token_image)
-        _, des_q = self.orb.detectAndCompute(gray, None)
+        kps_q, des_q = self.orb.detectAndCompute(gray, None)
         if des_q is None or len(des_q) < 2:
             return None
         if not self._descriptors:
             return None
 
-        best_name: Optional[str] = None
-        best_type: Optional[str] = None
-        best_score = 0.0
+        scored: List[Tuple[str, float]] = []
+        best = runner_up = 0.0
+        best_name = None
+        order = self._candidate_order(kps_q, des_q, script_roles, exclude_roles)
+        for visited, name in enumerate(order, 1):
+            score = self._confidence(des_q, self._descriptors[name])
+            if score > 0.0:
+                scored.append((name, score))
+            if score > best:
+                best, runner_up, best_name = score, best, name
+            elif score > runner_up:
+                runner_up = score
+            if (
+                self.early_exit
+                and visited >= EARLY_EXIT_MIN_REFS
+                and best >= self.early_exit_score
+                and best - runner_up >= self.early_exit_margin
+            ):
+                # Alive and dead refs of the leading role differ only in the shroud; score
+                # the variant not yet visited so is_dead is decided between the two
+                lead = role_id(best_name)
+                for other in order[visited:]:
+                    if role_id(other) == lead:
+                        score = self._confidence(des_q, self._descriptors[other])
+                        if score > 0.0:
+                            scored.append((other, score))
+                break
+        if not scored:
+            return None
 
-        for name, des_ref in self._descriptors.items():
-            score = self._confidence(des_q, des_ref)
-            if score > best_score:
-                best_score = score
-                best_name = name
-                best_type = get_character_type(name)
+        if self.verify_geometry:
+            best_name, best_score = self._verify_top(_keypoint_coords(kps_q), des_q, scored)
+        else:
+            best_name, best_score = max(scored, key=lambda x: x[1])
+        return (best_name, get_character_type(best_name), best_score)
 
-        if best_name is None:
+    def match_roles(
+        self, token_image: np.ndarray, roles: AbstractSet[str]
+    ) -> Optional[Tuple[str, str, float]]:
+        """
+        Best match among refs whose role id is in roles (alive and dead variants), e.g. to
+        re-check a seat whose character is already known. Scores a handful of refs instead of all.
+
+        Returns:
+            (character_name, character_type, confidence) or None if no candidate scores.
+        """
+        gray = self._preprocess(token_image)
+        _, des_q = self.orb.detectAndCompute(gray, None)
+        if des_q is None or len(des_q) < 2:
+            return None
+        scored = [
+            (name, self._confidence(des_q, des_ref))
+            for name, des_ref in self._descriptors.items()
+            if role_id(name) in roles
+        ]
+        scored = [s for s in scored if s[1] > 0.0]
+        if not scored:
             return None
-        return (best_name, best_type, best_score)
+        best_name, best_score = max(scored, key=lambda x: x[1])
+        return (best_name, get_character_type(best_name), best_score)
 
     def match_all_characters(
         self, token_image: np.ndarray, top_n: int = 1
@@ -117,3 +304,8 @@ class ORBMatcher:
         ]
         results.sort(key=lambda x: x[2], reverse=True)
         return results[:top_n]
+
+
+def _keypoint_coords(keypoints) -> np.ndarray:
+    """(x, y) coordinates of cv2.KeyPoints as an N x 2 float32 array."""
+    return np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
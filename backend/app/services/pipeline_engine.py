@@ -0,0 +1,375 @@
+"""
+Small stage-graph engine. A pipeline is a list of stages, each declaring the named values
+it reads and writes; the engine orders them by those names, runs stages whose inputs are
+ready concurrently, and emits one uniform StageRecord per stage (timing, cache hit, error,
+optional detail) to whoever runs it: an endpoint, the debug trace or a batch tool.
+
+Stages must be deterministic functions of their inputs (services they use are bound into
+the stage and covered by its version). That makes every value addressable by a digest:
+inputs are content-hashed, and a stage's outputs get a digest derived from the stage,
+its version and its input digests, without hashing the outputs themselves. Stages marked
+memoize store their outputs in a StageCache under that key; on a hit the stage does not
+run, and stages that only fed it are skipped too. A run can also start part-way: a stage
+whose outputs are all given as inputs (e.g. an already decoded image) is skipped the same way.
+
+A run can be given a CancelToken: it is checked before each stage starts, and stages
+marked cancellable also receive it (as the keyword argument cancel) to check between
+units of work. A cancelled run raises ScanCancelled rather than StageError.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.services.cancellation import CancelToken, ScanCancelled
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One pipeline stage. fn is called with the stage's inputs as keyword arguments and
+    returns a dict holding every name in outputs. version is part of the cache key: change
+    it when the stage's behaviour or the services bound into it change.
+    """
+    name: str
+    fn: Callable[..., Dict[str, Any]]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    version: str = "1"
+    memoize: bool = False
+    # JSON-able summary of the stage's outputs for traced runs (called with all values so far)
+    describe: Optional[Callable[[Dict[str, Any]], Any]] = None
+    # fn also takes cancel=<CancelToken or None> (not an input: it is not part of the cache key)
+    cancellable: bool = False
+
+
+@dataclass
+class StageRecord:
+    """Trace record of one stage in one run; start_ms is relative to the start of the run."""
+    stage: str
+    ok: bool
+    cached: bool
+    start_ms: float
+    duration_ms: float
+    detail: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "stage": self.stage,
+            "ok": self.ok,
+            "cached": self.cached,
+            "startMs": round(self.start_ms, 2),
+            "durationMs": round(self.duration_ms, 2),
+        }
+        if self.detail is not None:
+            out["detail"] = self.detail
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class StageError(Exception):
+    """A stage raised; cause holds the original exception, records the run so far."""
+
+    def __init__(self, stage: str, cause: BaseException, records: List[StageRecord]):
+        super().__init__(f"Stage {stage} failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+        self.records = records
+
+
+@dataclass
+class PipelineRun:
+    """Values produced (or provided) in a run, and one record per stage in completion order."""
+    values: Dict[str, Any]
+    records: List[StageRecord] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+
+class StageCache:
+    """Thread-safe LRU of memoized stage outputs by stage key."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            outputs = self._entries.get(key)
+            if outputs is not None:
+                self._entries.move_to_end(key)
+            return outputs
+
+    def put(self, key: bytes, outputs: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = outputs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _update_digest(h: "hashlib._Hash", value: Any) -> bool:
+    """Feed value into h; False when it has no stable content representation."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        h.update(f"{type(value).__name__}:{value!r};".encode("utf-8"))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        h.update(b"bytes:")
+        h.update(value)
+    elif isinstance(value, np.ndarray):
+        h.update(f"ndarray:{value.dtype}:{value.shape}:".encode("utf-8"))
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, BaseModel):
+        h.update(b"model:" + value.model_dump_json().encode("utf-8"))
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq:{len(value)}[".encode("utf-8"))
+        if not all(_update_digest(h, item) for item in value):
+            return False
+        h.update(b"]")
+    elif isinstance(value, (set, frozenset)):
+        return _update_digest(h, sorted(value, key=repr))
+    elif isinstance(value, dict):
+        h.update(f"map:{len(value)}{{".encode("utf-8"))
+        for k in sorted(value, key=repr):
+            if not (_update_digest(h, k) and _update_digest(h, value[k])):
+                return False
+        h.update(b"}")
+    else:
+        return False
+    return True
+
+
+def content_digest(value: Any) -> Optional[bytes]:
+    """Digest of a value's content (arrays, bytes, models, containers of those), or None."""
+    h = hashlib.blake2b(digest_size=16)
+    return h.digest() if _update_digest(h, value) else None
+
+
+def _derive(*parts: bytes) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(len(part).to_bytes(4, "little"))
+        h.update(part)
+    return h.digest()
+
+
+class PipelineEngine:
+    """Runs a fixed graph of stages; see the module docstring."""
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        cache: Optional[StageCache] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self.stages = list(stages)
+        self.cache = cache
+        self.executor = executor
+        self._producer: Dict[str, Stage] = {}
+        for stage in self.stages:
+            for name in stage.outputs:
+                if name in self._producer:
+                    raise ValueError(f"{name} is produced by both {self._producer[name].name} and {stage.name}")
+                self._producer[name] = stage
+        self._order = self._topological_order()
+
+    def _topological_order(self) -> List[Stage]:
+        order: List[Stage] = []
+        state: Dict[str, int] = {}
+
+        def visit(stage: Stage) -> None:
+            if state.get(stage.name) == 2:
+                return
+            if state.get(stage.name) == 1:
+                raise ValueError(f"Stage graph has a cycle through {stage.name}")
+            state[stage.name] = 1
+            for name in stage.inputs:
+                if name in self._producer:
+                    visit(self._producer[name])
+            state[stage.name] = 2
+            order.append(stage)
+
+        for stage in self.stages:
+            visit(stage)
+        return order
+
+    @property
+    def terminal_outputs(self) -> List[str]:
+        """Values no stage consumes: the default targets of a run."""
+        consumed = {name for stage in self.stages for name in stage.inputs}
+        return [name for stage in self.stages for name in stage.outputs if name not in consumed]
+
+    def run(
+        self,
+        inputs: Dict[str, Any],
+        targets: Optional[Iterable[str]] = None,
+        trace: bool = False,
+        sink: Optional[Callable[[StageRecord], None]] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> PipelineRun:
+        """
+        Compute targets (default: terminal_outputs) from inputs, running only the stages
+        they need. With trace, records carry each stage's describe() detail. sink is
+        called with every record as its stage finishes. Raises StageError when a stage
+        fails (stages already running are allowed to finish first), and ScanCancelled
+        when cancel is cancelled (the stage it names is where the run stopped).
+        """
+        run_start = time.perf_counter()
+        targets = list(targets) if targets is not None else self.terminal_outputs
+        values: Dict[str, Any] = dict(inputs)
+        records: List[StageRecord] = []
+
+        def emit(record: StageRecord) -> None:
+            records.append(record)
+            if sink is not None:
+                sink(record)
+
+        keys, hits = self._lookup(inputs)
+
+        # Walk back from the targets; given values and cache hits need no inputs of their own
+        needed_values: Set[str] = set(targets)
+        to_run: List[Stage] = []
+        from_cache: List[Stage] = []
+        for stage in reversed(self._order):
+            if not needed_values.intersection(stage.outputs) or self._given(stage, inputs):
+                continue
+            if stage.name in hits:
+                from_cache.append(stage)
+                continue
+            to_run.append(stage)
+            needed_values.update(stage.inputs)
+        missing = [name for name in needed_values if name not in values and name not in self._producer]
+        if missing:
+            raise ValueError(f"Missing pipeline inputs: {', '.join(sorted(missing))}")
+
+        for stage in reversed(from_cache):
+            values.update(hits[stage.name])
+            detail = stage.describe(values) if trace and stage.describe else None
+            emit(StageRecord(stage.name, True, True, (time.perf_counter() - run_start) * 1000, 0.0, detail))
+
+        self._execute(list(reversed(to_run)), values, keys, run_start, trace, records, emit, cancel)
+        return PipelineRun(values=values, records=records, elapsed_ms=(time.perf_counter() - run_start) * 1000)
+
+    @staticmethod
+    def _given(stage: Stage, inputs: Dict[str, Any]) -> bool:
+        return all(name in inputs for name in stage.outputs)
+
+    def _lookup(self, inputs: Dict[str, Any]) -> Tuple[Dict[str, Optional[bytes]], Dict[str, Dict[str, Any]]]:
+        """Stage keys for these inputs (None where not addressable) and memoized outputs by stage."""
+        keys: Dict[str, Optional[bytes]] = {}
+        hits: Dict[str, Dict[str, Any]] = {}
+        if self.cache is None or not any(stage.memoize for stage in self.stages):
+            return keys, hits
+        digests: Dict[str, Optional[bytes]] = {}
+
+        def digest(name: str) -> Optional[bytes]:
+            if name not in digests:
+                digests[name] = content_digest(inputs[name]) if name in inputs else None
+            return digests[name]
+
+        for stage in self._order:
+            if self._given(stage, inputs):
+                continue
+            input_digests = [digest(name) for name in stage.inputs]
+            key = None
+            if all(d is not None for d in input_digests):
+                key = _derive(stage.name.encode("utf-8"), stage.version.encode("utf-8"), *input_digests)
+            keys[stage.name] = key
+            for name in stage.outputs:
+                digests[name] = _derive(key, name.encode("utf-8")) if key is not None else None
+            if stage.memoize and key is not None:
+                outputs = self.cache.get(key)
+                if outputs is not None:
+                    hits[stage.name] = outputs
+        return keys, hits
+
+    def _run_stage(
+        self, stage: Stage, values: Dict[str, Any], cancel: Optional[CancelToken] = None
+    ) -> Tuple[Dict[str, Any], float, float]:
+        if cancel is not None:
+            cancel.check(stage.name)
+        start = time.perf_counter()
+        kwargs = {name: values[name] for name in stage.inputs}
+        if stage.cancellable:
+            kwargs["cancel"] = cancel
+        outputs = stage.fn(**kwargs)
+        missing = [name for name in stage.outputs if name not in outputs]
+        if missing:
+            raise ValueError(f"Stage {stage.name} did not produce {', '.join(missing)}")
+        return outputs, start, time.perf_counter()
+
+    def _execute(
+        self,
+        stages: List[Stage],
+        values: Dict[str, Any],
+        keys: Dict[str, Optional[bytes]],
+        run_start: float,
+        trace: bool,
+        records: List[StageRecord],
+        emit: Callable[[StageRecord], None],
+        cancel: Optional[CancelToken] = None,
+    ) -> None:
+        pending = list(stages)
+        running: Dict[Future, Stage] = {}
+        failure: Optional[Tuple[Stage, BaseException]] = None
+
+        def finish(stage: Stage, outputs: Dict[str, Any], start: float, end: float) -> None:
+            values.update({name: outputs[name] for name in stage.outputs})
+            key = keys.get(stage.name)
+            if stage.memoize and key is not None and self.cache is not None:
+                self.cache.put(key, {name: outputs[name] for name in stage.outputs})
+            detail = stage.describe(values) if trace and stage.describe else None
+            emit(StageRecord(stage.name, True, False, (start - run_start) * 1000, (end - start) * 1000, detail))
+
+        def fail(stage: Stage, error: BaseException) -> None:
+            nonlocal failure
+            now = (time.perf_counter() - run_start) * 1000
+            emit(StageRecord(stage.name, False, False, now, 0.0, error=f"{type(error).__name__}: {error}"))
+            if failure is None:
+                failure = (stage, error)
+
+        while True:
+            ready = []
+            if failure is None:
+                ready = [s for s in pending if all(name in values for name in s.inputs)]
+                for stage in ready:
+                    pending.remove(stage)
+            if not ready and not running:
+                break
+            # Without an executor, or for a lone ready stage, run on this thread (no hand-off)
+            if ready and (self.executor is None or (len(ready) == 1 and not running)):
+                for stage in ready:
+                    try:
+                        finish(stage, *self._run_stage(stage, values, cancel))
+                    except Exception as e:
+                        fail(stage, e)
+                        break
+                continue
+            for stage in ready:
+                # Stages get a snapshot; only this thread writes to values
+                running[self.executor.submit(self._run_stage, stage, dict(values), cancel)] = stage
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    finish(stage, *future.result())
+                except Exception as e:
+                    fail(stage, e)
+
+        if failure is not None:
+            stage, error = failure
+            if isinstance(error, ScanCancelled):
+                error.stage = error.stage or stage.name
+                raise error
+            raise StageError(stage.name, error, records) from error
@@ -0,0 +1,190 @@
+"""
+Pipeline parameters: the detector, matcher and OCR knobs of one scan configuration, and
+named sets of them (profiles). The service ships fast / balanced / accurate profiles
+(balanced is the long-standing configuration); a profiles file, e.g. exported by
+app.tools.sweep from measurements on a labelled set, overrides or adds to them. Each
+profile's services are built once (ProfileServices) and selected per request.
+
+Profiles file: {"<name>": {"min_radius": 50, "nfeatures": 500, ...}, ...}. Keys left out
+of a profile keep the defaults below.
+"""
+import json
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Dict, Tuple
+
+from app.services.circle_detector import CircleDetector
+from app.services.orb_matcher import (
+    CONFIDENCE_SCALE,
+    EARLY_EXIT,
+    EARLY_EXIT_MARGIN,
+    EARLY_EXIT_SCORE,
+    MATCH_SIZE,
+    RATIO_THRESHOLD,
+    ORBMatcher,
+)
+from app.services.player_name_extractor import MAX_OCR_SCALE, TARGET_TEXT_HEIGHT, PlayerNameExtractor
+
+
+@dataclass(frozen=True)
+class PipelineParams:
+    """One scan configuration. detection_scale caps the memory-planned working resolution."""
+    # Circle detection
+    min_radius: int = 50
+    blur_sigma: float = 4.5
+    hough_param1: float = 50.0
+    hough_param2: float = 30.0
+    detection_scale: float = 1.0
+    # ORB matching
+    nfeatures: int = 500
+    match_size: int = MATCH_SIZE[0]
+    ratio_threshold: float = RATIO_THRESHOLD
+    confidence_scale: float = CONFIDENCE_SCALE
+    # Matching cascade: with early_exit, stop scanning refs once a candidate is this
+    # decisive, then optionally re-rank the top candidates geometrically
+    early_exit: bool = EARLY_EXIT
+    early_exit_score: float = EARLY_EXIT_SCORE
+    early_exit_margin: float = EARLY_EXIT_MARGIN
+    verify_geometry: bool = False
+    # Name OCR preprocessing
+    target_text_height: int = TARGET_TEXT_HEIGHT
+    max_ocr_scale: float = MAX_OCR_SCALE
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PipelineParams":
+        """Params from a profile dict; raises ValueError on unknown keys or bad values."""
+        known = {f.name: f.type for f in fields(cls)}
+        unknown = set(data) - set(known)
+        if unknown:
+            raise ValueError(f"Unknown pipeline parameter(s): {', '.join(sorted(unknown))}")
+        values = {}
+        for name, value in data.items():
+            try:
+                if known[name] is bool:
+                    if value not in (True, False, 0, 1):
+                        raise ValueError
+                    values[name] = bool(value)
+                else:
+                    values[name] = (int if known[name] is int else float)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {name}: {value!r}")
+        params = cls(**values)
+        if not 0 < params.detection_scale <= 1:
+            raise ValueError("detection_scale must be in (0, 1]")
+        return params
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def match_size_tuple(self) -> Tuple[int, int]:
+        return (self.match_size, self.match_size)
+
+    def build_circle_detector(self) -> CircleDetector:
+        return CircleDetector(
+            min_radius=self.min_radius,
+            blur_sigma=self.blur_sigma,
+            param1=self.hough_param1,
+            param2=self.hough_param2,
+        )
+
+    def build_orb_matcher(self, ref_images_dir: Path) -> ORBMatcher:
+        return ORBMatcher(
+            ref_images_dir,
+            nfeatures=self.nfeatures,
+            match_size=self.match_size_tuple(),
+            verify_geometry=self.verify_geometry,
+            early_exit=self.early_exit,
+            ratio_threshold=self.ratio_threshold,
+            confidence_scale=self.confidence_scale,
+            early_exit_score=self.early_exit_score,
+            early_exit_margin=self.early_exit_margin,
+        )
+
+    def build_name_extractor(self) -> PlayerNameExtractor:
+        return PlayerNameExtractor(target_text_height=self.target_text_height, max_ocr_scale=self.max_ocr_scale)
+
+    def matcher_version(self) -> str:
+        """ORB settings as a string, for the match stage's cache key."""
+        return ":".join(
+            str(v)
+            for v in (
+                self.nfeatures,
+                self.match_size,
+                self.ratio_threshold,
+                self.confidence_scale,
+                int(self.early_exit),
+                self.early_exit_score,
+                self.early_exit_margin,
+                int(self.verify_geometry),
+            )
+        )
+
+
+DEFAULT_PROFILE = "balanced"
+
+# Built-in profiles. fast: half-resolution detection, fewer / smaller features, an earlier
+# exit and lighter OCR upscaling, for previews. accurate: more features, a stricter exit
+# and geometric verification, for final imports.
+BUILTIN_PROFILES: Dict[str, PipelineParams] = {
+    "fast": PipelineParams(
+        detection_scale=0.5,
+        nfeatures=300,
+        match_size=160,
+        early_exit_score=0.5,
+        early_exit_margin=0.15,
+        max_ocr_scale=2.0,
+    ),
+    DEFAULT_PROFILE: PipelineParams(),
+    "accurate": PipelineParams(
+        nfeatures=800,
+        early_exit_score=0.8,
+        early_exit_margin=0.35,
+        verify_geometry=True,
+    ),
+}
+
+
+@dataclass
+class ProfileServices:
+    """The detector, ORB matcher and name extractor of one profile, built once."""
+    name: str
+    params: PipelineParams
+    circle_detector: CircleDetector
+    orb_matcher: ORBMatcher
+    player_name_extractor: PlayerNameExtractor
+
+    @classmethod
+    def build(cls, name: str, params: PipelineParams, ref_images_dir: Path) -> "ProfileServices":
+        return cls(
+            name=name,
+            params=params,
+            circle_detector=params.build_circle_detector(),
+            orb_matcher=params.build_orb_matcher(ref_images_dir),
+            player_name_extractor=params.build_name_extractor(),
+        )
+
+
+def load_profiles(path: Path) -> Dict[str, PipelineParams]:
+    """Named profiles from a profiles file ({} when it does not exist)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected an object of named profiles")
+    return {name: PipelineParams.from_dict(values) for name, values in data.items()}
+
+
+def resolve_profiles(path: Path) -> Dict[str, PipelineParams]:
+    """Built-in profiles, overridden or extended by the profiles file at path (if any)."""
+    profiles = dict(BUILTIN_PROFILES)
+    profiles.update(load_profiles(path))
+    return profiles
+
+
+def save_profiles(path: Path, profiles: Dict[str, PipelineParams]) -> None:
+    """Write profiles to path, keeping profiles already in the file that are not replaced."""
+    path = Path(path)
+    data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    data.update({name: params.to_dict() for name, params in profiles.items()})
+    path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
@@ -1,8 +1,18 @@
+import hashlib
 import logging
+import shlex
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
 import cv2
 import numpy as np
 import pytesseract
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence
+
+from app.services.cancellation import DEADLINE, CancelToken, ScanCancelled
+from app.utils.image_utils import ensure_grayscale
+from app.utils.roster import snap_to_roster
 
 logger = logging.getLogger(__name__)
 
@@ -10,17 +20,66 @@ logger = logging.getLogger(__name__)
 # No whitelist: a space inside -c value would split the shell arg and silently break the config
 _TESS_CONFIG = "--psm 7 --oem 3"
 
+# Text height (px) Tesseract reads reliably; regions are scaled so names land near it
+TARGET_TEXT_HEIGHT = 32
+
+# Upscale bounds for the adaptive OCR scale
+MIN_OCR_SCALE = 1.0
+MAX_OCR_SCALE = 4.0
+
+# A pixel counts as ink when it differs from the region's median grey level by this much
+INK_CONTRAST = 60
+
+# Regions with less ink than this fraction are empty seats (no name label); OCR is skipped
+MIN_INK_FRACTION = 0.02
+
+# Rows with more ink than this fraction are label borders / edges, not text
+MAX_TEXT_ROW_INK = 0.6
+
+# Rows with less ink than this fraction are background (stray noise pixels), not text
+MIN_TEXT_ROW_INK = 0.03
+
+# Text rows separated by at most this many blank rows (e.g. the dot of an i) are one line
+TEXT_ROW_GAP = 2
+
+# Name label box below each token, in image pixels: centre offset below the token centre,
+# width and height (the detector and these offsets assume full-resolution captures)
+NAME_REGION_OFFSET_Y = 89
+NAME_REGION_WIDTH = 180
+NAME_REGION_HEIGHT = 38
+
+# Grid for the name-region difference hash (width x height gradients -> 256 bits), used
+# by rescans to spot unchanged labels; too coarse to tell short names apart for OCR
+REGION_HASH_SIZE = (32, 8)
+
 
 class PlayerNameExtractor:
-    """Service for extracting player names using Tesseract OCR from regions below tokens."""
+    """
+    Service for extracting player names using Tesseract OCR from regions below tokens.
+
+    Raw OCR results are cached by a digest of the binarized region Tesseract would read,
+    so a label that binarizes to the same pixels as one read before skips Tesseract. When a roster is given, OCR output is snapped to the closest known name.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 1024,
+        target_text_height: int = TARGET_TEXT_HEIGHT,
+        max_ocr_scale: float = MAX_OCR_SCALE,
+    ):
+        self.cache_size = cache_size
+        self.target_text_height = target_text_height
+        self.max_ocr_scale = max_ocr_scale
+        self._ocr_cache: "OrderedDict[bytes, Optional[str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def extract_player_name_region(
         self,
         image: np.ndarray,
         circle_center: tuple,
-        offset_y: int = 89,
-        box_width: int = 180,
-        box_height: int = 38,
+        offset_y: int = NAME_REGION_OFFSET_Y,
+        box_width: int = NAME_REGION_WIDTH,
+        box_height: int = NAME_REGION_HEIGHT,
     ) -> np.ndarray:
         """
         Extract the region below a token where the player name appears.
@@ -43,24 +102,54 @@ class PlayerNameExtractor:
 
         return image[red_box_y1:red_box_y2, red_box_x1:red_box_x2]
 
-    def _preprocess_for_ocr(self, region: np.ndarray) -> np.ndarray:
+    def _ink_mask(self, gray: np.ndarray) -> np.ndarray:
+        """Boolean mask of pixels that stand out from the region's background (median) level."""
+        median = np.median(gray)
+        return np.abs(gray.astype(np.int16) - median) > INK_CONTRAST
+
+    def is_empty_region(self, region: np.ndarray) -> bool:
+        """
+        True when a name region holds no text (e.g. bluff tokens, which have no name label),
+        so the OCR call can be skipped entirely.
+        """
+        if region.size == 0:
+            return True
+        ink = self._ink_mask(ensure_grayscale(region))
+        return float(ink.mean()) < MIN_INK_FRACTION
+
+    def _ocr_scale(self, gray: np.ndarray) -> float:
+        """
+        Scale factor that brings the measured text height to target_text_height.
+        Text height = the tallest run of text rows (at least MIN_TEXT_ROW_INK ink, not
+        border-like), bridging gaps of up to TEXT_ROW_GAP rows, so a stray noise row away
+        from the name does not stretch it.
+        """
+        row_ink = self._ink_mask(gray).mean(axis=1)
+        text_rows = np.flatnonzero((row_ink >= MIN_TEXT_ROW_INK) & (row_ink < MAX_TEXT_ROW_INK))
+        if text_rows.size == 0:
+            return self.max_ocr_scale
+        # Split into runs where consecutive text rows are more than TEXT_ROW_GAP apart
+        breaks = np.flatnonzero(np.diff(text_rows) > TEXT_ROW_GAP + 1)
+        starts = np.concatenate(([text_rows[0]], text_rows[breaks + 1]))
+        ends = np.concatenate((text_rows[breaks], [text_rows[-1]]))
+        text_height = int((ends - starts).max()) + 1
+        return float(np.clip(self.target_text_height / text_height, MIN_OCR_SCALE, self.max_ocr_scale))
+
+    def preprocess_for_ocr(self, region: np.ndarray) -> np.ndarray:
         """
         Preprocess a name region to maximise Tesseract accuracy.
 
         Pipeline:
-          1. Upscale 3x so Tesseract has enough pixel density.
-          2. Convert to greyscale.
-          3. Denoise with a bilateral filter (preserves edges / letter shapes).
+          1. Convert to greyscale (before scaling, so later steps touch one channel).
+          2. Scale so the measured text height is ~target_text_height px.
+          3. Denoise with a 3x3 median filter (edge preserving, far cheaper than bilateral).
           4. Otsu threshold -> clean black-on-white binary image.
         """
-        scaled = cv2.resize(region, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
-
-        if len(scaled.shape) == 3:
-            gray = cv2.cvtColor(scaled, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = scaled
+        gray = ensure_grayscale(region)
+        scale = self._ocr_scale(gray)
+        scaled = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
 
-        denoised = cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
+        denoised = cv2.medianBlur(scaled, 3)
 
         _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
@@ -71,31 +160,99 @@ class PlayerNameExtractor:
 
         return binary
 
-    def extract_name_from_region(self, region: np.ndarray) -> Optional[str]:
+    def run_tesseract(self, image: np.ndarray, cancel: Optional[CancelToken] = None) -> str:
+        """
+        OCR one preprocessed image. Without cancel, pytesseract runs it. With cancel, a
+        Tesseract subprocess is fed through stdin/stdout (no temp files) and killed as soon
+        as the token is cancelled or its deadline passes, and ScanCancelled is raised.
+        """
+        if cancel is None:
+            return pytesseract.image_to_string(image, config=_TESS_CONFIG)
+        ok, buf = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Couldn't encode the name region")
+        cmd = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout", *shlex.split(_TESS_CONFIG)]
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise pytesseract.TesseractNotFoundError()
+        cancel.register_process(proc)
+        try:
+            out, err = proc.communicate(buf.tobytes(), timeout=cancel.remaining())
+        except subprocess.TimeoutExpired:
+            # Deadline reached mid-OCR: cancelling kills the process; reap it
+            cancel.cancel(DEADLINE)
+            out, err = proc.communicate()
+        finally:
+            cancel.unregister_process(proc)
+        cancel.check("names")
+        if proc.returncode:
+            raise pytesseract.TesseractError(proc.returncode, err.decode("utf-8", "replace").strip())
+        return out.decode("utf-8", "replace")
+
+    def _cached_ocr(self, region: np.ndarray, cancel: Optional[CancelToken] = None) -> Optional[str]:
+        """
+        Raw OCR text for a non-empty region, served from the cache when possible. The key
+        is a digest of the preprocessed image at OCR resolution: a perceptual hash of the
+        raw region lets near-identical short names ("Eli", "Ell") share an entry.
+        """
+        processed = self.preprocess_for_ocr(region)
+        key = hashlib.blake2b(
+            processed.tobytes() + repr(processed.shape).encode("ascii"), digest_size=16
+        ).digest()
+        with self._cache_lock:
+            if key in self._ocr_cache:
+                self._ocr_cache.move_to_end(key)
+                return self._ocr_cache[key]
+        raw = self.run_tesseract(processed, cancel)
+        name = raw.strip() or None
+        with self._cache_lock:
+            self._ocr_cache[key] = name
+            if len(self._ocr_cache) > self.cache_size:
+                self._ocr_cache.popitem(last=False)
+        return name
+
+    def extract_name_from_region(
+        self,
+        region: np.ndarray,
+        roster: Optional[Sequence[str]] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Optional[str]:
         """
         Extract player name text from a region using Tesseract OCR.
         Args:
             region: Image region containing player name
+            roster: Known player names; OCR output is snapped to the closest one
+            cancel: Scan's cancel token; raises ScanCancelled instead of returning once cancelled
         Returns:
             Extracted player name text or None if not found
         """
         try:
-            processed = self._preprocess_for_ocr(region)
-            raw = pytesseract.image_to_string(processed, config=_TESS_CONFIG)
-            name = raw.strip()
-            return name if name else None
+            if cancel is not None:
+                cancel.check("names")
+            if self.is_empty_region(region):
+                return None
+            return snap_to_roster(self._cached_ocr(region, cancel), roster or [])
+        except ScanCancelled:
+            raise
         except Exception as e:
             logger.error("OCR extraction failed: %s", e)
             return None
 
     def extract_names_for_circles(
-        self, image: np.ndarray, circles: list
+        self,
+        image: np.ndarray,
+        circles: list,
+        roster: Optional[Sequence[str]] = None,
+        cancel: Optional[CancelToken] = None,
     ) -> Dict[int, str]:
         """
         Extract player names for multiple circles.
         Args:
             image: Full image
             circles: List of (x, y, radius) tuples
+            roster: Known player names to snap OCR output to
+            cancel: Scan's cancel token, checked before each circle
         Returns:
             Dictionary mapping circle index to player name
         """
@@ -103,8 +260,34 @@ class PlayerNameExtractor:
 
         for idx, (x, y, r) in enumerate(circles):
             name_region = self.extract_player_name_region(image, (x, y))
-            player_name = self.extract_name_from_region(name_region)
+            player_name = self.extract_name_from_region(name_region, roster, cancel)
             if player_name:
                 player_names[idx] = player_name
 
         return player_names
+
+    def submit_names_for_circles(
+        self,
+        executor: Executor,
+        image: np.ndarray,
+        circles: list,
+        roster: Optional[Sequence[str]] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Dict[int, "Future[Optional[str]]"]:
+        """
+        Submit OCR for each circle's name region to executor without waiting.
+        Each Tesseract call runs in its own subprocess, so a thread pool overlaps them
+        with each other and with work on the calling thread. Once cancel is cancelled,
+        queued seats raise ScanCancelled without OCR and running ones are killed.
+        Returns:
+            Dictionary mapping circle index to a future of the player name (or None)
+        """
+        return {
+            idx: executor.submit(
+                self.extract_name_from_region,
+                self.extract_player_name_region(image, (x, y)),
+                roster,
+                cancel,
+            )
+            for idx, (x, y, r) in enumerate(circles)
+        }
@@ -0,0 +1,105 @@
+"""
+Rematch stored scans after the reference library changes. Scans keep each seat's token
+crop, so only the matching stage is re-run: no image decode, circle detection or OCR.
+Each scan records the reference pack version it was matched with; scans from an older
+pack are the ones a rematch job needs to visit.
+"""
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AbstractSet, List, Optional
+
+from app.models.schemas import ParsedToken, ScanDocument
+from app.services.grimoire_pipeline import parsed_tokens_to_town_square
+from app.services.match_tokens import TokenMatcher, match_token_images
+from app.utils.image_utils import decode_token_crop
+
+
+def ref_pack_version(ref_images_dir: Path) -> str:
+    """Short content hash of the reference library (file names and bytes of every PNG)."""
+    digest = hashlib.sha1()
+    for path in sorted(Path(ref_images_dir).glob("*.png")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(hashlib.sha1(path.read_bytes()).digest())
+    return digest.hexdigest()[:12]
+
+
+@dataclass
+class SeatRematch:
+    """A seat whose character or dead state differs after rematching."""
+    token: int
+    player_name: Optional[str]
+    before: Optional[str]
+    after: Optional[str]
+    before_dead: Optional[bool]
+    after_dead: Optional[bool]
+
+
+@dataclass
+class RematchResult:
+    """Updated scan (not yet stored) and what changed."""
+    scan: ScanDocument
+    changes: List[SeatRematch]
+    # Seats stored without a crop keep their previous result
+    skipped_seats: List[int]
+
+
+def rematch_scan(
+    scan: ScanDocument,
+    matcher: TokenMatcher,
+    ref_pack_version: str,
+    script_roles: Optional[AbstractSet[str]] = None,
+) -> RematchResult:
+    """
+    Re-run character matching on a scan's stored crops, in seat order (so role
+    uniqueness behaves as in the original scan). matcher should be the one the scan was
+    made with (scan.matcher under scan.profile). Player names are kept as scanned.
+    """
+    crops = {seat.token: decode_token_crop(seat.crop) if seat.crop else None for seat in scan.seats}
+    skipped = [token for token, crop in crops.items() if crop is None]
+    matches = {
+        m.token: m
+        for m in match_token_images(
+            ((token, crop) for token, crop in crops.items() if crop is not None),
+            matcher,
+            script_roles=script_roles,
+        )
+    }
+
+    seats = []
+    changes: List[SeatRematch] = []
+    for seat in scan.seats:
+        m = matches.get(seat.token)
+        if m is None:
+            seats.append(seat)
+            continue
+        old = seat.parsed
+        parsed = ParsedToken(
+            token=old.token,
+            player_name=old.player_name,
+            character=m.character,
+            character_type=m.character_type,
+            confidence=m.confidence,
+            is_dead=m.is_dead,
+        )
+        if (old.character or "").lower() != (m.character or "").lower() or old.is_dead != m.is_dead:
+            changes.append(
+                SeatRematch(
+                    token=seat.token,
+                    player_name=old.player_name,
+                    before=old.character,
+                    after=m.character,
+                    before_dead=old.is_dead,
+                    after_dead=m.is_dead,
+                )
+            )
+        seats.append(seat.model_copy(update={"parsed": parsed}))
+
+    updated = scan.model_copy(
+        update={
+            "seats": seats,
+            "townSquare": parsed_tokens_to_town_square([s.parsed for s in seats]),
+            "refPackVersion": ref_pack_version,
+        }
+    )
+    return RematchResult(scan=updated, changes=changes, skipped_seats=skipped)
@@ -0,0 +1,285 @@
+"""
+Incremental rescan of a game's grimoire. The new photo's circles are aligned with the
+previous scan's seats, and only seats whose token or name region changed are re-run
+through OCR and character matching; unchanged seats reuse the previous ParsedToken. The result
+is diffed against the previous Town Square state (new deaths, role changes).
+"""
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import AbstractSet, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.models.schemas import (
+    DEAD_SUFFIX,
+    ParsedToken,
+    RoleChange,
+    ScanDiff,
+    ScanDocument,
+    ScanSeat,
+    TokenMatch,
+    TownSquareGameState,
+)
+from app.services.cancellation import CancelToken, ScanCancelled
+from app.services.circle_detector import CircleDetector
+from app.services.grimoire_pipeline import merge_names_and_matches
+from app.services.match_tokens import TokenMatcher, match_token_images, token_match_from_ref
+from app.services.orb_matcher import MATCH_SIZE
+from app.services.player_name_extractor import REGION_HASH_SIZE, PlayerNameExtractor
+from app.services.token_processor import TokenProcessor
+from app.utils.character_matcher import role_id
+from app.utils.circle_order import sort_circles_reading_order
+from app.utils.image_utils import difference_hash, encode_token_crop, hamming_distance
+
+# Grid for the token-crop difference hash (256 bits)
+TOKEN_HASH_SIZE = (16, 16)
+
+# Max differing hash bits (of 256) for a seat's token / name region to count as unchanged.
+# Tight on purpose: the hashes only catch re-shots from (almost) the same camera pose.
+# Alive and dead variants of one role can still be this close (moonchild: 22 bits), so
+# a seat reused on its token hash has its death state re-checked.
+TOKEN_HASH_TOLERANCE = 24
+NAME_HASH_TOLERANCE = 24
+
+# Max distance between aligned seat centres, as a fraction of the ring's mean radius
+SEAT_MATCH_TOLERANCE = 0.25
+
+Circle = Tuple[int, int, int]
+
+
+@dataclass
+class RescanResult:
+    """
+    Seats of the new scan, as 1-based positions. reused: previous role kept, only its
+    alive/dead state re-checked against that role's two refs; verified: role re-checked
+    against the previous role's refs only; rematched: full match; reread: name
+    label OCR'd again.
+    """
+    parsed_tokens: List[ParsedToken]
+    seats: List[ScanSeat]
+    reused: List[int]
+    verified: List[int]
+    rematched: List[int]
+    reread: List[int]
+
+
+def _normalised_centres(circles: Sequence[Circle]) -> np.ndarray:
+    """Circle centres relative to the ring centroid, in units of the ring's mean radius."""
+    centres = np.array([(x, y) for x, y, _ in circles], dtype=np.float64).reshape(-1, 2)
+    centred = centres - centres.mean(axis=0)
+    spread = np.linalg.norm(centred, axis=1).mean()
+    return centred / spread if spread > 0 else centred
+
+
+def align_seats(previous: Sequence[Circle], current: Sequence[Circle]) -> Dict[int, int]:
+    """
+    Map current seat index -> previous seat index. Both rings are normalised for
+    position and scale (the camera moves a little between photos), then paired
+    greedily by nearest centre, one-to-one, within SEAT_MATCH_TOLERANCE.
+    """
+    if not previous or not current:
+        return {}
+    prev = _normalised_centres(previous)
+    cur = _normalised_centres(current)
+    distances = np.linalg.norm(cur[:, None, :] - prev[None, :, :], axis=2)
+    alignment: Dict[int, int] = {}
+    taken: Set[int] = set()
+    for flat in np.argsort(distances, axis=None):
+        i, j = np.unravel_index(flat, distances.shape)
+        if distances[i, j] > SEAT_MATCH_TOLERANCE:
+            break
+        if i in alignment or j in taken:
+            continue
+        alignment[int(i)] = int(j)
+        taken.add(int(j))
+    return alignment
+
+
+def _same_name_region(prev: ScanSeat, name_hash: Optional[bytes]) -> bool:
+    """Empty labels (no name, e.g. bluffs) only match empty labels; others compare hashes."""
+    if name_hash is None or not prev.nameHash:
+        return name_hash is None and not prev.nameHash
+    return hamming_distance(name_hash, bytes.fromhex(prev.nameHash)) <= NAME_HASH_TOLERANCE
+
+
+def seat_hashes(
+    crops: Sequence[np.ndarray],
+    regions: Sequence[np.ndarray],
+    player_name_extractor: PlayerNameExtractor,
+) -> Tuple[List[bytes], List[Optional[bytes]]]:
+    """Token-crop and name-region hashes per seat; an empty name region (no label) has None."""
+    token_hashes = [difference_hash(crop, TOKEN_HASH_SIZE) for crop in crops]
+    name_hashes = [
+        None if player_name_extractor.is_empty_region(region) else difference_hash(region, REGION_HASH_SIZE)
+        for region in regions
+    ]
+    return token_hashes, name_hashes
+
+
+def scan_seats(
+    circles: Sequence[Circle],
+    crops: Sequence[np.ndarray],
+    token_hashes: Sequence[bytes],
+    name_hashes: Sequence[Optional[bytes]],
+    parsed_tokens: Sequence[ParsedToken],
+) -> List[ScanSeat]:
+    """Storable seats of a scan: circle, hashes, parsed result and the token crop for rematching."""
+    return [
+        ScanSeat(
+            token=idx + 1,
+            x=int(x),
+            y=int(y),
+            r=int(r),
+            tokenHash=token_hashes[idx].hex(),
+            nameHash=name_hashes[idx].hex() if name_hashes[idx] is not None else "",
+            parsed=parsed_tokens[idx],
+            crop=encode_token_crop(crops[idx], MATCH_SIZE),
+        )
+        for idx, (x, y, r) in enumerate(circles)
+    ]
+
+
+def scan_with_baseline(
+    image: np.ndarray,
+    baseline: Optional[ScanDocument],
+    circle_detector: CircleDetector,
+    token_processor: TokenProcessor,
+    player_name_extractor: PlayerNameExtractor,
+    matcher: TokenMatcher,
+    script_roles: Optional[AbstractSet[str]] = None,
+    ocr_executor: Optional[Executor] = None,
+    roster: Optional[Sequence[str]] = None,
+    detection_scale: float = 1.0,
+    cancel: Optional[CancelToken] = None,
+) -> RescanResult:
+    """
+    Scan a decoded grimoire image, reusing baseline seats that did not change.
+    Without a baseline every seat is processed (the first scan of a game).
+
+    Per aligned seat, the token and the name label are decided separately: an unchanged
+    token hash reuses the character (re-checking only whether it is dead), otherwise the previous role is re-checked against its
+    own refs before falling back to a full match; an unchanged name hash reuses the name,
+    otherwise the label is OCR'd. detection_scale is the circle detection working resolution.
+    cancel is checked between steps and seats; OCR still running when it fires is killed.
+    """
+    circles = sort_circles_reading_order(circle_detector.detect_circles(image, detection_scale))
+    crops = [token for token, _, _, _ in token_processor.extract_tokens(image, circles)]
+    regions = [
+        player_name_extractor.extract_player_name_region(image, (x, y)) for x, y, _ in circles
+    ]
+    if cancel is not None:
+        cancel.check("crop")
+    token_hashes, name_hashes = seat_hashes(crops, regions, player_name_extractor)
+
+    prev_seats = baseline.seats if baseline else []
+    prev_by_seat = {
+        idx: prev_seats[prev_idx]
+        for idx, prev_idx in align_seats([(s.x, s.y, s.r) for s in prev_seats], circles).items()
+    }
+
+    names: Dict[int, Optional[str]] = {}
+    name_futures = {}
+    ocr_seats: Set[int] = set()
+    for idx, region in enumerate(regions):
+        prev = prev_by_seat.get(idx)
+        if prev is not None and _same_name_region(prev, name_hashes[idx]):
+            names[idx] = prev.parsed.player_name
+            continue
+        ocr_seats.add(idx)
+        if ocr_executor is not None:
+            name_futures[idx] = ocr_executor.submit(
+                player_name_extractor.extract_name_from_region, region, roster, cancel
+            )
+        else:
+            names[idx] = player_name_extractor.extract_name_from_region(region, roster, cancel)
+
+    token_matches: Dict[int, TokenMatch] = {}
+    verified: List[int] = []
+    for idx, prev in prev_by_seat.items():
+        if not prev.parsed.character:
+            continue
+        if cancel is not None:
+            cancel.check("match")
+        if hamming_distance(token_hashes[idx], bytes.fromhex(prev.tokenHash)) <= TOKEN_HASH_TOLERANCE:
+            p = prev.parsed
+            # A role's alive and dead tokens can hash within the tolerance of each other,
+            # so the death state is re-checked against that role's two refs
+            result = matcher.match_roles(crops[idx], {role_id(p.character)})
+            is_dead = p.is_dead
+            if result and result[2] >= matcher.reverify_min_confidence:
+                is_dead = result[0].endswith(DEAD_SUFFIX)
+            token_matches[idx] = TokenMatch(
+                token=idx + 1,
+                character=p.character,
+                character_type=p.character_type,
+                confidence=p.confidence,
+                is_dead=is_dead,
+            )
+            continue
+        result = matcher.match_roles(crops[idx], {role_id(prev.parsed.character)})
+        if result and result[2] >= matcher.reverify_min_confidence:
+            token_matches[idx] = token_match_from_ref(idx + 1, result[0], result[2])
+            verified.append(idx)
+
+    # Roles kept from earlier seats are taken; the remaining seats are matched without them
+    assigned_roles = {
+        role_id(m.character)
+        for m in token_matches.values()
+        if m.character and m.confidence >= matcher.unique_role_min_confidence
+    }
+    rematch = [idx for idx in range(len(circles)) if idx not in token_matches]
+    for m in match_token_images(
+        ((idx + 1, crops[idx]) for idx in rematch),
+        matcher,
+        script_roles=script_roles,
+        assigned_roles=assigned_roles,
+        cancel=cancel,
+    ):
+        token_matches[m.token - 1] = m
+    try:
+        for idx, future in name_futures.items():
+            names[idx] = future.result()
+    except ScanCancelled:
+        for future in name_futures.values():
+            future.cancel()
+        raise
+
+    parsed_tokens = merge_names_and_matches(
+        [(idx + 1, names[idx]) for idx in range(len(circles))], token_matches.values()
+    )
+    seats = scan_seats(circles, crops, token_hashes, name_hashes, parsed_tokens)
+
+    touched = set(rematch) | set(verified) | ocr_seats
+    return RescanResult(
+        parsed_tokens=parsed_tokens,
+        seats=seats,
+        reused=[idx + 1 for idx in range(len(circles)) if idx not in touched],
+        verified=[idx + 1 for idx in sorted(verified)],
+        rematched=[idx + 1 for idx in rematch],
+        reread=[idx + 1 for idx in sorted(ocr_seats)],
+    )
+
+
+def diff_town_square(before: TownSquareGameState, after: TownSquareGameState) -> ScanDiff:
+    """Compare two Town Square states player by player (matched by case-insensitive name)."""
+    prev = {p.name.strip().lower(): p for p in before.players if p.name.strip()}
+    diff = ScanDiff()
+    seen: Set[str] = set()
+    for player in after.players:
+        key = player.name.strip().lower()
+        if not key:
+            continue
+        seen.add(key)
+        old = prev.get(key)
+        if old is None:
+            diff.addedPlayers.append(player.name)
+            continue
+        if player.isDead and not old.isDead:
+            diff.newDeaths.append(player.name)
+        elif old.isDead and not player.isDead:
+            diff.revived.append(player.name)
+        # An empty role means the token was not recognised, not that the role changed
+        if old.role and player.role and role_id(old.role) != role_id(player.role):
+            diff.roleChanges.append(RoleChange(player=player.name, before=old.role, after=player.role))
+    diff.removedPlayers = [p.name for key, p in prev.items() if key not in seen]
+    return diff
@@ -0,0 +1,657 @@
+"""
+Scan orchestration shared by the grimoire routes and the scan job worker: memory
+planning and admission, the caller's roster and game, the pipeline run under the chosen
+profile and matcher, and storing the scan. Routes read the uploads and translate
+cancellation; everything after that lives here, so /api/grimoire/process, upload
+finalize and `python -m app.worker` run exactly the same flow.
+
+Errors the caller should be answered with are raised as ScanError (status code and
+detail, as the API returns them); the app turns them into responses and the worker
+into failed jobs.
+"""
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from app.config import SCAN_ADMISSION_TIMEOUT_S, SCAN_MEMORY_PER_SCAN_MB, SCAN_UNATTACHED_TTL_S
+from app.db import get_games_collection, get_scans_collection
+from app.dependencies import (
+    REF_PACK_VERSION,
+    grimoire_engines,
+    metrics,
+    ocr_executor,
+    profile_matcher,
+    profiles,
+    scan_memory_budget,
+    token_processor,
+)
+from app.models.schemas import CaptureSeat, GameDocument, ScanDocument, ScanJobDocument, ScanParams
+from app.services.burst import process_burst, read_video_frames
+from app.services.cancellation import CancelToken, ScanCancelled
+from app.services.extract_tokens import SeatCrop
+from app.services.grimoire_pipeline import (
+    extract_and_match_crops,
+    extract_and_match_images,
+    parsed_tokens_to_town_square,
+)
+from app.services.grimoire_stages import SCAN_SEATS, SEATS, TOWN_SQUARE
+from app.services.memory_budget import (
+    AdmissionTimeout,
+    PeakRssSampler,
+    ScanPlan,
+    image_sizes,
+    plan_crops,
+    plan_scan,
+)
+from app.services.pipeline_engine import PipelineRun, StageError
+from app.services.pipeline_profiles import DEFAULT_PROFILE, ProfileServices
+from app.services.rescan import diff_town_square, scan_with_baseline
+from app.utils.character_matcher import get_script_roles
+from app.utils.circle_order import sort_circles_reading_order
+
+logger = logging.getLogger(__name__)
+
+NO_TOKENS = "Couldn't read grimoire; no tokens detected. Try another photo or paste Town Square JSON."
+SCAN_FAILED = "Couldn't read grimoire; try another photo or paste Town Square JSON."
+
+
+class ScanError(Exception):
+    """A scan that ends in an error response: status_code and detail as the API answers them."""
+
+    def __init__(self, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+def get_profile(name: Optional[str]) -> ProfileServices:
+    """Services of a pipeline profile by name (None: the default); 422 when unknown."""
+    profile = profiles.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        raise ScanError(422, f"Unknown profile {name!r}; available: {', '.join(sorted(profiles))}.")
+    return profile
+
+
+def decode_image(content: bytes, filename: Optional[str] = None) -> np.ndarray:
+    """Decode an uploaded image (BGR) straight from its buffer (no copy, no disk) or raise 422."""
+    image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ScanError(422, f"Couldn't decode image {filename}." if filename else "Couldn't decode image.")
+    return image
+
+
+def plan_images(sizes: Optional[List[Tuple[int, int]]], content_bytes: int = 0) -> ScanPlan:
+    """
+    Memory plan for a scan from image header sizes (before anything is decoded): 422 if a
+    header is unreadable, 413 if the images are too large for this instance even with
+    circle detection at the smallest working resolution.
+    """
+    if sizes is None:
+        raise ScanError(422, "Couldn't decode image.")
+    plan = plan_scan(sizes, SCAN_MEMORY_PER_SCAN_MB * 1024 * 1024, content_bytes=content_bytes)
+    if plan is None:
+        megapixels = round(sum(w * h for w, h in sizes) / 1e6, 1)
+        raise ScanError(413, f"Image too large to process on this server ({megapixels} MP); send a smaller photo.")
+    return plan
+
+
+def plan_crop_images(sizes: Optional[List[Tuple[int, int]]], content_bytes: int) -> ScanPlan:
+    """Memory plan for a pre-cropped capture: 422 if a crop is unreadable, 413 if too large."""
+    if sizes is None:
+        raise ScanError(422, "Couldn't decode a crop.")
+    plan = plan_crops(sizes, SCAN_MEMORY_PER_SCAN_MB * 1024 * 1024, content_bytes=content_bytes)
+    if plan is None:
+        raise ScanError(413, "Crops too large to process on this server.")
+    return plan
+
+
+@asynccontextmanager
+async def scan_memory(plan: ScanPlan, cancel: Optional[CancelToken] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the block as an admitted scan under the process memory budget (503 when the
+    budget stays full). Yields the response's memory metadata, completed on exit with
+    the process RSS peak observed while the block ran. With cancel, the wait for
+    admission is cut short by its deadline and a scan cancelled meanwhile never starts.
+    """
+    memory: Dict[str, Any] = {
+        "megapixels": plan.megapixels,
+        "detectionScale": plan.detection_scale,
+        "estimatedMb": round(plan.estimated_bytes / 2**20, 1),
+    }
+    timeout = SCAN_ADMISSION_TIMEOUT_S
+    if cancel is not None and cancel.deadline is not None:
+        timeout = min(timeout, cancel.remaining())
+    try:
+        async with scan_memory_budget.admit(plan.estimated_bytes, timeout) as waited:
+            if cancel is not None:
+                cancel.check("admission")
+            memory["admissionWaitMs"] = round(waited * 1000, 1)
+            with PeakRssSampler() as rss:
+                yield memory
+            if rss.peak_bytes is not None:
+                memory["peakRssMb"] = round(rss.peak_bytes / 2**20, 1)
+                memory["peakRssIncreaseMb"] = round((rss.peak_bytes - rss.start_bytes) / 2**20, 1)
+    except AdmissionTimeout as e:
+        if cancel is not None:
+            cancel.check("admission")
+        logger.warning("scan not admitted: %s", e)
+        raise ScanError(
+            503, "Server busy processing other grimoires; try again in a moment.", headers={"Retry-After": "5"}
+        )
+
+
+async def load_server_roster(server_id: str, current_user: Optional[dict]) -> List[str]:
+    """
+    Player names from a server's previous games (townSquare.players[].name), used to snap
+    OCR output. Same visibility as the game list: public games plus the caller's own.
+    """
+    user_id = current_user["userId"] if current_user else None
+    query: Dict[str, Any] = {"serverId": server_id}
+    if user_id:
+        query["$or"] = [{"visibility": "public"}, {"createdBy": user_id}]
+    else:
+        query["visibility"] = "public"
+    names = await get_games_collection().distinct("townSquare.players.name", query)
+    return sorted({n.strip() for n in names if isinstance(n, str) and n.strip()})
+
+
+async def _roster(params: ScanParams, current_user: Optional[dict]) -> Optional[List[str]]:
+    return await load_server_roster(params.serverId, current_user) if params.serverId else None
+
+
+async def get_owned_game(game_id: str, current_user: Optional[dict]) -> GameDocument:
+    """Game that a rescan is attached to; only its owner may scan into it."""
+    if not current_user:
+        raise ScanError(401, "Log in to scan into a game.")
+    raw = await get_games_collection().find_one({"gameId": game_id})
+    if not raw:
+        raise ScanError(404, "Game not found.")
+    game = GameDocument(**raw)
+    if game.createdBy != current_user["userId"]:
+        raise ScanError(403, "Only the game owner can scan into it.")
+    return game
+
+
+def _detection_scale(plan: ScanPlan, profile: ProfileServices) -> float:
+    """The memory-planned detection scale, capped by the profile's."""
+    return min(plan.detection_scale, profile.params.detection_scale)
+
+
+# ---------------------------------------------------------------------------
+# Single photo (/grimoire/process, upload finalize, scan jobs)
+# ---------------------------------------------------------------------------
+
+async def scan_photo(
+    uploads: List[Tuple[bytes, Optional[str]]],
+    params: ScanParams,
+    current_user: Optional[dict],
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    The /grimoire/process flow for one uploaded image (content, filename). uploads holds
+    one entry and is emptied as it is consumed. With params.gameId the photo is rescanned
+    against the game's latest scan, otherwise it is scanned afresh; either way the scan
+    is stored. Raises ScanCancelled once cancel is cancelled.
+    """
+    profile = get_profile(params.profile)
+    plan = plan_images(image_sizes([uploads[0][0]]), content_bytes=len(uploads[0][0]))
+    game = await get_owned_game(params.gameId, current_user) if params.gameId else None
+    if game and not params.serverId:
+        params = params.model_copy(update={"serverId": game.serverId})
+    roster = await _roster(params, current_user)
+    try:
+        if game:
+            response = await _rescan_game(uploads.pop()[0], plan, game, current_user, roster, params, profile, cancel)
+        else:
+            response = await _scan_new_grimoire(uploads.pop()[0], plan, current_user, roster, params, profile, cancel)
+    except (ScanError, ScanCancelled):
+        raise
+    except Exception as e:
+        logger.exception("scan failed: %s", e)
+        raise ScanError(500, SCAN_FAILED)
+    response["profile"] = profile.name
+    return response
+
+
+async def run_scan_job(job: ScanJobDocument, content: bytes, cancel: CancelToken) -> Dict[str, Any]:
+    """
+    Run a claimed scan job like /grimoire/process (as its creator); used by app.worker.
+    Returns the response body; raises ScanError as the route would and ScanCancelled.
+    """
+    current_user = {"userId": job.createdBy} if job.createdBy else None
+    return await scan_photo([(content, job.filename)], job.params, current_user, cancel)
+
+
+async def _store_scan(document: Dict[str, Any]) -> bool:
+    """
+    Insert a finished scan. A storage failure is logged and counted (scans_not_stored)
+    but does not fail the scan: its Town Square result is still returned, without a scan.
+    """
+    try:
+        await get_scans_collection().insert_one(document)
+    except Exception as e:
+        logger.error("scan %s not stored: %s", document.get("scanId"), e)
+        metrics.inc("scans_not_stored")
+        return False
+    return True
+
+
+async def _rescan_game(
+    content: bytes,
+    plan: ScanPlan,
+    game: GameDocument,
+    current_user: dict,
+    roster: Optional[List[str]],
+    params: ScanParams,
+    profile: ProfileServices,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Scan an uploaded photo against the game's latest stored scan: unchanged seats keep
+    their previous result, changed seats are re-run. Stores the new scan and returns
+    Town Square JSON plus the diff against the previous scan (scan is null when it could
+    not be stored). A cancelled scan stores nothing.
+    """
+    raw_baseline = await get_scans_collection().find_one({"gameId": game.gameId}, sort=[("createdAt", -1)])
+    baseline = ScanDocument(**raw_baseline) if raw_baseline else None
+    async with scan_memory(plan, cancel) as memory:
+        image = await asyncio.to_thread(decode_image, content)
+        # The upload bytes are not needed once decoded
+        del content
+        result = await asyncio.to_thread(
+            scan_with_baseline,
+            image,
+            baseline,
+            profile.circle_detector,
+            token_processor,
+            profile.player_name_extractor,
+            profile_matcher(profile, params.matcher),
+            script_roles=get_script_roles("bmr"),
+            ocr_executor=ocr_executor,
+            roster=roster,
+            detection_scale=_detection_scale(plan, profile),
+            cancel=cancel,
+        )
+        del image
+    if not result.parsed_tokens:
+        raise ScanError(422, NO_TOKENS)
+    state = parsed_tokens_to_town_square(result.parsed_tokens)
+    scan = ScanDocument(
+        scanId=str(uuid.uuid4()),
+        gameId=game.gameId,
+        serverId=game.serverId,
+        createdAt=datetime.now(timezone.utc).isoformat(),
+        createdBy=current_user["userId"],
+        baseScanId=baseline.scanId if baseline else None,
+        seats=result.seats,
+        townSquare=state,
+        refPackVersion=REF_PACK_VERSION,
+        matcher=params.matcher,
+        profile=profile.name,
+    )
+    stored = await _store_scan(scan.model_dump(mode="json"))
+    diff = diff_town_square(baseline.townSquare, state) if baseline else None
+    return {
+        "townSquare": state.model_dump(mode="json"),
+        "scan": {
+            "scanId": scan.scanId,
+            "baseScanId": scan.baseScanId,
+            "reusedSeats": result.reused,
+            "verifiedSeats": result.verified,
+            "rematchedSeats": result.rematched,
+            "rereadSeats": result.reread,
+        }
+        if stored
+        else None,
+        "diff": diff.model_dump(mode="json") if diff else None,
+        "memory": memory,
+    }
+
+
+async def _scan_new_grimoire(
+    content: bytes,
+    plan: ScanPlan,
+    current_user: Optional[dict],
+    roster: Optional[List[str]],
+    params: ScanParams,
+    profile: ProfileServices,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Scan an uploaded photo that belongs to no game yet and store the scan (seats with
+    their token crops) without a game. Saving a game with the returned scan.scanId
+    attaches it, making it the game's rescan baseline; unclaimed scans expire after
+    SCAN_UNATTACHED_TTL_S. When the scan cannot be stored, scan is null in the response.
+    """
+    async with scan_memory(plan, cancel) as memory:
+        run = await asyncio.to_thread(run_grimoire_engine, content, roster, params.matcher, plan, profile, cancel)
+    del content
+    now = datetime.now(timezone.utc)
+    scan = ScanDocument(
+        scanId=str(uuid.uuid4()),
+        serverId=params.serverId,
+        createdAt=now.isoformat(),
+        createdBy=current_user["userId"] if current_user else None,
+        seats=run.values[SCAN_SEATS],
+        townSquare=run.values[TOWN_SQUARE],
+        refPackVersion=REF_PACK_VERSION,
+        matcher=params.matcher,
+        profile=profile.name,
+        expiresAt=now + timedelta(seconds=SCAN_UNATTACHED_TTL_S),
+    )
+    # expiresAt stays a BSON date for the TTL index
+    stored = await _store_scan({**scan.model_dump(mode="json"), "expiresAt": scan.expiresAt})
+    return {
+        "townSquare": run.values[TOWN_SQUARE].model_dump(mode="json"),
+        "scan": {"scanId": scan.scanId, "baseScanId": None} if stored else None,
+        "stages": [record.to_dict() for record in run.records],
+        "memory": memory,
+    }
+
+
+def engine_inputs(
+    content: bytes, roster: Optional[List[str]], plan: ScanPlan, profile: ProfileServices
+) -> Dict[str, Any]:
+    """Inputs of a grimoire engine run for an uploaded photo, as production scans pass them."""
+    return {
+        "content": content,
+        "detection_scale": _detection_scale(plan, profile),
+        "roster": roster,
+        "script_roles": get_script_roles("bmr"),
+    }
+
+
+def run_grimoire_engine(
+    content: bytes,
+    roster: Optional[List[str]],
+    matcher: str,
+    plan: ScanPlan,
+    profile: ProfileServices,
+    cancel: Optional[CancelToken] = None,
+) -> PipelineRun:
+    """
+    One image through the profile's grimoire stage engine, up to the Town Square state
+    and the seats to store. Detection, OCR and matching are memoized by content, so an
+    unchanged photo sent again skips them. The profile's detection_scale caps the
+    memory-planned one. Raises ScanCancelled when cancel fires between stages or seats.
+    """
+    try:
+        run = grimoire_engines[(profile.name, matcher)].run(
+            engine_inputs(content, roster, plan, profile),
+            targets=[TOWN_SQUARE, SCAN_SEATS],
+            cancel=cancel,
+        )
+    except StageError as e:
+        if e.stage == "decode":
+            raise ScanError(422, "Couldn't decode image.")
+        raise
+    if not run.values[SEATS]:
+        raise ScanError(422, NO_TOKENS)
+    return run
+
+
+# ---------------------------------------------------------------------------
+# Several photos: overlapping (process-multi) and bursts (process-burst)
+# ---------------------------------------------------------------------------
+
+def _decoded_uploads(uploads: List[Tuple[bytes, Optional[str]]]) -> Iterator[Tuple[str, np.ndarray]]:
+    """Decode uploads one at a time as (name, image), dropping each buffer once decoded."""
+    index = 0
+    while uploads:
+        content, filename = uploads.pop(0)
+        index += 1
+        image = decode_image(content, filename)
+        del content
+        yield filename or f"upload_{index:03d}", image
+
+
+def _merge_uploads(
+    uploads: List[Tuple[bytes, Optional[str]]],
+    roster: Optional[List[str]],
+    matcher: str,
+    plan: ScanPlan,
+    profile: ProfileServices,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Extract + match overlapping photos of one grimoire (content, filename) with the
+    profile's services. Images are decoded in memory as the pipeline reaches them and
+    nothing is written to disk; the uploads list is emptied as it goes.
+    """
+    result = extract_and_match_images(
+        _decoded_uploads(uploads),
+        len(uploads),
+        profile.circle_detector,
+        token_processor,
+        profile.player_name_extractor,
+        profile_matcher(profile, matcher),
+        script_roles=get_script_roles("bmr"),
+        ocr_executor=ocr_executor,
+        roster=roster,
+        merge_overlapping=True,
+        detection_scale=_detection_scale(plan, profile),
+        cancel=cancel,
+    )
+    if result.extract_result.total_tokens == 0:
+        raise ScanError(422, NO_TOKENS)
+    return {"townSquare": parsed_tokens_to_town_square(result.parsed_tokens).model_dump(mode="json")}
+
+
+async def scan_merged(
+    uploads: List[Tuple[bytes, Optional[str]]],
+    params: ScanParams,
+    current_user: Optional[dict],
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Overlapping photos of one grimoire, aligned to the first, as one Town Square state.
+    Raises ScanCancelled once cancel is cancelled.
+    """
+    profile = get_profile(params.profile)
+    plan = plan_images(
+        image_sizes([content for content, _ in uploads]),
+        content_bytes=sum(len(content) for content, _ in uploads),
+    )
+    roster = await _roster(params, current_user)
+    try:
+        async with scan_memory(plan, cancel) as memory:
+            response = await asyncio.to_thread(
+                _merge_uploads, uploads, roster, params.matcher, plan, profile, cancel
+            )
+    except (ScanError, ScanCancelled):
+        raise
+    except Exception as e:
+        logger.exception("merged scan failed: %s", e)
+        raise ScanError(500, SCAN_FAILED)
+    response["memory"] = memory
+    response["profile"] = profile.name
+    return response
+
+
+def _decode_burst_frames(sources: List[Union[bytes, Path]]) -> List[np.ndarray]:
+    """Decode burst sources: still frames and sampled clip frames. Empties sources as it goes."""
+    frames: List[np.ndarray] = []
+    while sources:
+        source = sources.pop(0)
+        if isinstance(source, Path):
+            clip_frames = read_video_frames(source)
+            if not clip_frames:
+                raise ScanError(422, "Couldn't read video.")
+            frames.extend(clip_frames)
+            continue
+        frames.append(decode_image(source))
+    return frames
+
+
+async def scan_burst(
+    sources: List[Union[bytes, Path]],
+    sizes: List[Tuple[int, int]],
+    params: ScanParams,
+    current_user: Optional[dict],
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    A burst of frames of one grimoire (still frames as bytes, clips as paths; sizes are
+    the frames they yield, for the memory plan): sharpest frames first on the profile's
+    engine until every seat agrees, as one Town Square state. Raises ScanCancelled once
+    cancel is cancelled.
+    """
+    profile = get_profile(params.profile)
+    plan = plan_images(sizes, content_bytes=sum(len(s) for s in sources if isinstance(s, bytes)))
+    roster = await _roster(params, current_user)
+    async with scan_memory(plan, cancel) as memory:
+        frames = await asyncio.to_thread(_decode_burst_frames, sources)
+        try:
+            result = await asyncio.to_thread(
+                process_burst,
+                frames,
+                grimoire_engines[(profile.name, params.matcher)],
+                script_roles=get_script_roles("bmr"),
+                roster=roster,
+                detection_scale=_detection_scale(plan, profile),
+                cancel=cancel,
+            )
+        except ScanCancelled:
+            raise
+        except Exception as e:
+            logger.exception("burst scan failed: %s", e)
+            raise ScanError(500, SCAN_FAILED)
+        del frames
+    if not result.parsed_tokens:
+        raise ScanError(
+            422, "Couldn't read grimoire; no tokens detected in any frame. Try again or paste Town Square JSON."
+        )
+    return {
+        "townSquare": parsed_tokens_to_town_square(result.parsed_tokens).model_dump(mode="json"),
+        "burst": {
+            "framesReceived": result.frames_received,
+            "framesUsed": result.frames_used,
+            "stable": result.stable,
+            "unstableSeats": result.unstable_seats,
+        },
+        "memory": memory,
+        "profile": profile.name,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Client-side captures (detect, process-crops)
+# ---------------------------------------------------------------------------
+
+def _detect_seats(content: bytes, detection_scale: float, profile: ProfileServices) -> Dict[str, Any]:
+    """Decode a frame and detect its token circles in reading order, with their name regions."""
+    image = decode_image(content)
+    h, w = image.shape[:2]
+    circles = sort_circles_reading_order(profile.circle_detector.detect_circles(image, detection_scale))
+    del image
+    regions = token_processor.get_player_name_regions(circles, (h, w))
+    return {
+        "width": w,
+        "height": h,
+        "seats": [
+            {"x": int(x), "y": int(y), "r": int(r), "nameRegion": [int(v) for v in region]}
+            for (x, y, r), region in zip(circles, regions)
+        ],
+    }
+
+
+async def detect_seats(content: bytes, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+    """
+    Token circles of a frame (no OCR, no matching) with the default profile's detector.
+    A scan cancelled while waiting for admission never starts; detection itself is one
+    step and runs to the end.
+    """
+    profile = get_profile(DEFAULT_PROFILE)
+    plan = plan_images(image_sizes([content]), content_bytes=len(content))
+    async with scan_memory(plan, cancel) as memory:
+        response = await asyncio.to_thread(_detect_seats, content, _detection_scale(plan, profile), profile)
+    if not response["seats"]:
+        raise ScanError(422, "No tokens detected; try another photo.")
+    response["memory"] = memory
+    return response
+
+
+def _match_crops(
+    seats: List[CaptureSeat],
+    token_uploads: List[bytes],
+    name_uploads: Optional[List[bytes]],
+    frame_upload: Optional[bytes],
+    roster: Optional[List[str]],
+    matcher: str,
+    profile: ProfileServices,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Decode the crops and run OCR + matching on them (no detection); name regions are cut
+    from the frame when no name crops were sent. Upload lists are emptied as they decode.
+    """
+    extractor = profile.player_name_extractor
+    frame = decode_image(frame_upload, "frame") if frame_upload is not None else None
+    seat_crops: List[SeatCrop] = []
+    for index, seat in enumerate(seats, 1):
+        token = decode_image(token_uploads.pop(0), f"token {index}")
+        if name_uploads is not None:
+            name_region = decode_image(name_uploads.pop(0), f"name {index}")
+        else:
+            name_region = extractor.extract_player_name_region(frame, (seat.x, seat.y))
+        seat_crops.append(SeatCrop(circle=(seat.x, seat.y, seat.r), token=token, name_region=name_region))
+    result = extract_and_match_crops(
+        seat_crops,
+        token_processor,
+        extractor,
+        profile_matcher(profile, matcher),
+        script_roles=get_script_roles("bmr"),
+        ocr_executor=ocr_executor,
+        roster=roster,
+        cancel=cancel,
+    )
+    return {"townSquare": parsed_tokens_to_town_square(result.parsed_tokens).model_dump(mode="json")}
+
+
+async def scan_crops(
+    seats: List[CaptureSeat],
+    token_uploads: List[bytes],
+    name_uploads: Optional[List[bytes]],
+    frame_upload: Optional[bytes],
+    params: ScanParams,
+    current_user: Optional[dict],
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Seats the client cropped itself: straight to OCR and matching under the profile.
+    Raises ScanCancelled once cancel is cancelled.
+    """
+    profile = get_profile(params.profile)
+    contents = token_uploads + (name_uploads or []) + ([frame_upload] if frame_upload is not None else [])
+    plan = plan_crop_images(image_sizes(contents), content_bytes=sum(len(c) for c in contents))
+    del contents
+    roster = await _roster(params, current_user)
+    try:
+        async with scan_memory(plan, cancel) as memory:
+            response = await asyncio.to_thread(
+                _match_crops,
+                seats,
+                token_uploads,
+                name_uploads,
+                frame_upload,
+                roster,
+                params.matcher,
+                profile,
+                cancel,
+            )
+    except (ScanError, ScanCancelled):
+        raise
+    except Exception as e:
+        logger.exception("crop scan failed: %s", e)
+        raise ScanError(500, SCAN_FAILED)
+    response["memory"] = memory
+    response["profile"] = profile.name
+    return response
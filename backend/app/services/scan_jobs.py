@@ -0,0 +1,198 @@
+"""
+Durable scan jobs in Mongo. The API only stores the uploaded photo as a queued job and
+answers with its id; worker processes (`python -m app.worker`) claim jobs, run the scan
+and store the result, so a scan neither holds an HTTP connection nor dies with a web
+worker restart, and throughput scales with the number of worker processes.
+
+A claim is a lease: the worker owns the job until leaseUntil and renews it while the
+scan runs. A job whose worker died is claimed again once its lease has run out. Failed
+runs are retried after a backoff until JOB_MAX_ATTEMPTS; finished jobs drop their photo
+and are deleted by the TTL index on expiresAt.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+
+from app.models.schemas import JobError, ScanJobDocument, ScanParams
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# The stored photo is never returned with the job
+_NO_CONTENT = {"content": 0, "_id": 0}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _doc(raw: Optional[dict]) -> Optional[ScanJobDocument]:
+    return ScanJobDocument(**raw) if raw else None
+
+
+class ScanJobQueue:
+    """Scan jobs in a Mongo collection (resolved lazily: the connection opens at startup)."""
+
+    def __init__(
+        self,
+        collection: Callable[[], AsyncIOMotorCollection],
+        lease_seconds: float,
+        max_attempts: int,
+        retry_backoff_seconds: float,
+        ttl_seconds: float,
+    ):
+        self._collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def collection(self) -> AsyncIOMotorCollection:
+        return self._collection()
+
+    async def enqueue(
+        self, content: bytes, filename: Optional[str], params: ScanParams, owner_id: Optional[str]
+    ) -> ScanJobDocument:
+        """Store a queued job with its photo; it expires after the TTL if never finished."""
+        now = _now()
+        job = ScanJobDocument(
+            jobId=str(uuid.uuid4()),
+            createdAt=now.isoformat(),
+            updatedAt=now.isoformat(),
+            createdBy=owner_id,
+            filename=filename,
+            params=params,
+            runAfter=now,
+            expiresAt=now + timedelta(seconds=self.ttl_seconds),
+        )
+        await self.collection.insert_one({**job.model_dump(), "content": bytes(content)})
+        return job
+
+    async def get(self, job_id: str) -> Optional[ScanJobDocument]:
+        return _doc(await self.collection.find_one({"jobId": job_id}, _NO_CONTENT))
+
+    async def claim(self, worker_id: str) -> Optional[Tuple[ScanJobDocument, bytes]]:
+        """
+        Take the oldest due job (queued, or running under an expired lease) for worker_id.
+        Returns (job, photo bytes), or None when there is nothing to run.
+        """
+        now = _now()
+        raw = await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": QUEUED, "runAfter": {"$lte": now}},
+                    {"status": RUNNING, "leaseUntil": {"$lt": now}},
+                ],
+                "attempts": {"$lt": self.max_attempts},
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "workerId": worker_id,
+                    "leaseUntil": now + timedelta(seconds=self.lease_seconds),
+                    "updatedAt": now.isoformat(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("createdAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if raw is None:
+            return None
+        return ScanJobDocument(**raw), raw.get("content") or b""
+
+    async def renew(self, job_id: str, worker_id: str) -> bool:
+        """Extend worker_id's lease; False when the job is no longer its to run."""
+        now = _now()
+        result = await self.collection.update_one(
+            {"jobId": job_id, "workerId": worker_id, "status": RUNNING},
+            {
+                "$set": {
+                    "leaseUntil": now + timedelta(seconds=self.lease_seconds),
+                    "updatedAt": now.isoformat(),
+                }
+            },
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return await self._finish(job_id, worker_id, {"status": SUCCEEDED, "result": result, "error": None})
+
+    async def fail(self, job_id: str, worker_id: str, error: JobError, retry: bool) -> bool:
+        """
+        Record a failed run. With retry and attempts left the job is queued again after
+        a backoff that doubles per attempt; otherwise it fails for good.
+        """
+        now = _now()
+        job = await self.get(job_id)
+        if job is None or job.workerId != worker_id or job.status != RUNNING:
+            return False
+        if retry and job.attempts < self.max_attempts:
+            delay = self.retry_backoff_seconds * 2 ** (job.attempts - 1)
+            result = await self.collection.update_one(
+                {"jobId": job_id, "workerId": worker_id, "status": RUNNING},
+                {
+                    "$set": {
+                        "status": QUEUED,
+                        "error": error.model_dump(),
+                        "runAfter": now + timedelta(seconds=delay),
+                        "updatedAt": now.isoformat(),
+                    },
+                    "$unset": {"leaseUntil": "", "workerId": ""},
+                },
+            )
+            return result.matched_count == 1
+        return await self._finish(job_id, worker_id, {"status": FAILED, "error": error.model_dump()})
+
+    async def reap(self) -> int:
+        """Fail running jobs whose lease ran out on their last attempt (their worker died)."""
+        now = _now()
+        result = await self.collection.update_many(
+            {"status": RUNNING, "leaseUntil": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {
+                "$set": {
+                    "status": FAILED,
+                    "error": JobError(status=500, detail="The worker running this scan stopped.").model_dump(),
+                    "updatedAt": now.isoformat(),
+                    "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                },
+                "$unset": {"content": "", "leaseUntil": ""},
+            },
+        )
+        return result.modified_count
+
+    async def _finish(self, job_id: str, worker_id: str, fields: Dict[str, Any]) -> bool:
+        """Final state for worker_id's job; the photo is dropped and the TTL restarts."""
+        now = _now()
+        result = await self.collection.update_one(
+            {"jobId": job_id, "workerId": worker_id, "status": RUNNING},
+            {
+                "$set": {
+                    **fields,
+                    "updatedAt": now.isoformat(),
+                    "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                },
+                "$unset": {"content": "", "leaseUntil": ""},
+            },
+        )
+        return result.matched_count == 1
+
+
+def job_status(job: ScanJobDocument) -> Dict[str, Any]:
+    """Client view of a job (the result only once it has succeeded)."""
+    return {
+        "jobId": job.jobId,
+        "status": job.status,
+        "createdAt": job.createdAt,
+        "updatedAt": job.updatedAt,
+        "attempts": job.attempts,
+        "result": job.result if job.status == SUCCEEDED else None,
+        "error": job.error.model_dump() if job.error else None,
+    }
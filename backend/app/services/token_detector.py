@@ -4,6 +4,9 @@ from pathlib import Path
 from typing import List, Tuple
 from app.utils.image_utils import ensure_grayscale
 
+# Pixels kept around the circle when cropping a token
+TOKEN_CROP_PADDING = 5
+
 
 class TokenDetector:
     """Detect circular tokens in grimoire images"""
@@ -86,7 +89,7 @@ class TokenDetector:
         return []
     
     def extract_token_circular(self, image: np.ndarray, x: int, y: int, radius: int, 
-                               padding: int = 5) -> np.ndarray:
+                               padding: int = TOKEN_CROP_PADDING) -> np.ndarray:
         """
         Extract a circular token region from the image
         Creates a mask to extract only the circular area
@@ -121,7 +124,7 @@ class TokenDetector:
         return token_circular
     
     def extract_token(self, image: np.ndarray, x: int, y: int, radius: int, 
-                     padding: int = 5, circular: bool = True) -> np.ndarray:
+                     padding: int = TOKEN_CROP_PADDING, circular: bool = True) -> np.ndarray:
         """
         Extract a token region from the image
         Args:
@@ -2,6 +2,11 @@ import cv2
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple, Dict
+from app.services.player_name_extractor import (
+    NAME_REGION_HEIGHT,
+    NAME_REGION_OFFSET_Y,
+    NAME_REGION_WIDTH,
+)
 from app.services.token_detector import TokenDetector
 
 
@@ -94,8 +99,8 @@ class TokenProcessor:
     
     def get_player_name_regions(self, circles: List[Tuple[int, int, int]],
                                image_shape: Tuple[int, int],
-                               offset_y: int = 89, box_width: int = 180,
-                               box_height: int = 38) -> List[Tuple[int, int, int, int]]:
+                               offset_y: int = NAME_REGION_OFFSET_Y, box_width: int = NAME_REGION_WIDTH,
+                               box_height: int = NAME_REGION_HEIGHT) -> List[Tuple[int, int, int, int]]:
         """
         Calculate player name region boxes for visualization
         Args:
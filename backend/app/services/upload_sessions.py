@@ -0,0 +1,137 @@
+"""
+Resumable uploads for grimoire photos. A client creates a session with the file's size,
+sends the bytes in chunks at explicit offsets and finalizes once everything has arrived;
+after a dropped connection it asks for the session's offset and continues from there
+instead of restarting the upload. Sessions are staged in memory and expire after a
+period without activity. A session's buffer grows with the bytes that actually arrive
+(creating one costs nothing until chunks are sent), and each caller may hold only a few
+sessions at once, so one client cannot take every slot.
+"""
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from app.services.memory_budget import read_image_size
+from app.utils.media_types import SNIFF_BYTES, sniff_media_type
+
+
+class UploadSessionsFull(Exception):
+    """Too many uploads are in progress to start another one."""
+
+
+class CallerUploadsFull(UploadSessionsFull):
+    """The caller already has as many uploads in progress as it may."""
+
+
+@dataclass
+class UploadSession:
+    """
+    One resumable upload: a buffer filled from offset 0 upwards to the declared size.
+    caller is who started it (user or client IP, as the rate limiter keys callers).
+    """
+    upload_id: str
+    owner_id: Optional[str]
+    caller: str
+    filename: Optional[str]
+    size: int
+    created_at: float
+    updated_at: float
+    # Bytes [0, received) have arrived; chunks must start at or before this offset
+    received: int = 0
+    # Sniffed from the first bytes and parsed from the header as soon as they arrive,
+    # so a wrong type or an oversized image is refused before the rest is sent
+    media_type: Optional[str] = None
+    image_size: Optional[Tuple[int, int]] = None
+    # Holds bytes [0, received) only; grows as chunks arrive
+    buffer: bytearray = field(default_factory=bytearray)
+    # One chunk at a time per session
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.size
+
+    def write(self, offset: int, data: bytes) -> None:
+        """
+        Store data at offset. Re-sending bytes before `received` (a chunk whose response
+        was lost) overwrites them; a gap after `received` or data past the declared size
+        raises ValueError.
+        """
+        if offset > self.received:
+            raise ValueError(f"Chunk starts at {offset} but only {self.received} bytes have arrived")
+        end = offset + len(data)
+        if end > self.size:
+            raise ValueError(f"Chunk ends at {end}, past the declared size {self.size}")
+        # offset <= len(buffer): overwrites re-sent bytes and extends past the end
+        self.buffer[offset:end] = data
+        self.received = max(self.received, end)
+        self.updated_at = time.time()
+        self._inspect_head()
+
+    def _inspect_head(self) -> None:
+        """Sniff the type and read the image header once enough leading bytes are in."""
+        if self.media_type is None and self.received >= min(SNIFF_BYTES, self.size):
+            self.media_type = sniff_media_type(bytes(self.buffer[:SNIFF_BYTES])) or ""
+        if self.image_size is None and self.media_type:
+            # Headers are small; only retry while little has arrived or on completion
+            if self.received <= 256 * 1024 or self.complete:
+                self.image_size = read_image_size(memoryview(self.buffer)[: self.received])
+
+    def content(self) -> memoryview:
+        """The uploaded bytes, without copying the buffer."""
+        return memoryview(self.buffer)[: self.received]
+
+
+class UploadSessionStore:
+    """In-memory upload sessions by id, pruned of expired ones on every access."""
+
+    def __init__(self, ttl_seconds: float, max_sessions: int, max_per_caller: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_per_caller = max_per_caller
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Drop sessions idle for longer than the TTL (unless a chunk is being written)."""
+        now = now if now is not None else time.time()
+        for upload_id, session in list(self._sessions.items()):
+            if now - session.updated_at > self.ttl_seconds and not session.lock.locked():
+                del self._sessions[upload_id]
+
+    def create(
+        self, owner_id: Optional[str], caller: str, filename: Optional[str], size: int
+    ) -> UploadSession:
+        """
+        Start a session for a file of size bytes. Raises CallerUploadsFull when caller
+        already holds max_per_caller sessions, UploadSessionsFull at overall capacity.
+        """
+        self.prune()
+        held = sum(1 for session in self._sessions.values() if session.caller == caller)
+        if held >= self.max_per_caller:
+            raise CallerUploadsFull(f"{held} uploads in progress for {caller}")
+        if len(self._sessions) >= self.max_sessions:
+            raise UploadSessionsFull(f"{len(self._sessions)} uploads in progress")
+        now = time.time()
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            owner_id=owner_id,
+            caller=caller,
+            filename=filename,
+            size=size,
+            created_at=now,
+            updated_at=now,
+        )
+        self._sessions[session.upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        self.prune()
+        return self._sessions.get(upload_id)
+
+    def remove(self, upload_id: str) -> None:
+        self._sessions.pop(upload_id, None)
+
+    def expires_at(self, session: UploadSession) -> float:
+        return session.updated_at + self.ttl_seconds
@@ -0,0 +1,168 @@
+"""
+Startup warm-up for the scan pipeline. The first scan in a fresh process is much slower
+than steady state: OpenCV initialises its thread pools and optimized kernels lazily,
+Tesseract's binary and language model are not yet in the page cache, and the worker
+threads of the stage and OCR executors do not exist yet.
+
+warm_up runs a tiny synthetic grimoire (reference tokens with a name label) through every
+stage engine, i.e. every profile and matcher, and runs OCR the way scans do. WarmupState
+tracks progress for the readiness endpoint, so a load balancer only routes scans to a
+worker once it is warm.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pytesseract
+
+from app.services.cancellation import CancelToken
+from app.services.grimoire_stages import SEATS, TOWN_SQUARE
+from app.services.pipeline_engine import PipelineEngine
+from app.services.player_name_extractor import (
+    NAME_REGION_HEIGHT,
+    NAME_REGION_OFFSET_Y,
+    NAME_REGION_WIDTH,
+    PlayerNameExtractor,
+)
+
+logger = logging.getLogger(__name__)
+
+# Reference tokens placed on the warm-up image
+WARMUP_TOKENS = 3
+
+
+@dataclass
+class WarmupState:
+    """Progress of the startup warm-up; ready once it has completed successfully."""
+    ready: bool = False
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start(self) -> None:
+        with self._lock:
+            self.ready = False
+            self.started_at = time.time()
+            self.finished_at = None
+            self.error = None
+            self.steps = []
+
+    def add_step(self, name: str, duration_ms: float, **detail: Any) -> None:
+        with self._lock:
+            self.steps.append({"step": name, "durationMs": round(duration_ms, 1), **detail})
+
+    def finish(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.finished_at = time.time()
+            self.error = error
+            self.ready = error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.ready:
+                status = "ready"
+            elif self.error:
+                status = "failed"
+            else:
+                status = "warming" if self.started_at else "pending"
+            elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else None
+            return {
+                "status": status,
+                "ready": self.ready,
+                "elapsedMs": round(elapsed * 1000, 1) if elapsed is not None else None,
+                "error": self.error,
+                "steps": list(self.steps),
+            }
+
+
+def warmup_image(ref_images_dir: Path, radius: int) -> Tuple[bytes, int]:
+    """
+    PNG of WARMUP_TOKENS reference tokens in a row, each with a name label below it, and
+    the number of tokens placed. Tokens are drawn at `radius` px (at least the detector's
+    minimum) so detection, cropping, matching and OCR all have work to do.
+    """
+    refs = sorted(Path(ref_images_dir).glob("*.png"))[:WARMUP_TOKENS]
+    pitch = max(2 * radius, NAME_REGION_WIDTH) + 40
+    width = pitch * max(len(refs), 1)
+    height = 2 * radius + NAME_REGION_OFFSET_Y + NAME_REGION_HEIGHT + 40
+    canvas = np.full((height, width, 3), 40, dtype=np.uint8)
+    placed = 0
+    for i, path in enumerate(refs):
+        token = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        if token is None or token.ndim != 3 or token.shape[2] != 4:
+            continue
+        side = 2 * radius
+        # Ref images are as wide as the token's circle, which ends at the last opaque row
+        bottom = int(np.flatnonzero(token[..., 3].max(axis=1) > 10)[-1]) + 1
+        square = token[max(0, bottom - token.shape[1]) : bottom]
+        square = cv2.resize(square, (side, side), interpolation=cv2.INTER_AREA).astype(np.float32)
+        alpha = square[..., 3:] / 255.0
+        cx, cy = pitch * i + pitch // 2, radius + 20
+        region = canvas[cy - radius : cy + radius, cx - radius : cx + radius].astype(np.float32)
+        canvas[cy - radius : cy + radius, cx - radius : cx + radius] = (
+            square[..., :3] * alpha + region * (1.0 - alpha)
+        ).astype(np.uint8)
+        ly = cy + NAME_REGION_OFFSET_Y
+        cv2.rectangle(canvas, (cx - 70, ly - 15), (cx + 70, ly + 15), (20, 20, 20), -1)
+        cv2.putText(canvas, f"Player{i + 1}", (cx - 55, ly + 8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (235, 235, 235), 2)
+        placed += 1
+    ok, buf = cv2.imencode(".png", canvas)
+    if not ok:
+        raise RuntimeError("Couldn't encode the warm-up image")
+    return buf.tobytes(), placed
+
+
+def warm_up(
+    state: WarmupState,
+    engines: Dict[Tuple[str, str], PipelineEngine],
+    ref_images_dir: Path,
+    radius: int,
+    extractor: PlayerNameExtractor,
+) -> None:
+    """
+    Run the warm-up, recording each step on state. OCR goes through extractor.run_tesseract
+    both without and with a cancel token, the two ways scans call it. Never raises;
+    failures go to state.error.
+    """
+    state.start()
+    try:
+        start = time.perf_counter()
+        content, placed = warmup_image(ref_images_dir, radius)
+        state.add_step("image", (time.perf_counter() - start) * 1000, tokens=placed)
+
+        # OCR engine: loads the binary and language model once. Missing Tesseract only
+        # costs names (scans still work), so it is reported but does not fail the warm-up.
+        start = time.perf_counter()
+        try:
+            version = str(pytesseract.get_tesseract_version())
+            blank = np.full((40, 160), 255, dtype=np.uint8)
+            extractor.run_tesseract(blank)
+            extractor.run_tesseract(blank, CancelToken())
+            state.add_step("ocr", (time.perf_counter() - start) * 1000, version=version)
+        except Exception as e:
+            logger.warning("warm-up: OCR unavailable: %s", e)
+            state.add_step("ocr", (time.perf_counter() - start) * 1000, error=str(e))
+
+        for (profile, matcher), engine in engines.items():
+            start = time.perf_counter()
+            run = engine.run(
+                {"content": content, "detection_scale": 1.0, "roster": None, "script_roles": None},
+                targets=[TOWN_SQUARE],
+            )
+            state.add_step(
+                f"pipeline:{profile}:{matcher}",
+                (time.perf_counter() - start) * 1000,
+                seats=len(run.values[SEATS]),
+            )
+        state.finish()
+        logger.info("warm-up finished in %s ms", state.to_dict()["elapsedMs"])
+    except Exception as e:
+        logger.exception("warm-up failed: %s", e)
+        state.finish(error=f"{type(e).__name__}: {e}")
@@ -0,0 +1 @@
+# Command-line tools: benchmarks and offline batch jobs (python -m app.tools.<name>)
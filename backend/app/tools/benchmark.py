@@ -0,0 +1,190 @@
+"""
+Compare character matcher backends on a labelled image set.
+
+Run from backend dir:
+    python -m app.tools.benchmark [--labels test_images/labels.json] [--matcher orb --matcher embedding]
+
+Labels file: a JSON list of {"image": path relative to the labels file, "tokens": [{"character":
+role id, "player_name": optional, "is_dead": optional}, ...]} with tokens in reading order
+(top-most first, then clockwise, as sort_circles_reading_order). Circles are detected and
+cropped once per image; each matcher then runs on the same crops.
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.config import BASE_DIR, PIPELINE_PROFILES_FILE, REF_IMAGES_DIR
+from app.services.circle_detector import CircleDetector
+from app.services.embedding_matcher import EmbeddingMatcher
+from app.services.pipeline_profiles import DEFAULT_PROFILE, PipelineParams, resolve_profiles
+from app.services.token_detector import TokenDetector
+from app.utils.character_matcher import role_id
+from app.utils.circle_order import sort_circles_reading_order
+
+DEFAULT_LABELS = BASE_DIR / "test_images" / "labels.json"
+
+
+def default_params() -> PipelineParams:
+    """The default profile's parameters, as the API's scans use them without ?profile=."""
+    return resolve_profiles(PIPELINE_PROFILES_FILE)[DEFAULT_PROFILE]
+
+
+# Matcher backends by name, as selectable per request with ?matcher=; ORB is built with
+# the default profile's settings
+MATCHER_FACTORIES: Dict[str, Callable[[Path], object]] = {
+    "orb": lambda ref_images_dir: default_params().build_orb_matcher(ref_images_dir),
+    "embedding": EmbeddingMatcher,
+}
+
+
+@dataclass
+class LabelledImage:
+    path: Path
+    tokens: List[dict]
+
+
+@dataclass
+class MatcherScore:
+    """Accumulated results of one matcher over the labelled set."""
+    name: str
+    build_ms: float = 0.0
+    tokens: int = 0
+    correct: int = 0
+    dead_labelled: int = 0
+    dead_correct: int = 0
+    match_ms: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "matcher": self.name,
+            "build_ms": round(self.build_ms, 1),
+            "tokens": self.tokens,
+            "accuracy": round(self.correct / self.tokens, 4) if self.tokens else None,
+            "dead_accuracy": round(self.dead_correct / self.dead_labelled, 4) if self.dead_labelled else None,
+            "ms_per_token": round(float(np.mean(self.match_ms)), 3) if self.match_ms else None,
+            "p95_ms_per_token": round(float(np.percentile(self.match_ms, 95)), 3) if self.match_ms else None,
+        }
+
+
+def load_labels(labels_path: Path) -> List[LabelledImage]:
+    """Read a labels file; image paths are resolved relative to it."""
+    entries = json.loads(Path(labels_path).read_text(encoding="utf-8"))
+    return [
+        LabelledImage(path=(Path(labels_path).parent / e["image"]).resolve(), tokens=e["tokens"])
+        for e in entries
+    ]
+
+
+def detect_token_crops(
+    image: np.ndarray, circle_detector: CircleDetector, token_detector: TokenDetector
+) -> List[np.ndarray]:
+    """Token crops in reading order, as the pipeline produces them."""
+    circles = sort_circles_reading_order(circle_detector.detect_circles(image))
+    return [token_detector.extract_token(image, x, y, r, circular=True) for x, y, r in circles]
+
+
+def score_matcher(score: MatcherScore, matcher, crops: List[np.ndarray], labels: List[dict]) -> None:
+    """Match each crop, timing every call, and compare with the labels position by position."""
+    for crop, label in zip(crops, labels):
+        start = time.perf_counter()
+        result = matcher.match_character(crop)
+        score.match_ms.append((time.perf_counter() - start) * 1000)
+        score.tokens += 1
+        if result and role_id(result[0]) == role_id(label["character"]):
+            score.correct += 1
+        if label.get("is_dead") is not None:
+            score.dead_labelled += 1
+            if result and result[0].lower().endswith("-dead") == bool(label["is_dead"]):
+                score.dead_correct += 1
+    # Seats the detector missed count as wrong
+    score.tokens += max(0, len(labels) - len(crops))
+
+
+def run_benchmark(
+    labelled: List[LabelledImage],
+    matcher_names: List[str],
+    ref_images_dir: Path = REF_IMAGES_DIR,
+    circle_detector: Optional[CircleDetector] = None,
+    token_detector: Optional[TokenDetector] = None,
+) -> dict:
+    """Benchmark the named matchers; returns {"images": [...], "matchers": [...]}."""
+    circle_detector = circle_detector or default_params().build_circle_detector()
+    token_detector = token_detector or TokenDetector(min_radius_cm=1, max_radius_cm=3.5)
+
+    scores: Dict[str, MatcherScore] = {}
+    matchers = {}
+    for name in matcher_names:
+        start = time.perf_counter()
+        matchers[name] = MATCHER_FACTORIES[name](ref_images_dir)
+        scores[name] = MatcherScore(name=name, build_ms=(time.perf_counter() - start) * 1000)
+
+    images = []
+    for item in labelled:
+        image = cv2.imread(str(item.path))
+        if image is None:
+            images.append({"image": str(item.path), "error": "unreadable"})
+            continue
+        start = time.perf_counter()
+        crops = detect_token_crops(image, circle_detector, token_detector)
+        detect_ms = (time.perf_counter() - start) * 1000
+        images.append(
+            {
+                "image": str(item.path),
+                "labelled_tokens": len(item.tokens),
+                "detected_tokens": len(crops),
+                "detect_ms": round(detect_ms, 1),
+            }
+        )
+        for name, matcher in matchers.items():
+            score_matcher(scores[name], matcher, crops, item.tokens)
+
+    return {"images": images, "matchers": [s.to_dict() for s in scores.values()]}
+
+
+def _print_report(report: dict) -> None:
+    for img in report["images"]:
+        if "error" in img:
+            print(f"{img['image']}: {img['error']}")
+            continue
+        print(
+            f"{Path(img['image']).name}: {img['detected_tokens']}/{img['labelled_tokens']} tokens detected "
+            f"in {img['detect_ms']} ms"
+        )
+    print(f"{'matcher':<12}{'accuracy':>10}{'dead acc':>10}{'ms/token':>10}{'p95 ms':>10}{'build ms':>10}")
+    for m in report["matchers"]:
+        acc = f"{m['accuracy']:.3f}" if m["accuracy"] is not None else "-"
+        dead = f"{m['dead_accuracy']:.3f}" if m["dead_accuracy"] is not None else "-"
+        print(
+            f"{m['matcher']:<12}{acc:>10}{dead:>10}{m['ms_per_token'] or 0:>10.2f}"
+            f"{m['p95_ms_per_token'] or 0:>10.2f}{m['build_ms']:>10.0f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS, help="Labels JSON file")
+    parser.add_argument(
+        "--matcher",
+        action="append",
+        choices=sorted(MATCHER_FACTORIES),
+        help="Matcher backend to include (repeatable; default: all)",
+    )
+    parser.add_argument("--json", type=Path, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(load_labels(args.labels), args.matcher or sorted(MATCHER_FACTORIES))
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
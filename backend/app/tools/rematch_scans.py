@@ -0,0 +1,154 @@
+"""
+Rematch stored grimoire scans after a reference-pack update.
+
+Run from backend dir:
+    python -m app.tools.rematch_scans            # dry run: report which games' roles would change
+    python -m app.tools.rematch_scans --apply    # also store the rematched scans
+
+Visits every scan whose refPackVersion differs from the current ref-images, re-runs only
+character matching on its stored token crops (no decode, detection or OCR) with the
+matcher and pipeline profile the scan was made with, and reports per game which seats
+change (scans not attached to a game are listed under "(no game)"). With --apply the scans are updated; for each game's latest
+scan, the game's Town Square players are updated too, but only where the role / dead
+state still equals what the old scan said (manual edits are left alone).
+Requires MONGODB_URI and MONGODB_DB_NAME in env (or .env).
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import GAMES_COLLECTION, MONGODB_DB_NAME, MONGODB_URI, SCANS_COLLECTION
+from app.dependencies import REF_PACK_VERSION, matchers, profile_matcher, profiles
+from app.models.schemas import ScanDocument
+from app.services.pipeline_profiles import DEFAULT_PROFILE
+from app.services.rematch import SeatRematch, rematch_scan
+from app.utils.character_matcher import get_script_roles, role_id
+
+# Report key for scans not attached to a game
+NO_GAME = "(no game)"
+
+
+def _scan_matcher(scan: ScanDocument):
+    """The matcher the scan was made with: its matcher under its profile (default when unknown)."""
+    profile = profiles.get(scan.profile or DEFAULT_PROFILE, profiles[DEFAULT_PROFILE])
+    return profile_matcher(profile, scan.matcher if scan.matcher in matchers else "orb")
+
+
+def _update_game_players(town_square: dict, changes: List[SeatRematch]) -> int:
+    """Apply seat changes to a game's townSquare dict in place; returns players updated."""
+    by_name = {
+        (p.get("name") or "").strip().lower(): p for p in town_square.get("players", []) if p.get("name")
+    }
+    updated = 0
+    for change in changes:
+        player = by_name.get((change.player_name or "").strip().lower())
+        if player is None:
+            continue
+        touched = False
+        if change.after and role_id(player.get("role") or "") == role_id(change.before or ""):
+            player["role"] = change.after
+            touched = True
+        if change.after_dead is not None and bool(player.get("isDead")) == bool(change.before_dead):
+            player["isDead"] = change.after_dead
+            touched = True
+        updated += touched
+    return updated
+
+
+async def run(apply: bool) -> dict:
+    client = AsyncIOMotorClient(MONGODB_URI)
+    db = client[MONGODB_DB_NAME]
+    scans = db[SCANS_COLLECTION]
+    games = db[GAMES_COLLECTION]
+
+    latest_scan: Dict[str, str] = {}
+    async for doc in scans.aggregate(
+        [
+            {"$match": {"gameId": {"$ne": None}}},
+            {"$sort": {"createdAt": -1}},
+            {"$group": {"_id": "$gameId", "scanId": {"$first": "$scanId"}}},
+        ]
+    ):
+        latest_scan[doc["_id"]] = doc["scanId"]
+
+    report: Dict[str, List[dict]] = defaultdict(list)
+    visited = 0
+    async for raw in scans.find({"refPackVersion": {"$ne": REF_PACK_VERSION}}):
+        scan = ScanDocument(**raw)
+        visited += 1
+        result = rematch_scan(scan, _scan_matcher(scan), REF_PACK_VERSION, get_script_roles("bmr"))
+        entry = {
+            "scanId": scan.scanId,
+            "matcher": scan.matcher,
+            "profile": scan.profile,
+            "latest": scan.gameId is not None and latest_scan.get(scan.gameId) == scan.scanId,
+            "skippedSeats": result.skipped_seats,
+            "changes": [vars(c) for c in result.changes],
+        }
+        if apply:
+            await scans.update_one(
+                {"scanId": scan.scanId},
+                {"$set": result.scan.model_dump(mode="json", include={"seats", "townSquare", "refPackVersion"})},
+            )
+            if entry["latest"] and result.changes:
+                game = await games.find_one({"gameId": scan.gameId})
+                if game and game.get("townSquare"):
+                    entry["gamePlayersUpdated"] = _update_game_players(game["townSquare"], result.changes)
+                    await games.update_one(
+                        {"gameId": scan.gameId}, {"$set": {"townSquare": game["townSquare"]}}
+                    )
+        if result.changes or result.skipped_seats:
+            report[scan.gameId or NO_GAME].append(entry)
+
+    client.close()
+    return {
+        "refPackVersion": REF_PACK_VERSION,
+        "applied": apply,
+        "scansVisited": visited,
+        "gamesAffected": sum(
+            1 for game_id, entries in report.items() if game_id != NO_GAME and any(e["changes"] for e in entries)
+        ),
+        "games": dict(report),
+    }
+
+
+def _print_summary(report: dict) -> None:
+    print(
+        f"Ref pack {report['refPackVersion']}: {report['scansVisited']} outdated scan(s), "
+        f"{report['gamesAffected']} game(s) with role changes"
+        + (" (applied)" if report["applied"] else " (dry run, use --apply to store)")
+    )
+    for game_id, entries in report["games"].items():
+        for entry in entries:
+            flag = " [latest]" if entry["latest"] else ""
+            print(f"  game {game_id} scan {entry['scanId']}{flag}")
+            for c in entry["changes"]:
+                dead = ""
+                if c["before_dead"] != c["after_dead"]:
+                    dead = f" (dead: {c['before_dead']} -> {c['after_dead']})"
+                print(f"    seat {c['token']} {c['player_name'] or '(bluff)'}: {c['before']} -> {c['after']}{dead}")
+            if entry["skippedSeats"]:
+                print(f"    no stored crop for seats {entry['skippedSeats']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rematch stored scans after a reference-pack update.")
+    parser.add_argument("--apply", action="store_true", help="Store the rematched scans (default: dry run)")
+    parser.add_argument("--json", type=Path, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args.apply))
+    _print_summary(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Upload a grimoire photo through the resumable upload API, optionally dropping the
+connection mid-chunk to simulate a flaky mobile network.
+
+Run from backend dir (with the API running):
+    python -m app.tools.resumable_upload test_images/g3-grimoire.png
+    python -m app.tools.resumable_upload photo.jpg --drop-rate 0.5 --chunk-kb 128
+
+Creates an upload, sends the file in chunks with PUT ...?offset=N and finalizes it,
+printing the scan response. With --drop-rate, that fraction of chunks is cut off partway
+through (socket closed without finishing the body); the tool then asks the server for
+the upload's offset and resumes from there, as a mobile client would after reconnecting.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+def _connect(base: str) -> http.client.HTTPConnection:
+    parts = urlsplit(base)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return conn_cls(parts.netloc, timeout=60)
+
+
+def _request(
+    base: str, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None
+) -> Tuple[int, Dict[str, Any]]:
+    conn = _connect(base)
+    try:
+        conn.request(method, urlsplit(base).path.rstrip("/") + path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        data = resp.read()
+        return resp.status, (json.loads(data) if data else {})
+    finally:
+        conn.close()
+
+
+def _send_partial(base: str, path: str, chunk: bytes, sent_fraction: float) -> None:
+    """Start a PUT declaring the whole chunk, send only part of it and drop the connection."""
+    conn = _connect(base)
+    try:
+        conn.putrequest("PUT", urlsplit(base).path.rstrip("/") + path)
+        conn.putheader("Content-Type", "application/octet-stream")
+        conn.putheader("Content-Length", str(len(chunk)))
+        conn.endheaders()
+        conn.send(chunk[: int(len(chunk) * sent_fraction)])
+        # Give the server a moment to read what was sent before the socket goes away
+        time.sleep(0.2)
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Resumable grimoire photo upload")
+    parser.add_argument("image", type=Path, help="Photo to upload")
+    parser.add_argument("--url", default="http://localhost:8000/api", help="API base URL")
+    parser.add_argument("--chunk-kb", type=int, default=512, help="Chunk size in KB")
+    parser.add_argument(
+        "--drop-rate", type=float, default=0.0, help="Fraction of chunks cut off partway (0-1)"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for --drop-rate")
+    parser.add_argument("--server-id", default=None, help="Passed to finalize as server_id")
+    parser.add_argument("--game-id", default=None, help="Passed to finalize as game_id")
+    args = parser.parse_args()
+
+    content = args.image.read_bytes()
+    rng = random.Random(args.seed)
+    status, upload = _request(
+        args.url,
+        "POST",
+        "/grimoire/uploads",
+        json.dumps({"filename": args.image.name, "size": len(content)}).encode("utf-8"),
+        {"Content-Type": "application/json"},
+    )
+    if status != 201:
+        print(f"Create failed ({status}): {upload}", file=sys.stderr)
+        return 1
+    upload_path = f"/grimoire/uploads/{upload['uploadId']}"
+    chunk_bytes = args.chunk_kb * 1024
+    offset = 0
+    drops = 0
+    puts = 0
+    while offset < len(content):
+        chunk = content[offset : offset + chunk_bytes]
+        query = "?" + urlencode({"offset": offset})
+        puts += 1
+        if rng.random() < args.drop_rate:
+            drops += 1
+            _send_partial(args.url, upload_path + query, chunk, rng.uniform(0.1, 0.9))
+            status, upload = _request(args.url, "GET", upload_path)
+            if status != 200:
+                print(f"Resume failed ({status}): {upload}", file=sys.stderr)
+                return 1
+            print(f"dropped at {offset + len(chunk)}, server has {upload['offset']}; resuming")
+        else:
+            status, upload = _request(
+                args.url, "PUT", upload_path + query, chunk, {"Content-Type": "application/octet-stream"}
+            )
+            if status != 200:
+                print(f"Chunk at {offset} failed ({status}): {upload}", file=sys.stderr)
+                return 1
+        offset = upload["offset"]
+
+    params = {k: v for k, v in (("server_id", args.server_id), ("game_id", args.game_id)) if v}
+    query = "?" + urlencode(params) if params else ""
+    status, result = _request(args.url, "POST", upload_path + "/finalize" + query)
+    print(f"{len(content)} bytes in {puts} PUTs ({drops} dropped); finalize {status}")
+    print(json.dumps(result, indent=2))
+    return 0 if status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Scan a directory tree of grimoire photos offline, in parallel, into JSONL.
+
+Run from backend dir:
+    python -m app.tools.scan PHOTOS_DIR [--out scans.jsonl] [--workers 4] [--matcher orb] [--profile balanced]
+
+Every image under PHOTOS_DIR (jpg, jpeg, png, any depth) goes through the same stage
+engine as an upload (decode, detect, sort, crop, names, match, ...), built from the same
+pipeline profile (--profile, as ?profile=), in a pool of worker processes. One JSON line
+per image is appended to --out: the Town Square state, per-token confidences and
+per-stage timings, or the error. Images that finished are
+listed in a progress manifest (--out + ".manifest"); rerunning the same command after a
+crash or Ctrl-C skips them and drops any output line that was not recorded as finished.
+--restart ignores the manifest and starts over. Failed images are not recorded, so a
+rerun retries them.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import cv2
+
+from app.config import DETECTED_TOKENS_DIR, PIPELINE_PROFILES_FILE, REF_IMAGES_DIR, SCAN_MEMORY_PER_SCAN_MB
+from app.services.grimoire_stages import PARSED_TOKENS, SEATS, TOWN_SQUARE, build_grimoire_engine
+from app.services.memory_budget import plan_scan, read_image_size
+from app.services.pipeline_engine import StageError, StageRecord
+from app.services.pipeline_profiles import DEFAULT_PROFILE, ProfileServices, resolve_profiles
+from app.services.token_detector import TokenDetector
+from app.services.token_processor import TokenProcessor
+from app.tools.benchmark import MATCHER_FACTORIES
+from app.utils.character_matcher import get_script_roles
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+# Restart workers after this many images, so allocator growth from large photos is returned
+TASKS_PER_WORKER = 50
+
+# Per-process pipeline, built once by _init_worker
+_worker: Dict[str, object] = {}
+
+
+def find_images(root: Path) -> List[Path]:
+    """Image files under root (recursive), sorted, as paths relative to root."""
+    return sorted(
+        p.relative_to(root) for p in root.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+
+def _init_worker(root: str, matcher_name: str, profile_name: str) -> None:
+    # One process per core already; OpenCV's own threads would only oversubscribe
+    cv2.setNumThreads(1)
+    token_detector = TokenDetector(min_radius_cm=1, max_radius_cm=3.5)
+    profile = ProfileServices.build(
+        profile_name, resolve_profiles(PIPELINE_PROFILES_FILE)[profile_name], REF_IMAGES_DIR
+    )
+    # As the API: ORB is the profile's, the other backends have no profile knobs
+    if matcher_name == "orb":
+        matcher = profile.orb_matcher
+    else:
+        matcher = MATCHER_FACTORIES[matcher_name](REF_IMAGES_DIR)
+    _worker.update(
+        root=Path(root),
+        profile=profile,
+        # Same stage graph as uploads, run stage by stage; every image is new, so no cache
+        engine=build_grimoire_engine(
+            profile.circle_detector,
+            TokenProcessor(token_detector, DETECTED_TOKENS_DIR),
+            profile.player_name_extractor,
+            matcher,
+            matcher_version=matcher_name,
+        ),
+        script_roles=get_script_roles("bmr"),
+    )
+
+
+def scan_image(relative: str) -> dict:
+    """Scan one image in a worker; returns its JSONL record (never raises)."""
+    record: dict = {"image": relative}
+    timings: Dict[str, float] = {}
+    try:
+        start = time.perf_counter()
+        content = (_worker["root"] / relative).read_bytes()
+        size = read_image_size(content)
+        if size is None:
+            raise ValueError("unreadable image")
+        plan = plan_scan([size], SCAN_MEMORY_PER_SCAN_MB * 1024 * 1024, content_bytes=len(content))
+        if plan is None:
+            raise ValueError(f"image too large ({size[0]}x{size[1]})")
+        timings["read"] = (time.perf_counter() - start) * 1000
+        # The memory-planned scale, capped by the profile's, as uploads use it
+        detection_scale = min(plan.detection_scale, _worker["profile"].params.detection_scale)
+
+        def collect(stage_record: StageRecord) -> None:
+            timings[stage_record.stage] = stage_record.duration_ms
+
+        run = _worker["engine"].run(
+            {
+                "content": content,
+                "detection_scale": detection_scale,
+                "roster": None,
+                "script_roles": _worker["script_roles"],
+            },
+            targets=[TOWN_SQUARE],
+            sink=collect,
+        )
+        record.update(
+            status="ok",
+            detection_scale=detection_scale,
+            detected_tokens=len(run.values[SEATS]),
+            town_square=run.values[TOWN_SQUARE].model_dump(mode="json"),
+            tokens=[t.model_dump(mode="json") for t in run.values[PARSED_TOKENS]],
+        )
+    except StageError as e:
+        record.update(status="error", error=f"{e.stage}: {type(e.cause).__name__}: {e.cause}")
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["timings_ms"] = {stage: round(ms, 1) for stage, ms in timings.items()}
+    record["total_ms"] = round(sum(timings.values()), 1)
+    return record
+
+
+def _read_manifest(manifest: Path) -> Set[str]:
+    if not manifest.exists():
+        return set()
+    return {line.strip() for line in manifest.read_text(encoding="utf-8").splitlines() if line.strip()}
+
+
+def _compact_output(out: Path, finished: Set[str]) -> None:
+    """
+    Keep only output lines of finished images (once each): drops error records, which are
+    retried, and anything written after the manifest's last entry (including a line cut
+    off by a crash).
+    """
+    if not out.exists():
+        return
+    kept: Dict[str, str] = {}
+    for line in out.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("image") in finished and record.get("status") == "ok":
+            kept[record["image"]] = line
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.write_text("".join(line + "\n" for line in kept.values()), encoding="utf-8")
+    os.replace(tmp, out)
+
+
+def run_scan(
+    root: Path,
+    out: Path,
+    workers: int,
+    matcher_name: str,
+    restart: bool = False,
+    profile_name: str = DEFAULT_PROFILE,
+) -> dict:
+    """Scan every unfinished image under root into out; returns a summary."""
+    manifest = out.with_name(out.name + ".manifest")
+    if restart:
+        for path in (out, manifest):
+            path.unlink(missing_ok=True)
+    finished = _read_manifest(manifest)
+    _compact_output(out, finished)
+
+    images = [str(p) for p in find_images(root)]
+    todo = [p for p in images if p not in finished]
+    summary = {"images": len(images), "skipped": len(images) - len(todo), "ok": 0, "errors": 0}
+    print(
+        f"{len(images)} images, {summary['skipped']} already done, {len(todo)} to scan with "
+        f"{workers} worker(s), profile {profile_name}",
+        file=sys.stderr,
+    )
+    if not todo:
+        return summary
+
+    start = time.perf_counter()
+    with open(out, "a", encoding="utf-8") as out_f, open(manifest, "a", encoding="utf-8") as manifest_f:
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(str(root), matcher_name, profile_name),
+            maxtasksperchild=TASKS_PER_WORKER,
+        ) as pool:
+            for done, record in enumerate(pool.imap_unordered(scan_image, todo), 1):
+                # The record is on disk before the image counts as finished
+                out_f.write(json.dumps(record) + "\n")
+                out_f.flush()
+                os.fsync(out_f.fileno())
+                if record["status"] == "ok":
+                    manifest_f.write(record["image"] + "\n")
+                    manifest_f.flush()
+                    summary["ok"] += 1
+                    detail = f"{record['detected_tokens']} tokens in {record['total_ms']:.0f} ms"
+                else:
+                    summary["errors"] += 1
+                    detail = record["error"]
+                print(f"[{done}/{len(todo)}] {record['image']}: {detail}", file=sys.stderr)
+    summary["seconds"] = round(time.perf_counter() - start, 1)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("root", type=Path, help="Directory of grimoire photos (searched recursively)")
+    parser.add_argument("--out", type=Path, default=Path("scans.jsonl"), help="JSONL output file")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(os.cpu_count() or 1, 4),
+        help="Worker processes (default: CPU count, at most 4)",
+    )
+    parser.add_argument("--matcher", choices=sorted(MATCHER_FACTORIES), default="orb", help="Character matcher")
+    parser.add_argument(
+        "--profile",
+        choices=sorted(resolve_profiles(PIPELINE_PROFILES_FILE)),
+        default=DEFAULT_PROFILE,
+        help="Pipeline profile, as ?profile= on the scan routes",
+    )
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress manifest and start over")
+    args = parser.parse_args(argv)
+
+    if not args.root.is_dir():
+        parser.error(f"{args.root} is not a directory")
+    try:
+        summary = run_scan(
+            args.root.resolve(),
+            args.out,
+            max(1, args.workers),
+            args.matcher,
+            restart=args.restart,
+            profile_name=args.profile,
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume.", file=sys.stderr)
+        return 130
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
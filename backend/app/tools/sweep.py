@@ -0,0 +1,270 @@
+"""
+Sweep pipeline parameters on a labelled image set and report the speed/accuracy Pareto frontier.
+
+Run from backend dir:
+    python -m app.tools.sweep [--labels test_images/labels.json] [--random 40] [--export-profiles]
+    python -m app.tools.sweep --param nfeatures=300,500,800 --param detection_scale=0.5,1
+
+Every configuration (a PipelineParams, see pipeline_profiles) runs the whole single-image
+pipeline on each labelled image, stage by stage and uncached, and is scored on latency
+(ms per image) and accuracy (characters right per labelled seat; missed seats count as
+wrong, as in app.tools.benchmark). --param NAME=V1,V2,... replaces a knob's values in the
+default grid; knobs not in the grid keep their defaults. With --random N, N configurations
+are sampled from the grid instead of trying all of them.
+
+Writes every configuration and the Pareto frontier (no other configuration is both
+faster and at least as accurate) to --json, and the frontier to --csv. --export-profiles
+saves the frontier's fastest, most accurate and best-balanced configurations as the
+"fast", "accurate" and "balanced" profiles (default file: PIPELINE_PROFILES_FILE).
+"""
+import argparse
+import csv
+import itertools
+import json
+import random
+import sys
+import time
+from dataclasses import fields
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import DETECTED_TOKENS_DIR, PIPELINE_PROFILES_FILE, REF_IMAGES_DIR, SCAN_MEMORY_PER_SCAN_MB
+from app.services.grimoire_stages import PARSED_TOKENS, build_grimoire_engine
+from app.services.memory_budget import plan_scan, read_image_size
+from app.services.orb_matcher import ORBMatcher
+from app.services.pipeline_engine import StageError
+from app.services.pipeline_profiles import PipelineParams, save_profiles
+from app.services.token_detector import TokenDetector
+from app.services.token_processor import TokenProcessor
+from app.tools.benchmark import DEFAULT_LABELS, LabelledImage, load_labels
+from app.utils.character_matcher import role_id
+
+# Values tried per knob when no --param is given
+DEFAULT_GRID: Dict[str, List[float]] = {
+    "detection_scale": [0.5, 0.75, 1.0],
+    "hough_param2": [25, 30, 35],
+    "nfeatures": [250, 500, 800],
+    "match_size": [160, 200],
+    "ratio_threshold": [0.7, 0.75, 0.8],
+    "max_ocr_scale": [2.0, 4.0],
+}
+
+PARAM_NAMES = [f.name for f in fields(PipelineParams)]
+
+
+def parse_grid(overrides: Sequence[str], base: Optional[Dict[str, List[float]]] = None) -> Dict[str, List[float]]:
+    """Grid with NAME=V1,V2,... overrides applied; raises ValueError on unknown names."""
+    grid = dict(DEFAULT_GRID if base is None else base)
+    for item in overrides:
+        name, _, values = item.partition("=")
+        name = name.strip()
+        if name not in PARAM_NAMES:
+            raise ValueError(f"Unknown parameter {name!r} (known: {', '.join(PARAM_NAMES)})")
+        try:
+            grid[name] = [float(v) for v in values.split(",") if v.strip()]
+        except ValueError:
+            raise ValueError(f"Invalid values for {name}: {values!r}")
+        if not grid[name]:
+            raise ValueError(f"No values for {name}")
+    return grid
+
+
+def grid_configs(grid: Dict[str, List[float]], sample: Optional[int] = None, seed: int = 0) -> List[PipelineParams]:
+    """Every combination of the grid's values, or `sample` of them drawn at random."""
+    names = sorted(grid)
+    combos = list(itertools.product(*(grid[name] for name in names)))
+    if sample is not None and sample < len(combos):
+        combos = random.Random(seed).sample(combos, sample)
+    return [PipelineParams.from_dict(dict(zip(names, combo))) for combo in combos]
+
+
+def _score_tokens(parsed, labels: List[dict]) -> Tuple[int, int, int]:
+    """(characters right, names labelled, names right) comparing seats by position."""
+    correct = names_labelled = names_correct = 0
+    for token, label in zip(parsed, labels):
+        if token.character and role_id(token.character) == role_id(label["character"]):
+            correct += 1
+        if label.get("player_name"):
+            names_labelled += 1
+            if (token.player_name or "").casefold() == label["player_name"].casefold():
+                names_correct += 1
+    return correct, names_labelled, names_correct
+
+
+def evaluate(
+    params: PipelineParams,
+    images: List[Tuple[LabelledImage, bytes]],
+    matchers: Dict[str, ORBMatcher],
+    ref_images_dir: Path = REF_IMAGES_DIR,
+    repeat: int = 1,
+) -> dict:
+    """Run one configuration over the images; returns its parameters and scores."""
+    key = params.matcher_version()
+    if key not in matchers:
+        matchers[key] = params.build_orb_matcher(ref_images_dir)
+    engine = build_grimoire_engine(
+        params.build_circle_detector(),
+        TokenProcessor(TokenDetector(min_radius_cm=1, max_radius_cm=3.5), DETECTED_TOKENS_DIR),
+        params.build_name_extractor(),
+        matchers[key],
+        matcher_version=params.matcher_version(),
+    )
+    seats = detected = correct = names_labelled = names_correct = errors = 0
+    latencies: List[float] = []
+    for item, content in images:
+        size = read_image_size(content)
+        plan = plan_scan([size], SCAN_MEMORY_PER_SCAN_MB * 1024 * 1024, content_bytes=len(content)) if size else None
+        seats += len(item.tokens)
+        if plan is None:
+            errors += 1
+            continue
+        inputs = {
+            "content": content,
+            "detection_scale": min(plan.detection_scale, params.detection_scale),
+            "roster": None,
+            "script_roles": None,
+        }
+        runs_ms = []
+        try:
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                run = engine.run(inputs, targets=[PARSED_TOKENS])
+                runs_ms.append((time.perf_counter() - start) * 1000)
+        except StageError:
+            errors += 1
+            continue
+        latencies.append(float(np.median(runs_ms)))
+        parsed = run.values[PARSED_TOKENS]
+        detected += min(len(parsed), len(item.tokens))
+        c, nl, nc = _score_tokens(parsed, item.tokens)
+        correct += c
+        names_labelled += nl
+        names_correct += nc
+    return {
+        **params.to_dict(),
+        "accuracy": round(correct / seats, 4) if seats else None,
+        "detection_recall": round(detected / seats, 4) if seats else None,
+        "name_accuracy": round(names_correct / names_labelled, 4) if names_labelled else None,
+        "ms_per_image": round(float(np.mean(latencies)), 1) if latencies else None,
+        "p95_ms_per_image": round(float(np.percentile(latencies, 95)), 1) if latencies else None,
+        "errors": errors,
+    }
+
+
+def pareto_frontier(results: List[dict]) -> List[dict]:
+    """
+    Results no other result dominates (at least as fast and as accurate, better in one),
+    fastest first. Results that failed on every image are left out.
+    """
+    scored = [r for r in results if r["ms_per_image"] is not None and r["accuracy"] is not None]
+    frontier = [
+        r
+        for r in scored
+        if not any(
+            o["ms_per_image"] <= r["ms_per_image"]
+            and o["accuracy"] >= r["accuracy"]
+            and (o["ms_per_image"] < r["ms_per_image"] or o["accuracy"] > r["accuracy"])
+            for o in scored
+        )
+    ]
+    return sorted(frontier, key=lambda r: (r["ms_per_image"], -r["accuracy"]))
+
+
+def pick_profiles(frontier: List[dict]) -> Dict[str, PipelineParams]:
+    """
+    fast: fastest frontier configuration; accurate: most accurate (fastest among ties);
+    balanced: closest to the ideal corner once latency and accuracy are scaled to [0, 1].
+    """
+    if not frontier:
+        return {}
+    lat = np.array([r["ms_per_image"] for r in frontier], dtype=np.float64)
+    acc = np.array([r["accuracy"] for r in frontier], dtype=np.float64)
+    lat_n = (lat - lat.min()) / (np.ptp(lat) or 1.0)
+    acc_n = (acc - acc.min()) / (np.ptp(acc) or 1.0)
+    picks = {
+        "fast": 0,
+        "accurate": max(range(len(frontier)), key=lambda i: (acc[i], -lat[i])),
+        "balanced": int(np.argmin(np.hypot(lat_n, 1.0 - acc_n))),
+    }
+    return {
+        name: PipelineParams.from_dict({k: frontier[i][k] for k in PARAM_NAMES}) for name, i in picks.items()
+    }
+
+
+def write_csv(path: Path, rows: List[dict]) -> None:
+    metrics = ["accuracy", "detection_recall", "name_accuracy", "ms_per_image", "p95_ms_per_image", "errors"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=PARAM_NAMES + metrics)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS, help="Labels JSON file")
+    parser.add_argument(
+        "--param", action="append", default=[], metavar="NAME=V1,V2", help="Values to try for a knob (repeatable)"
+    )
+    parser.add_argument("--random", type=int, default=None, metavar="N", help="Sample N configurations from the grid")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --random")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per image (median latency is kept)")
+    parser.add_argument("--json", type=Path, default=Path("sweep.json"), help="JSON report (all configurations)")
+    parser.add_argument("--csv", type=Path, default=Path("sweep.csv"), help="CSV of the Pareto frontier")
+    parser.add_argument(
+        "--export-profiles",
+        type=Path,
+        nargs="?",
+        const=PIPELINE_PROFILES_FILE,
+        default=None,
+        metavar="PATH",
+        help=f"Save fast/balanced/accurate profiles (default path: {PIPELINE_PROFILES_FILE.name})",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        grid = parse_grid(args.param)
+    except ValueError as e:
+        parser.error(str(e))
+    configs = grid_configs(grid, args.random, args.seed)
+    labelled = load_labels(args.labels)
+    images = [(item, item.path.read_bytes()) for item in labelled if item.path.exists()]
+    if not images:
+        parser.error(f"no readable images in {args.labels}")
+    print(f"{len(configs)} configurations x {len(images)} images", file=sys.stderr)
+
+    matchers: Dict[str, ORBMatcher] = {}
+    results = []
+    for done, params in enumerate(configs, 1):
+        result = evaluate(params, images, matchers, repeat=args.repeat)
+        results.append(result)
+        print(
+            f"[{done}/{len(configs)}] accuracy={result['accuracy']} ms/image={result['ms_per_image']} "
+            + " ".join(f"{k}={result[k]}" for k in sorted(grid)),
+            file=sys.stderr,
+        )
+
+    frontier = pareto_frontier(results)
+    report = {
+        "labels": str(args.labels),
+        "images": len(images),
+        "grid": grid,
+        "configurations": results,
+        "pareto": frontier,
+    }
+    args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    write_csv(args.csv, frontier)
+    print(f"{'ms/image':>10}{'accuracy':>10}  parameters")
+    for r in frontier:
+        print(f"{r['ms_per_image']:>10.1f}{r['accuracy']:>10.3f}  " + " ".join(f"{k}={r[k]}" for k in sorted(grid)))
+
+    if args.export_profiles:
+        profiles = pick_profiles(frontier)
+        save_profiles(args.export_profiles, profiles)
+        print(f"Saved profiles {', '.join(sorted(profiles))} to {args.export_profiles}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
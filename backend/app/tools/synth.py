@@ -0,0 +1,314 @@
+"""
+Generate synthetic grimoire images with ground truth, as a scalable benchmark workload.
+
+Run from backend dir:
+    python -m app.tools.synth --out synth --count 20 [--players 5-20] [--size 1920x1080,3840x2160]
+    python -m app.tools.benchmark --labels synth/labels.json
+
+Each image places reference tokens (ref-images, alive or -dead variants) around an
+elliptical ring with a name label under every seat (assets/fonts), the script logo in the
+middle and optional clutter, then applies per-token rotation and whole-image lighting,
+blur and noise. --rotation, --blur, --noise and --lighting are maxima: each image draws
+its own value up to them, recorded under "synthetic" in its labels entry.
+
+Writes the images and labels.json in the benchmark's labels format (tokens in reading
+order, see sort_circles_reading_order), so app.tools.benchmark and app.tools.sweep take
+the output directory as is. Tokens keep the on-screen size of a full-resolution capture
+(--token-radius) whatever the canvas size, as the detector and name offsets expect.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from app.config import ASSETS_DIR, REF_IMAGES_DIR
+from app.services.player_name_extractor import NAME_REGION_HEIGHT, NAME_REGION_OFFSET_Y, NAME_REGION_WIDTH
+from app.utils.character_matcher import DEAD_SUFFIX, character_name_key, role_id
+from app.utils.circle_order import sort_circles_reading_order
+
+FONT_PATH = ASSETS_DIR / "fonts" / "papyrus.ttf"
+LOGO_PATH = ASSETS_DIR / "images" / "bmr.png"
+
+# On-screen token radius (px) in full-resolution captures
+TOKEN_RADIUS = 64
+
+# Gap (px) kept between neighbouring seats, token or name label, whichever is wider
+SEAT_GAP = 12
+
+PLAYER_NAMES = [
+    "Ash", "Bea", "Cass", "Dex", "Eli", "Fern", "Gus", "Hana", "Ivo", "Jun", "Kit", "Lark",
+    "Milo", "Nia", "Otto", "Pip", "Quinn", "Rey", "Sol", "Tess", "Uma", "Vik", "Wren", "Xan",
+    "Yuki", "Zed", "Koruto", "Maglev", "Twob", "Commando", "WinterBed", "Keira", "Pearl", "Beep",
+]
+
+
+class RefToken:
+    """A reference token image (BGRA) and where its circle is."""
+
+    def __init__(self, path: Path):
+        self.image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        if self.image is None or self.image.ndim != 3 or self.image.shape[2] != 4:
+            raise ValueError(f"{path}: expected a PNG with alpha")
+        ys = np.flatnonzero(self.image[..., 3].max(axis=1) > 10)
+        w = self.image.shape[1]
+        # Full width is the token's diameter; anything above it (the reminder leaf) sits on top
+        self.radius = w / 2.0
+        self.center = (w / 2.0, ys[-1] + 1 - self.radius)
+
+
+def load_ref_tokens(ref_images_dir: Path) -> Dict[str, Dict[bool, Path]]:
+    """Role id -> {is_dead: ref image path} for every reference image."""
+    roles: Dict[str, Dict[bool, Path]] = defaultdict(dict)
+    for path in sorted(Path(ref_images_dir).glob("*.png")):
+        roles[role_id(path.stem)][character_name_key(path.stem).endswith(DEAD_SUFFIX)] = path
+    return dict(roles)
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+
+def parse_range(text: str) -> Tuple[int, int]:
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+
+def ring_positions(n: int, size: Tuple[int, int], radius: int) -> List[Tuple[float, float]]:
+    """
+    n seat centres evenly spaced (by arc length) on an ellipse inset from the canvas edges,
+    clockwise from the top. Raises ValueError when the seats would overlap.
+    """
+    w, h = size
+    margin_x = max(NAME_REGION_WIDTH / 2, radius) + SEAT_GAP
+    margin_bottom = NAME_REGION_OFFSET_Y + NAME_REGION_HEIGHT / 2 + SEAT_GAP
+    cx, rx = w / 2, w / 2 - margin_x
+    top, bottom = radius + SEAT_GAP, h - margin_bottom
+    cy, ry = (top + bottom) / 2, (bottom - top) / 2
+    if rx <= 0 or ry <= 0:
+        raise ValueError(f"{w}x{h} is too small for tokens of radius {radius}")
+    t = np.linspace(-np.pi / 2, 3 * np.pi / 2, 2048, endpoint=False)
+    pts = np.stack([cx + rx * np.cos(t), cy + ry * np.sin(t)], axis=1)
+    steps = np.hypot(*np.diff(np.vstack([pts, pts[:1]]), axis=0).T)
+    arc = np.concatenate([[0.0], np.cumsum(steps)[:-1]])
+    spacing = (arc[-1] + steps[-1]) / n
+    needed = max(2 * radius, NAME_REGION_WIDTH) + SEAT_GAP
+    if spacing < needed:
+        raise ValueError(f"{n} players do not fit on a {w}x{h} canvas (need a larger --size)")
+    idx = np.searchsorted(arc, np.arange(n) * spacing)
+    return [(float(pts[i, 0]), float(pts[i, 1])) for i in idx]
+
+
+def _blend(canvas: np.ndarray, patch: np.ndarray, x0: int, y0: int) -> None:
+    """Alpha-blend a BGRA patch onto the BGR canvas at (x0, y0), clipped to the canvas."""
+    h, w = canvas.shape[:2]
+    x1, y1 = max(x0, 0), max(y0, 0)
+    x2, y2 = min(x0 + patch.shape[1], w), min(y0 + patch.shape[0], h)
+    if x1 >= x2 or y1 >= y2:
+        return
+    src = patch[y1 - y0 : y2 - y0, x1 - x0 : x2 - x0].astype(np.float32)
+    alpha = src[..., 3:] / 255.0
+    region = canvas[y1:y2, x1:x2].astype(np.float32)
+    canvas[y1:y2, x1:x2] = (src[..., :3] * alpha + region * (1.0 - alpha)).astype(np.uint8)
+
+
+def place_token(canvas: np.ndarray, token: RefToken, x: float, y: float, radius: int, angle: float) -> None:
+    """Draw the token scaled to radius and rotated by angle (degrees) about its centre."""
+    scale = radius / token.radius
+    half = int(np.ceil(radius * 1.3))
+    m = cv2.getRotationMatrix2D(token.center, angle, scale)
+    m[0, 2] += half - token.center[0]
+    m[1, 2] += half - token.center[1]
+    patch = cv2.warpAffine(
+        token.image, m, (2 * half, 2 * half), flags=cv2.INTER_AREA, borderMode=cv2.BORDER_CONSTANT, borderValue=0
+    )
+    _blend(canvas, patch, int(round(x)) - half, int(round(y)) - half)
+
+
+def _background(rng: np.random.Generator, size: Tuple[int, int]) -> np.ndarray:
+    """Dark, low-frequency mottled backdrop (a night scene or a table top)."""
+    w, h = size
+    base = rng.uniform(20, 70, size=3)
+    blobs = cv2.resize(rng.uniform(-25, 25, size=(9, 16)).astype(np.float32), (w, h), interpolation=cv2.INTER_CUBIC)
+    blobs = blobs[..., None]
+    grain = rng.normal(0, 6, size=(h // 4 + 1, w // 4 + 1, 3)).astype(np.float32)
+    grain = cv2.resize(grain, (w, h), interpolation=cv2.INTER_LINEAR)
+    return np.clip(base + blobs + grain, 0, 255).astype(np.uint8)
+
+
+def _clutter(rng: np.random.Generator, canvas: np.ndarray, count: int) -> None:
+    """Random lines, boxes and ellipses (cups, dice, cards) in muted colours."""
+    h, w = canvas.shape[:2]
+    for _ in range(count):
+        color = tuple(int(c) for c in rng.uniform(30, 180, size=3))
+        x, y = int(rng.uniform(0, w)), int(rng.uniform(0, h))
+        kind = rng.integers(3)
+        if kind == 0:
+            cv2.line(canvas, (x, y), (int(rng.uniform(0, w)), int(rng.uniform(0, h))), color, int(rng.integers(1, 6)))
+        elif kind == 1:
+            bw, bh = (int(v) for v in rng.uniform(20, 160, size=2))
+            cv2.rectangle(canvas, (x, y), (x + bw, y + bh), color, -1 if rng.random() < 0.5 else 3)
+        else:
+            axes = tuple(int(v) for v in rng.uniform(10, 90, size=2))
+            cv2.ellipse(canvas, (x, y), axes, float(rng.uniform(0, 180)), 0, 360, color, -1 if rng.random() < 0.5 else 2)
+
+
+def _draw_labels(canvas: np.ndarray, seats: Sequence[Tuple[float, float, str]], font: ImageFont.ImageFont) -> np.ndarray:
+    """Name labels (dark box, light text) centred NAME_REGION_OFFSET_Y below each seat."""
+    img = Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(img)
+    for x, y, name in seats:
+        cy = y + NAME_REGION_OFFSET_Y
+        box_w, box_h = NAME_REGION_WIDTH * 0.5, NAME_REGION_HEIGHT * 0.8
+        draw.rounded_rectangle(
+            (x - box_w / 2 - 4, cy - box_h / 2, x + box_w / 2 + 4, cy + box_h / 2), radius=4, fill=(32, 34, 40)
+        )
+        draw.text((x, cy), name, font=font, fill=(235, 235, 235), anchor="mm")
+    return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+
+def _lighting(rng: np.random.Generator, canvas: np.ndarray, strength: float) -> np.ndarray:
+    """Directional falloff plus a global exposure change, both up to `strength`."""
+    if strength <= 0:
+        return canvas
+    h, w = canvas.shape[:2]
+    angle = rng.uniform(0, 2 * np.pi)
+    xs = np.linspace(-0.5, 0.5, w, dtype=np.float32)
+    ys = np.linspace(-0.5, 0.5, h, dtype=np.float32)
+    ramp = np.cos(angle) * xs[None, :] + np.sin(angle) * ys[:, None]
+    gain = (1.0 + strength * 1.5 * ramp) * (1.0 + rng.uniform(-strength, strength) * 0.5)
+    return np.clip(canvas.astype(np.float32) * gain[..., None], 0, 255).astype(np.uint8)
+
+
+def render_grimoire(
+    rng: np.random.Generator,
+    refs: Dict[str, Dict[bool, Path]],
+    ref_cache: Dict[Path, RefToken],
+    font: ImageFont.ImageFont,
+    players: int,
+    size: Tuple[int, int],
+    token_radius: int = TOKEN_RADIUS,
+    rotation: float = 0.0,
+    blur: float = 0.0,
+    noise: float = 0.0,
+    lighting: float = 0.0,
+    clutter: int = 0,
+    dead_rate: float = 0.0,
+) -> Tuple[np.ndarray, List[dict], dict]:
+    """One synthetic grimoire: (BGR image, labelled tokens in reading order, applied settings)."""
+    w, h = size
+    positions = ring_positions(players, size, token_radius)
+    canvas = _background(rng, size)
+    if clutter:
+        _clutter(rng, canvas, clutter)
+    if LOGO_PATH.exists():
+        logo = cv2.imread(str(LOGO_PATH), cv2.IMREAD_UNCHANGED)
+        side = int(min(w, h) * 0.25)
+        _blend(canvas, cv2.resize(logo, (side, side), interpolation=cv2.INTER_AREA), w // 2 - side // 2, h // 2 - side // 2)
+
+    roles = rng.choice(sorted(refs), size=players, replace=players > len(refs))
+    names = rng.choice(PLAYER_NAMES, size=players, replace=players > len(PLAYER_NAMES))
+    seats = []
+    for (x, y), role, name in zip(positions, roles, names):
+        variants = refs[role]
+        # Roles with a single ref image are drawn in whichever state that image shows
+        is_dead = bool(rng.random() < dead_rate) if len(variants) > 1 else True in variants
+        path = variants[is_dead]
+        if path not in ref_cache:
+            ref_cache[path] = RefToken(path)
+        place_token(canvas, ref_cache[path], x, y, token_radius, float(rng.uniform(-rotation, rotation)))
+        seats.append({"x": x, "y": y, "character": str(role), "player_name": str(name), "is_dead": is_dead})
+
+    canvas = _draw_labels(canvas, [(s["x"], s["y"], s["player_name"]) for s in seats], font)
+    applied = {
+        "size": f"{w}x{h}",
+        "players": players,
+        "token_radius": token_radius,
+        "rotation": rotation,
+        "blur": round(float(rng.uniform(0, blur)), 2),
+        "noise": round(float(rng.uniform(0, noise)), 2),
+        "lighting": round(float(rng.uniform(0, lighting)), 2),
+        "clutter": clutter,
+    }
+    canvas = _lighting(rng, canvas, applied["lighting"])
+    if applied["blur"] > 0:
+        canvas = cv2.GaussianBlur(canvas, (0, 0), applied["blur"])
+    if applied["noise"] > 0:
+        canvas = np.clip(canvas + rng.normal(0, applied["noise"], canvas.shape), 0, 255).astype(np.uint8)
+
+    # Label order must follow the pipeline's reading order of the same centres
+    by_center = {(int(round(s["x"])), int(round(s["y"]))): s for s in seats}
+    order = sort_circles_reading_order([(cx, cy, token_radius) for cx, cy in by_center])
+    tokens = [
+        {k: by_center[(cx, cy)][k] for k in ("character", "player_name", "is_dead")} for cx, cy, _ in order
+    ]
+    return canvas, tokens, applied
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--out", type=Path, default=Path("synth"), help="Output directory (images + labels.json)")
+    parser.add_argument("--count", type=int, default=10, help="Images to generate")
+    parser.add_argument("--players", default="5-15", help="Players per image, N or MIN-MAX")
+    parser.add_argument(
+        "--size", default="1920x1080", help="Canvas size WxH; comma-separated sizes are cycled through"
+    )
+    parser.add_argument("--token-radius", type=int, default=TOKEN_RADIUS, help="Token radius in pixels")
+    parser.add_argument("--rotation", type=float, default=0.0, help="Max per-token rotation (degrees, +/-)")
+    parser.add_argument("--blur", type=float, default=0.0, help="Max Gaussian blur sigma")
+    parser.add_argument("--noise", type=float, default=0.0, help="Max Gaussian noise std (grey levels)")
+    parser.add_argument("--lighting", type=float, default=0.0, help="Max lighting gradient / exposure strength (0-1)")
+    parser.add_argument("--clutter", type=int, default=0, help="Distractor shapes per image")
+    parser.add_argument("--dead-rate", type=float, default=0.2, help="Fraction of tokens drawn dead")
+    parser.add_argument("--format", choices=["png", "jpg"], default="png", help="Image format")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [parse_size(s) for s in args.size.split(",") if s.strip()]
+        low, high = parse_range(args.players)
+    except ValueError:
+        parser.error("--size takes WxH[,WxH...] and --players N or MIN-MAX")
+    refs = load_ref_tokens(REF_IMAGES_DIR)
+    if not refs:
+        parser.error(f"no reference images in {REF_IMAGES_DIR}")
+    font = ImageFont.truetype(str(FONT_PATH), 22)
+    rng = np.random.default_rng(args.seed)
+    ref_cache: Dict[Path, RefToken] = {}
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for i in range(args.count):
+        size = sizes[i % len(sizes)]
+        players = int(rng.integers(low, high + 1))
+        try:
+            image, tokens, applied = render_grimoire(
+                rng, refs, ref_cache, font, players, size,
+                token_radius=args.token_radius,
+                rotation=args.rotation,
+                blur=args.blur,
+                noise=args.noise,
+                lighting=args.lighting,
+                clutter=args.clutter,
+                dead_rate=args.dead_rate,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        name = f"synth-{i + 1:04d}.{args.format}"
+        cv2.imwrite(str(args.out / name), image)
+        entries.append({"image": name, "tokens": tokens, "synthetic": applied})
+        print(f"[{i + 1}/{args.count}] {name}: {players} players, {applied['size']}", file=sys.stderr)
+
+    (args.out / "labels.json").write_text(json.dumps(entries, indent=2), encoding="utf-8")
+    print(f"Wrote {len(entries)} images and {args.out / 'labels.json'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Request body size limits for upload routes, enforced while the body streams in.
+A declared Content-Length over the limit is refused before any of the body is read;
+a chunked body is cut off with 413 as soon as it passes the limit, instead of being
+buffered in full and rejected afterwards. Upload routes then read each file with
+read_upload, which checks its type by magic bytes and its size chunk by chunk.
+"""
+import json
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import ALLOWED_IMAGE_TYPES, MAX_UPLOAD_MB, UPLOAD_CHUNK_BYTES
+from app.utils.media_types import SNIFF_BYTES, sniff_media_type
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware limiting request bodies per path. limits maps a request path to its
+    maximum body size in bytes; other paths are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def _reject(self, send: Send, limit: int) -> None:
+        body = json.dumps(
+            {"detail": f"Upload too large (max {limit // (1024 * 1024)} MB per request)."}
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit: Optional[int] = self.limits.get(scope.get("path", "")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    # Ends the body parse; the app's resulting error response is replaced below
+                    raise ValueError("Request body exceeds upload limit")
+            return message
+
+        async def limited_send(message: Message) -> None:
+            nonlocal response_started
+            if exceeded:
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send, limit)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except ValueError:
+            if not exceeded:
+                raise
+            if not response_started:
+                await self._reject(send, limit)
+
+
+async def read_upload(
+    file: UploadFile, allowed_types: Tuple[str, ...], max_mb: int
+) -> Tuple[bytearray, str]:
+    """
+    Read an upload in UPLOAD_CHUNK_BYTES chunks into one buffer. The type is taken from
+    the leading bytes (Content-Type is not trusted): 422 if it is not in allowed_types.
+    413 as soon as more than max_mb has been read. Returns (content, sniffed type).
+    """
+    limit = max_mb * 1024 * 1024
+    if file.size is not None and file.size > limit:
+        raise HTTPException(status_code=413, detail=f"File too large (max {max_mb} MB).")
+    content = bytearray()
+    while len(content) < SNIFF_BYTES:
+        chunk = await file.read(SNIFF_BYTES - len(content))
+        if not chunk:
+            break
+        content += chunk
+    media_type = sniff_media_type(bytes(content))
+    if media_type not in allowed_types:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_types)}",
+        )
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        if len(content) + len(chunk) > limit:
+            raise HTTPException(status_code=413, detail=f"File too large (max {max_mb} MB).")
+        content += chunk
+    return content, media_type
+
+
+async def read_image_upload(file: UploadFile) -> bytearray:
+    """Read an image upload (JPEG or PNG by its magic bytes, at most MAX_UPLOAD_MB); return content."""
+    content, _ = await read_upload(file, ALLOWED_IMAGE_TYPES, MAX_UPLOAD_MB)
+    return content
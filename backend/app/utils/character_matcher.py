@@ -1,4 +1,6 @@
-from typing import List, Dict
+from typing import Dict, FrozenSet, List, Optional
+
+from app.models.schemas import DEAD_SUFFIX
 
 
 # Bad Moon Rising (BMR) character database
@@ -26,11 +28,16 @@ for char_type, char_list in CHARACTER_DATABASE.items():
     for character_name in char_list:
         _CHARACTER_TYPE_MAP[character_name] = char_type
 
+
+def character_name_key(name: str) -> str:
+    """Lowercase and strip spaces/apostrophes, the normalisation used for ref-image stems."""
+    return name.lower().replace(" ", "").replace("'", "")
+
+
 # Ref-image filename stems (e.g. exorcist, devilsadvocate) -> display name for lookup
-_REF_STEM_TO_DISPLAY: Dict[str, str] = {}
-for character_name in _CHARACTER_TYPE_MAP:
-    normalized = character_name.lower().replace(" ", "").replace("'", "")
-    _REF_STEM_TO_DISPLAY[normalized] = character_name
+_REF_STEM_TO_DISPLAY: Dict[str, str] = {
+    character_name_key(character_name): character_name for character_name in _CHARACTER_TYPE_MAP
+}
 
 # Cache all characters list since database is static
 _ALL_CHARACTERS_CACHE: List[str] = list(_CHARACTER_TYPE_MAP.keys())
@@ -38,5 +45,25 @@ _ALL_CHARACTERS_CACHE: List[str] = list(_CHARACTER_TYPE_MAP.keys())
 
 def get_character_type(character_name: str) -> str:
     """Get the type of a character (O(1) lookup). Accepts display name or ref-image stem (e.g. exorcist)."""
-    display = _REF_STEM_TO_DISPLAY.get(character_name.lower().replace(" ", "").replace("'", ""), character_name)
+    display = _REF_STEM_TO_DISPLAY.get(character_name_key(character_name), character_name)
     return _CHARACTER_TYPE_MAP.get(display, "Unknown")
+
+
+def role_id(ref_name: str) -> str:
+    """
+    Town Square style role id for a character or ref-image stem, with the dead variant
+    folded in (e.g. "Devil's Advocate", "devilsadvocate-dead" -> "devilsadvocate").
+    """
+    name = character_name_key(ref_name)
+    return name[: -len(DEAD_SUFFIX)] if name.endswith(DEAD_SUFFIX) else name
+
+
+# Role ids per edition; only Bad Moon Rising ships with reference images today.
+_SCRIPT_ROLES: Dict[str, FrozenSet[str]] = {
+    "bmr": frozenset(role_id(c) for c in _ALL_CHARACTERS_CACHE),
+}
+
+
+def get_script_roles(edition_id: str) -> Optional[FrozenSet[str]]:
+    """Role ids of a known edition (e.g. "bmr"), or None if the edition is not known here."""
+    return _SCRIPT_ROLES.get((edition_id or "").lower())
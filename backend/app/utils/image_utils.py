@@ -1,4 +1,7 @@
 """Utility functions for image processing"""
+import base64
+from typing import Optional, Tuple
+
 import cv2
 import numpy as np
 
@@ -17,3 +20,47 @@ def ensure_grayscale(image: np.ndarray) -> np.ndarray:
     if len(image.shape) == 3:
         return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     return image
+
+
+def difference_hash(image: np.ndarray, size: Tuple[int, int] = (16, 16)) -> bytes:
+    """
+    Perceptual difference hash: signs of horizontal gradients on a (width x height) grid.
+    Robust to brightness/contrast changes and small resampling differences.
+
+    Args:
+        image: Input image (BGR or grayscale)
+        size: Grid (width, height); the hash has width * height bits
+
+    Returns:
+        Packed hash bytes
+    """
+    w, h = size
+    small = cv2.resize(ensure_grayscale(image), (w + 1, h), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+
+def hamming_distance(a: bytes, b: bytes) -> int:
+    """Number of differing bits between two equal-length hashes."""
+    diff = np.bitwise_xor(np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8))
+    return int(np.unpackbits(diff).sum())
+
+
+def encode_token_crop(image: np.ndarray, size: Tuple[int, int], quality: int = 85) -> str:
+    """
+    Compact storable form of a token crop: greyscale, resized to size, JPEG, base64 text.
+    Matchers work on greyscale at a fixed size, so this keeps all they need (a few KB).
+    """
+    small = cv2.resize(ensure_grayscale(image), size, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode token crop")
+    return base64.b64encode(buf.tobytes()).decode("ascii")
+
+
+def decode_token_crop(data: str) -> Optional[np.ndarray]:
+    """Greyscale crop from encode_token_crop output, or None if it cannot be decoded."""
+    try:
+        raw = base64.b64decode(data)
+    except ValueError:
+        return None
+    return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
@@ -0,0 +1,27 @@
+"""Identify uploads by their leading bytes instead of trusting the client's Content-Type."""
+from typing import Optional
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+# EBML header (Matroska / WebM)
+WEBM_MAGIC = b"\x1a\x45\xdf\xa3"
+
+# Leading bytes needed to tell every supported type apart
+SNIFF_BYTES = 12
+
+
+def sniff_media_type(head: bytes) -> Optional[str]:
+    """
+    Media type of a file from its first SNIFF_BYTES bytes: image/jpeg, image/png,
+    video/mp4, video/quicktime or video/webm; None for anything else.
+    """
+    if head.startswith(JPEG_MAGIC):
+        return "image/jpeg"
+    if head.startswith(PNG_MAGIC):
+        return "image/png"
+    # ISO base media (MP4 / MOV): box size, then "ftyp" and the major brand
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    if head.startswith(WEBM_MAGIC):
+        return "video/webm"
+    return None
@@ -0,0 +1,66 @@
+"""
+Snap OCR'd player names to a server's known roster (names from its previous games).
+Edit distances against the whole roster are computed at once with NumPy.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Max edit distance for a snap, as a fraction of the roster name's length (min 1 edit)
+ROSTER_SNAP_MAX_RATIO = 0.34
+
+
+def _code_points(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def edit_distances(query: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    Levenshtein distance from query to every candidate, as an int array.
+
+    The DP runs one candidate character per step for all candidates at once. Within a
+    row, the insertion chain is solved with a running minimum, so no per-cell Python loop.
+    """
+    if not candidates:
+        return np.zeros(0, dtype=np.int32)
+    q = _code_points(query)
+    m = len(q)
+    lens = np.array([len(c) for c in candidates], dtype=np.int32)
+    # Pad with 0, which never equals a real character
+    padded = np.zeros((len(candidates), max(int(lens.max()), 1)), dtype=np.uint32)
+    for row, c in enumerate(candidates):
+        padded[row, : len(c)] = _code_points(c)
+
+    steps = np.arange(m + 1, dtype=np.int32)
+    dist = np.tile(steps, (len(candidates), 1))
+    result = np.full(len(candidates), m, dtype=np.int32)
+    for j in range(padded.shape[1]):
+        cost = (padded[:, j : j + 1] != q[None, :]).astype(np.int32)
+        best = np.empty_like(dist)
+        best[:, 0] = j + 1
+        best[:, 1:] = np.minimum(dist[:, 1:] + 1, dist[:, :-1] + cost)
+        # Insertions: best[i] = min_k (best[k] + i - k)
+        dist = np.minimum.accumulate(best - steps, axis=1) + steps
+        done = lens == j + 1
+        result[done] = dist[done, m]
+    return result
+
+
+def snap_to_roster(name: Optional[str], roster: Sequence[str]) -> Optional[str]:
+    """
+    Return the roster name closest to name (case-insensitive) if it is within
+    ROSTER_SNAP_MAX_RATIO edits and unambiguous; otherwise return name unchanged.
+    """
+    if not name or not roster:
+        return name
+    candidates: List[str] = list(roster)
+    distances = edit_distances(name.lower(), [c.lower() for c in candidates])
+    best = int(distances.argmin())
+    best_distance = int(distances[best])
+    allowed = max(1, int(len(candidates[best]) * ROSTER_SNAP_MAX_RATIO))
+    if best_distance > allowed:
+        return name
+    tied = {candidates[i].lower() for i in np.flatnonzero(distances == best_distance)}
+    if len(tied) > 1:
+        return name
+    return candidates[best]
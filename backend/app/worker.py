@@ -0,0 +1,172 @@
+"""
+Scan job worker: claims queued /api/grimoire/jobs from Mongo and runs them through the
+same pipeline as /api/grimoire/process, storing each result on its job.
+
+Run from backend dir (next to the API, against the same MONGODB_URI / MONGODB_DB_NAME):
+    python -m app.worker [--concurrency 1] [--once]
+
+Add processes (or machines) to scan more grimoires at once; each job runs on one worker
+at a time. A running job's lease is renewed every JOB_LEASE_S / 3 seconds; if this
+process dies, the job is claimed again once its lease runs out (up to JOB_MAX_ATTEMPTS
+runs). Errors the route would answer with a 4xx fail the job; others are retried after
+a backoff. Queue errors (e.g. Mongo briefly unreachable) are logged and retried; the
+worker keeps polling. SIGTERM / Ctrl-C stops claiming and lets running jobs finish.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+from typing import List, Optional
+
+from app.config import (
+    JOB_DEADLINE_S,
+    JOB_LEASE_S,
+    JOB_POLL_S,
+    JOB_WORKER_CONCURRENCY,
+    REF_IMAGES_DIR,
+    WARMUP_ON_STARTUP,
+)
+from app.db import connect_db, disconnect_db
+from app.dependencies import grimoire_engines, player_name_extractor, profiles, scan_jobs, warmup_state
+from app.models.schemas import JobError, ScanJobDocument
+from app.services.cancellation import LEASE_LOST, CancelToken, ScanCancelled
+from app.services.scan_flows import ScanError, run_scan_job
+from app.services.warmup import warm_up
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(levelname)s: %(asctime)s: %(name)s: %(message)s",
+)
+logger = logging.getLogger("app.worker")
+
+
+async def _keep_lease(job: ScanJobDocument, worker_id: str, cancel: CancelToken) -> None:
+    """Renew the job's lease while it runs; cancel the scan if another worker took it over."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_S / 3)
+        try:
+            owned = await scan_jobs.renew(job.jobId, worker_id)
+        except Exception as e:
+            # A Mongo blip; the lease still has time left
+            logger.warning("job %s: lease renewal failed: %s", job.jobId, e)
+            continue
+        if not owned:
+            cancel.cancel(LEASE_LOST)
+            return
+
+
+async def run_job(job: ScanJobDocument, content: bytes, worker_id: str) -> None:
+    """Run one claimed job and record its outcome (unless it was lost to another worker)."""
+    cancel = CancelToken(JOB_DEADLINE_S)
+    lease = asyncio.create_task(_keep_lease(job, worker_id, cancel))
+    logger.info("job %s: attempt %d", job.jobId, job.attempts)
+    try:
+        result = await run_scan_job(job, content, cancel)
+    except ScanCancelled as e:
+        if e.reason == LEASE_LOST:
+            logger.warning("job %s: lease lost in %s; left to its new worker", job.jobId, e.stage)
+            return
+        logger.warning("job %s: %s", job.jobId, e)
+        await scan_jobs.fail(
+            job.jobId, worker_id, JobError(status=504, detail="Reading the grimoire took too long."), retry=True
+        )
+    except ScanError as e:
+        # 4xx: the photo or request is at fault and a rerun would fail the same way
+        retry = e.status_code >= 500
+        logger.info("job %s: failed with %d (retry=%s)", job.jobId, e.status_code, retry)
+        await scan_jobs.fail(job.jobId, worker_id, JobError(status=e.status_code, detail=e.detail), retry)
+    except Exception as e:
+        logger.exception("job %s failed: %s", job.jobId, e)
+        await scan_jobs.fail(
+            job.jobId,
+            worker_id,
+            JobError(status=500, detail="Couldn't read grimoire; try another photo or paste Town Square JSON."),
+            retry=True,
+        )
+    else:
+        if await scan_jobs.complete(job.jobId, worker_id, result):
+            logger.info("job %s: done", job.jobId)
+        else:
+            logger.warning("job %s: finished after its lease was lost; result dropped", job.jobId)
+    finally:
+        lease.cancel()
+
+
+async def _pause(stop: asyncio.Event, seconds: float) -> None:
+    """Sleep for seconds, or until the worker is told to stop."""
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _work(worker_id: str, stop: asyncio.Event, once: bool) -> None:
+    """
+    One job at a time: claim, run, repeat; poll every JOB_POLL_S while the queue is empty.
+    A queue error (Mongo unreachable while reaping, claiming or recording a result) is
+    logged and retried after a backoff doubling from JOB_POLL_S up to JOB_LEASE_S; a job
+    whose outcome could not be recorded is claimed again once its lease runs out.
+    """
+    errors = 0
+    while not stop.is_set():
+        try:
+            await scan_jobs.reap()
+            claimed = await scan_jobs.claim(worker_id)
+            if claimed is not None:
+                await run_job(*claimed, worker_id)
+        except Exception as e:
+            errors += 1
+            delay = min(JOB_POLL_S * 2 ** (errors - 1), JOB_LEASE_S)
+            logger.warning("worker %s: queue error (%s); retrying in %.0fs", worker_id, e, delay)
+            await _pause(stop, delay)
+            continue
+        errors = 0
+        if claimed is None:
+            if once:
+                return
+            await _pause(stop, JOB_POLL_S)
+
+
+async def run(concurrency: int, once: bool) -> None:
+    await connect_db()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl-C still interrupts
+            pass
+    try:
+        if WARMUP_ON_STARTUP:
+            radius = max(p.circle_detector.min_radius for p in profiles.values()) + 10
+            await asyncio.to_thread(
+                warm_up, warmup_state, grimoire_engines, REF_IMAGES_DIR, radius, player_name_extractor
+            )
+        host = socket.gethostname()
+        worker_ids = [f"{host}:{os.getpid()}:{i}" for i in range(concurrency)]
+        logger.info("worker %s:%d: running %d job(s) at a time", host, os.getpid(), concurrency)
+        await asyncio.gather(*(_work(worker_id, stop, once) for worker_id in worker_ids))
+    finally:
+        await disconnect_db()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=JOB_WORKER_CONCURRENCY,
+        help="Jobs this process runs at once (default: JOB_WORKER_CONCURRENCY)",
+    )
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args(argv)
+    asyncio.run(run(max(1, args.concurrency), args.once))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
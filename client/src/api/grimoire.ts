@@ -1,11 +1,13 @@
 import type { FromJsonResponse, ProcessGrimoireResponse } from '@/types/townSquare.types'
 import http from './http'
 
-export const processGrimoire = async (file: File) => {
+export const processGrimoire = async (file: File, serverId?: string) => {
   try {
     const form = new FormData()
     form.append('file', file)
-    const res = await http.post<ProcessGrimoireResponse>('/api/grimoire/process', form)
+    const res = await http.post<ProcessGrimoireResponse>('/api/grimoire/process', form, {
+      params: serverId ? { server_id: serverId } : undefined,
+    })
     return res.data
   } catch (error) {
     throw error
@@ -43,6 +43,8 @@ export function AddGame() {
 
   const [townSquare, setTownSquare] = useState<TownSquareGameState | null>(null)
   const [draftId, setDraftId] = useState<string | null>(null)
+  // Stored scan of an uploaded photo, attached to the game when it is saved
+  const [scanId, setScanId] = useState<string | null>(null)
   const [customScript, setCustomScript] = useState<CustomScript | null>(null)
   const [customRoles, setCustomRoles] = useState<RoleInfo[]>([])
 
@@ -262,9 +264,10 @@ export function AddGame() {
   const handleFileUpload = async (file: File) => {
     setLoadingImport(true)
     try {
-      const res = await processGrimoire(file)
+      const res = await processGrimoire(file, selectedServerId || undefined)
       setTownSquare(res.townSquare)
-      await saveDraft({ townSquare: res.townSquare })
+      setScanId(res.scan?.scanId ?? null)
+      await saveDraft({ townSquare: res.townSquare, scanId: res.scan?.scanId })
     } finally {
       setLoadingImport(false)
     }
@@ -275,6 +278,7 @@ export function AddGame() {
     try {
       const res = await parseGrimoireJson(JSON.parse(json) as Record<string, unknown>)
       setTownSquare(res.townSquare)
+      setScanId(null)
       if (res.meta) {
         // Extract storyteller separately; never auto-change the edition the user picked
         const { storyteller: st, playerCount: _pc, edition: _ed, ...metaRest } = res.meta as Record<string, unknown>
@@ -382,6 +386,7 @@ export function AddGame() {
         const created = await createGame(selectedServerId, {
           ...saveMetaPayload(metaFormValues),
           townSquare: townSquare ?? undefined,
+          scanId,
           phases,
         })
         const gameSlug = created.slug ?? created.gameId
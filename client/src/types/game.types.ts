@@ -37,6 +37,8 @@ export type GameCreateBody = {
   subtitle?: string | null
   winner?: string | null
   visibility?: 'private' | 'public'
+  /** Scan the townSquare was imported from (ProcessGrimoireResponse.scan.scanId). */
+  scanId?: string | null
 }
 
 /** Request body for PATCH /api/servers/{id}/games/{id}. Matches backend GameUpdateBody. */
@@ -20,6 +20,8 @@ export type TownSquareGameState = {
 
 export type ProcessGrimoireResponse = {
   townSquare: TownSquareGameState
+  /** Stored scan of the photo; save the game with its scanId to attach it. */
+  scan?: { scanId: string; baseScanId: string | null } | null
 }
 
 /** Meta returned when server normalizes from minimal/external JSON (edition, playerCount). */